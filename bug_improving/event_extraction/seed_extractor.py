@@ -1,11 +1,13 @@
 import logging
 import re
+import string
 
 from tqdm import tqdm
 
 from bug_improving.event_extraction.placeholder import Placeholder
+from bug_improving.utils.aho_corasick import AhoCorasick
 from bug_improving.utils.nlp_util import NLPUtil
-from bug_improving.utils.timeout_util import break_after
+from bug_improving.utils.timeout_util import TimeoutUtil
 from config import SEED_FILTER_COUNT_THRESHOLD
 
 logging.basicConfig(format='%(asctime)s %(message)s')
@@ -42,8 +44,11 @@ class SeedExtractor:
                                            "menu", "field"])
 
     PLACEHOLDER_SEED_DICT = dict()  # key: placeholder, value: seed
-    PLH_DICT_KEYS_BY_PLH_LEN = None
-    PLH_DICT_KEYS_BY_SEED_LEN = None
+    SEED_AUTOMATON = None  # AhoCorasick: seed -> placeholder
+    PLACEHOLDER_AUTOMATON = None  # AhoCorasick: placeholder -> seed
+    QUOTES_BEFORE_SEED = "'\"“["
+    QUOTES_AFTER_SEED = "'\"“”]"
+    ALNUM_CHARS = set(string.ascii_letters + string.digits)
 
     @staticmethod
     def extract_seeds_by_title_sentence_case_convention(text, seed_count_dict):
@@ -205,65 +210,61 @@ class SeedExtractor:
             seeds = seeds | concept_related_dict.keys()
         return seeds
 
+    @staticmethod
+    def build_automatons():
+        """
+        SeedExtractor.SEED_AUTOMATON (seed -> placeholder) and
+        SeedExtractor.PLACEHOLDER_AUTOMATON (placeholder -> seed) from SeedExtractor.PLACEHOLDER_SEED_DICT
+        """
+        seed_placeholder_dict = dict()
+        for seed_placeholder, seed_value in SeedExtractor.PLACEHOLDER_SEED_DICT.items():
+            seed_placeholder_dict[seed_value] = seed_placeholder_dict.get(seed_value, seed_placeholder)
+        SeedExtractor.SEED_AUTOMATON = AhoCorasick(seed_placeholder_dict)
+        SeedExtractor.PLACEHOLDER_AUTOMATON = AhoCorasick(SeedExtractor.PLACEHOLDER_SEED_DICT)
+
+    @staticmethod
+    def get_seed_span(text, start, end):
+        """
+        span of the seed text[start:end] with the quotes around it,
+        None if it is not a word: Edit the password -> Edit is not the button "Edit", just a verb,
+        so there must be a space before the seed (quotes) and no letter or digit after it
+        @return: (span_start, span_end) or None
+        @rtype: tuple
+        """
+        span_start = start
+        while span_start > 0 and text[span_start - 1] in SeedExtractor.QUOTES_BEFORE_SEED:
+            span_start = span_start - 1
+        if span_start == 0 or not text[span_start - 1].isspace():
+            return None
+        span_end = end
+        while span_end < len(text) and text[span_end] in SeedExtractor.QUOTES_AFTER_SEED:
+            span_end = span_end + 1
+        if span_end < len(text) and text[span_end] in SeedExtractor.ALNUM_CHARS:
+            return None
+        return span_start, span_end
+
     @staticmethod
     def replace_seed_by_placeholder(text):
-        # sorting dictionary by length of values (seeds) from long to short,
-        # if not, create new login will be replaced by new login
-        # if not placeholders:
-        if not SeedExtractor.PLH_DICT_KEYS_BY_SEED_LEN:
-            SeedExtractor.PLH_DICT_KEYS_BY_SEED_LEN = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT,
-                                                             key=lambda k: len(SeedExtractor.PLACEHOLDER_SEED_DICT[k]),
-                                                             reverse=True)
-
-        for seed_placeholder in SeedExtractor.PLH_DICT_KEYS_BY_SEED_LEN:
-            seed_value = SeedExtractor.PLACEHOLDER_SEED_DICT[seed_placeholder]
-
-            if seed_value in text:
-                # print(seed_value)
-                # text = text.replace(seed_value, seed_placeholder)
-                # print(text)
-                # print(seed_placeholder)
-
-                # text = re.sub(rf'(?:\'|\"|“)*{seed_value}(?:\'|\"|“)*', seed_placeholder, text)
-                original_text = text
-                text = text.replace(seed_value, seed_placeholder)
-                text = re.sub(rf'(?:\'|\"|“|\[)*{seed_placeholder}(?:\'|\"|“|”|\])*', seed_placeholder, text)
-                # find add 'the' before placeholder will increase the dependency parser effectiveness ##################
-                # maybe not
-
-                # text = re.sub(rf'(?:\'|\"|“|\[)*{seed_placeholder}(?:\'|\"|“|”|\])*', f'the {seed_placeholder}', text)
-                # Edit the password -> Edit is not the button "Edit", just a verb,
-                # so there is a space '\s' before {seed_placeholder}
-                # if not re.findall(rf"\s{seed_placeholder}([^0-9a-zA-Z]+|$)", text, flags=0):
-                all_seed_placeholder = re.findall(rf"{seed_placeholder}", text, flags=0)
-                # print(all_seed_placeholder)
-                specific_seed_placeholder = re.findall(rf"(\s{seed_placeholder}[^0-9a-zA-Z]+|\s{seed_placeholder}$)",
-                                                       text, flags=0)
-                # print(specific_seed_placeholder)
-                if len(all_seed_placeholder) != len(specific_seed_placeholder):
-                    text = original_text
-
-        return text
+        """
+        replace seeds (with the quotes around them) by placeholders in one pass over the text,
+        longer seeds first, if not, create new login will be replaced by new login
+        """
+        if SeedExtractor.SEED_AUTOMATON is None:
+            SeedExtractor.build_automatons()
+        return SeedExtractor.SEED_AUTOMATON.replace(text, SeedExtractor.get_seed_span)[0]
 
     @staticmethod
     def replace_placeholder_by_seed(text):
-        # Sort dictionary by key (placeholder) length
-        element = list()
-        if not SeedExtractor.PLH_DICT_KEYS_BY_PLH_LEN:
-            SeedExtractor.PLH_DICT_KEYS_BY_PLH_LEN = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT, key=len, reverse=True)
-        # if not sorted by reverse, then element-16 placed by element-1
-        # for seed_placeholder, seed_value in sorted(SeedExtractor.PLACEHOLDER_DICT.items(), reverse=True):
-        for seed_placeholder in SeedExtractor.PLH_DICT_KEYS_BY_PLH_LEN:
-            seed_value = SeedExtractor.PLACEHOLDER_SEED_DICT[seed_placeholder]
-            if seed_placeholder in text:
-                text = text.replace(seed_placeholder, seed_value)
-                # find add 'the' before placeholder will increase the dependency parser effectiveness ##################
-                # maybe not
-                # text = text.replace(f'the {seed_placeholder}', seed_value)
-
-                element.append(seed_value)
-                # text = re.sub(rf'(?:\'|\"|“)*{seed_value}(?:\'|\"|“)*', seed_placeholder, text)
-        return text, element
+        """
+        replace placeholders by seeds in one pass over the text,
+        longer placeholders first, if not, CONCEPT_16 will be replaced by CONCEPT_1
+        @return: (text, [seed, ...]) seeds in the order of the text
+        @rtype: tuple
+        """
+        if SeedExtractor.PLACEHOLDER_AUTOMATON is None:
+            SeedExtractor.build_automatons()
+        text, element = SeedExtractor.PLACEHOLDER_AUTOMATON.replace(text)
+        return text, list(dict.fromkeys(element))
 
     @staticmethod
     def get_placeholder_dict(seeds, urls):
@@ -279,10 +280,7 @@ class SeedExtractor:
             SeedExtractor.PLACEHOLDER_SEED_DICT[url_placeholder] = SeedExtractor.PLACEHOLDER_SEED_DICT.get(
                 url_placeholder, url)
 
-        SeedExtractor.PLH_DICT_KEYS_BY_SEED_LEN = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT,
-                                                         key=lambda k: len(SeedExtractor.PLACEHOLDER_SEED_DICT[k]),
-                                                         reverse=True)
-        SeedExtractor.PLH_DICT_KEYS_BY_PLH_LEN = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT, key=len, reverse=True)
+        SeedExtractor.build_automatons()
 
         return SeedExtractor.PLACEHOLDER_SEED_DICT
 
@@ -323,14 +321,19 @@ class SeedExtractor:
         return filtered_seed_count_dict
 
     @staticmethod
-    @break_after(1)  # matching_rs = pattern.findall(text)  等待1s,还未运行结束，return None
     def extract_urls_by_regex(text):
+        """
+        return None if a pattern does not finish in REGEX_TIMEOUT (matching_rs = pattern.findall(text)),
+        thread-safe (TimeoutUtil, no SIGALRM)
+        """
         urls = set()
         for pattern in NLPUtil.PATTERN_URL:
             # print("#################################################################")
             # print(text)
 
-            matching_rs = pattern.findall(text)  # matching result
+            matching_rs = TimeoutUtil.findall(pattern, text)  # matching result
+            if matching_rs is None:
+                return None
             # print(matching_rs)
             for rs in matching_rs:
                 # rs = rs.strip()  # remove space at the begining and the end
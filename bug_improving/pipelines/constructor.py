@@ -73,12 +73,16 @@ class StepSplitter:
         return json.dumps(outputs)
 
     @staticmethod
-    def split_s2r(bug=None, bugs=None, with_step_type=False):
-        # if messages is None:
+    def get_messages(bug=None, bugs=None, with_step_type=False):
         messages = StepSplitter.get_initial_messages(bugs, with_step_type)
-        # extract summary
         question = StepSplitter.question_for_step_splitting(bug)
         messages = LLMUtil.add_role_content_dict_into_messages(LLMUtil.ROLE_USER, question, messages)
+        return messages
+
+    @staticmethod
+    def split_s2r(bug=None, bugs=None, with_step_type=False):
+        # if messages is None:
+        messages = StepSplitter.get_messages(bug, bugs, with_step_type)
         # print(self.summary_question)
         # input()
         answer = LLMUtil.ask_turbo(messages)
@@ -151,11 +155,15 @@ class SecSplitter:
         return json.dumps(outputs)
 
     @staticmethod
-    def split_section(bug, bugs=None):
+    def get_messages(bug, bugs=None):
         messages = SecSplitter.get_initial_messages(bugs)
-        # extract summary
         question = SecSplitter.question_for_sec_splitting(bug)
         messages = LLMUtil.add_role_content_dict_into_messages(LLMUtil.ROLE_USER, question, messages)
+        return messages
+
+    @staticmethod
+    def split_section(bug, bugs=None):
+        messages = SecSplitter.get_messages(bug, bugs)
         # print(self.summary_question)
         # input()
         answer = LLMUtil.ask_turbo(messages)
@@ -233,11 +233,15 @@ For each potential set of steps to reproduce:
         return json.dumps(outputs)
 
     @staticmethod
-    def link_scenario(bug_pair=None, bugs=None, model_name=LLMUtil.GPT4_MODEL_NAME, temperature=0.2):
+    def get_messages(bug_pair=None, bugs=None):
         messages = ScenarioLinker.get_initial_messages(bugs)
-        # extract summary
         question = ScenarioLinker.question_for_linked_scenario(bug_pair)
         messages = LLMUtil.add_role_content_dict_into_messages(LLMUtil.ROLE_USER, question, messages)
+        return messages
+
+    @staticmethod
+    def link_scenario(bug_pair=None, bugs=None, model_name=LLMUtil.GPT4_MODEL_NAME, temperature=0.2):
+        messages = ScenarioLinker.get_messages(bug_pair, bugs)
         # print(self.summary_question)
         # input()
         answer = LLMUtil.ask_turbo(messages, model_name, temperature)
@@ -460,6 +464,22 @@ class ScenarioCombiner:
                 get_step_dicts(bug_pair, output[Placeholder.STEPS_TO_REPRODUCE])
         return json.dumps(outputs)
 
+    @staticmethod
+    def get_messages(bug_pair=None, bugs=None, with_step_cluster=True):
+        """
+        @return: messages, None if bug_pair has no chunk combination (no need to ask LLM)
+        @rtype: list
+        """
+        question = ScenarioCombiner.question_for_combined_scenario(bug_pair, with_step_cluster)
+        if question:
+            messages = ScenarioCombiner.get_initial_messages(bugs, with_step_cluster)
+            return LLMUtil.add_role_content_dict_into_messages(LLMUtil.ROLE_USER, question, messages)
+        return None
+
+    @staticmethod
+    def get_empty_answer():
+        return str({Placeholder.CHAINS_OF_THOUGHT: [], Placeholder.SCENARIOS: []})
+
     @staticmethod
     def combine_scenario(bug_pair=None, bugs=None, with_step_cluster=True, model_name=LLMUtil.GPT4_MODEL_NAME):
         """
@@ -497,7 +517,7 @@ class ScenarioCombiner:
         #                        QA(self.desc_question, desc_answer))
 
             return answer, messages
-        return str({Placeholder.CHAINS_OF_THOUGHT: [], Placeholder.SCENARIOS: []}), None
+        return ScenarioCombiner.get_empty_answer(), None
 
     @staticmethod
     def get_shared_step_cluster_indexes(bug_pair):
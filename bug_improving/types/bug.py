@@ -1,6 +1,8 @@
+import bisect
 import json
 import logging
 import re
+from collections import Counter
 from datetime import datetime
 # from pathlib import Path
 
@@ -16,11 +18,14 @@ from bug_improving.types.description import Description, Step, Section
 from bug_improving.types.entity import Category
 from bug_improving.types.product_component_pair import ProductComponentPair, ProductComponentPairFramework
 from bug_improving.types.tossing_path import TossingPath, TossingPathFramework
+from bug_improving.utils.clustering_util import ClusteringUtil
+from bug_improving.utils.embedding_util import EmbeddingUtil
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.list_util import ListUtil
 from bug_improving.utils.nlp_util import NLPUtil, SentUtil
+from bug_improving.utils.step_cluster_index import StepClusterIndex
 from config import STEP_MERGE_THRESHOLD, STEP_MAX_TOKEN_NUM, MAX_STEP_NUM, ELEMENT_MERGE_THRESHOLD, \
-    ACTION_MERGE_THRESHOLD, SPACY_BATCH_SIZE, SBERT_BATCH_SIZE, DATA_DIR
+    ACTION_MERGE_THRESHOLD, SPACY_BATCH_SIZE, SBERT_BATCH_SIZE, DATA_DIR, STEP_CLUSTER_THRESHOLD
 import numpy as np
 
 
@@ -274,6 +279,17 @@ class Bugs:
         # self.categories = None
         # self.concepts = None
         # self.length = len(bugs)
+        self.bug_id_bug_dict = None  # dict{ key: bug id, value: bug }
+        self.pc_bugs_dict = None  # dict{ key: product_component_pair, value: [bug, bug, ...] }
+        self.creation_time_list = None  # sorted creation_time of bugs, aligned with creation_time_bug_list
+        self.creation_time_bug_list = None  # bugs sorted by creation_time
+        self.build_indexes()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # bugs pickled before the indexes existed
+        if self.__dict__.get("bug_id_bug_dict") is None:
+            self.build_indexes()
 
     def __iter__(self):
         for bug in self.bugs:
@@ -288,11 +304,68 @@ class Bugs:
     def get_length(self):
         return len(self.bugs)
 
-    def get_bug_by_id(self, bug_id):
+    @staticmethod
+    def get_bug_id_key(bug_id):
+        """
+        normalize bug id into the key of bug_id_bug_dict
+        bugzilla ids may be int or str ("123" and 123 are the same bug), GitHub ids are urls
+        @param bug_id:
+        @type bug_id: int or str
+        @return: bug id key
+        @rtype: int or str
+        """
+        try:
+            return int(bug_id)
+        except (TypeError, ValueError):
+            return bug_id
+
+    def build_indexes(self):
+        """
+        build the indexes over self.bugs
+        1. bug_id_bug_dict: bug id -> bug (the first bug wins if ids are duplicated)
+        2. pc_bugs_dict: product_component_pair -> bugs, in the order of self.bugs
+        3. creation_time_list & creation_time_bug_list: bugs sorted by creation_time (stable), for bisect
+           bugs without creation_time are not in this index
+        @return:
+        @rtype:
+        """
+        self.bug_id_bug_dict = dict()
+        self.pc_bugs_dict = dict()
+        self.creation_time_list = []
+        self.creation_time_bug_list = []
+        if self.bugs is None:
+            return
         for bug in self.bugs:
-            if int(bug.id) == int(bug_id):
-                return bug
-        return None
+            bug_id_key = Bugs.get_bug_id_key(bug.id)
+            self.bug_id_bug_dict[bug_id_key] = self.bug_id_bug_dict.get(bug_id_key, bug)
+            self.pc_bugs_dict[bug.product_component_pair] = self.pc_bugs_dict.get(bug.product_component_pair, [])
+            self.pc_bugs_dict[bug.product_component_pair].append(bug)
+        self.creation_time_bug_list = sorted([bug for bug in self.bugs if bug.creation_time is not None],
+                                             key=lambda x: x.creation_time)
+        self.creation_time_list = [bug.creation_time for bug in self.creation_time_bug_list]
+
+    def append(self, bug):
+        """
+        append bug into bugs and update the indexes
+        @param bug:
+        @type bug: Bug
+        @return:
+        @rtype:
+        """
+        if self.bugs is None:
+            self.bugs = []
+        self.bugs.append(bug)
+        bug_id_key = Bugs.get_bug_id_key(bug.id)
+        self.bug_id_bug_dict[bug_id_key] = self.bug_id_bug_dict.get(bug_id_key, bug)
+        self.pc_bugs_dict[bug.product_component_pair] = self.pc_bugs_dict.get(bug.product_component_pair, [])
+        self.pc_bugs_dict[bug.product_component_pair].append(bug)
+        if bug.creation_time is not None:
+            index = bisect.bisect_right(self.creation_time_list, bug.creation_time)
+            self.creation_time_list.insert(index, bug.creation_time)
+            self.creation_time_bug_list.insert(index, bug)
+
+    def get_bug_by_id(self, bug_id):
+        return self.bug_id_bug_dict.get(Bugs.get_bug_id_key(bug_id), None)
 
     def get_bug_ids(self):
         bug_ids = set()
@@ -317,10 +390,7 @@ class Bugs:
         :param product_component_pair: specified product&component
         :return: specified product&component's bugs
         """
-        specified_bugs = []
-        for bug in self.bugs:
-            if bug.product_component_pair == product_component_pair:
-                specified_bugs.append(bug)
+        specified_bugs = list(self.pc_bugs_dict.get(product_component_pair, []))
         return Bugs(specified_bugs)
         # return specified_bugs
 
@@ -519,6 +589,25 @@ class Bugs:
 
     def sort_by_creation_time(self, reverse=False):
         self.bugs = sorted(self.bugs, key=lambda x: x.creation_time, reverse=reverse)
+        self.build_indexes()
+
+    def get_bugs_by_creation_time_range(self, start_time=None, end_time=None):
+        """
+        get bugs whose creation_time in [start_time, end_time) by bisect on the creation_time index
+        @param start_time: None means no lower bound
+        @type start_time: datetime
+        @param end_time: None means no upper bound
+        @type end_time: datetime
+        @return: bugs sorted by creation_time
+        @rtype: Bugs
+        """
+        start_index = 0
+        end_index = len(self.creation_time_list)
+        if start_time is not None:
+            start_index = bisect.bisect_left(self.creation_time_list, start_time)
+        if end_time is not None:
+            end_index = bisect.bisect_left(self.creation_time_list, end_time)
+        return Bugs(self.creation_time_bug_list[start_index:max(start_index, end_index)])
 
     def split_dataset_by_creation_time(self, creation_time):
         """
@@ -533,10 +622,12 @@ class Bugs:
         # datetime_format = "%Y-%m-%d %H:%M:%S"
         creation_time = datetime.strptime(creation_time, datetime_format)
 
+        # both datasets keep the order of self.bugs,
+        # bugs without creation_time go to the testing dataset (Bug.from_dict takes them as created now)
         train_bugs = list()
         test_bugs = list()
         for bug in self.bugs:
-            if bug.creation_time < creation_time:
+            if bug.creation_time is not None and bug.creation_time < creation_time:
                 train_bugs.append(bug)
             else:
                 test_bugs.append(bug)
@@ -693,17 +784,7 @@ class Bugs:
         @rtype:
         """
         logging.warning("get all steps in bugs")
-        SentUtil.SENT_LIST = self.get_steps_list()
-        SentUtil.get_sent_has_cconj_list(SentUtil.SENT_LIST)
-        NLPUtil.SPACY_NLP.enable_pipe("benepar")
-        NLPUtil.SPACY_NLP.enable_pipe("merge_noun_chunks")
-        logging.warning(NLPUtil.SPACY_NLP.pipe_names)
-        # logging.warning(len(SentUtil.SENT_LIST))
-        # logging.warning(len(SentUtil.SENT_HAS_CCONJ_LIST))
-        # SentUtil.get_sent_cons_doc_list(SentUtil.SENT_LIST)
-        # logging.warning(len(SentUtil.SENT_LIST))
-        # logging.warning(len(SentUtil.SENT_HAS_CCONJ_LIST))
-        # logging.warning(len(SentUtil.SENT_CONS_DOC_LIST))
+        sent_table = SentUtil.get_sent_table(self.get_steps_list())
 
         logging.warning("Split steps into atomic steps...")
         for bug in tqdm(self.bugs):
@@ -713,7 +794,8 @@ class Bugs:
             if bug.description.steps_to_reproduce:
                 # if len(bug.description.steps_to_reproduce) <= 512:
                 # try:
-                bug.description.steps_to_reproduce = Description.extract_steps(bug.description.steps_to_reproduce)
+                bug.description.steps_to_reproduce = Description.extract_steps(bug.description.steps_to_reproduce,
+                                                                               sent_table)
                 # except Exception:
                 #     print(bug.id)
                 # else:
@@ -814,7 +896,7 @@ class Bugs:
         #         target_list.append(step.target)
         #         step_list.append(step)
 
-        target_embeddings = NLPUtil.SBERT_MODEL.encode(target_list)
+        target_embeddings = EmbeddingUtil.encode(target_list)
         concepts.get_concept_name_embedding_list()
         # concept_embedding = NLPUtil.SENTENCE_TRANSFORMER(concepts.concept_name_list)
         pairs_list = sentence_transformers.util.semantic_search(target_embeddings,
@@ -844,7 +926,7 @@ class Bugs:
         @return:
         @rtype:
         """
-        action_embeddings = NLPUtil.SBERT_MODEL.encode(action_list)
+        action_embeddings = EmbeddingUtil.encode(action_list)
         action_object_equivalent_names = list()
         index_action_object_dict = dict()
         index = 0
@@ -856,7 +938,7 @@ class Bugs:
             # action_object_equivalent_embeddings.append(action.equivalent_embedding)
         # flatten_action_object_equivalent_embeddings = ListUtil.convert_flatten_list_to_nested_list_by_value\
         #     (action_object_equivalent_embeddings)
-        action_object_equivalent_embeddings = NLPUtil.SBERT_MODEL.encode(action_object_equivalent_names)
+        action_object_equivalent_embeddings = EmbeddingUtil.encode(action_object_equivalent_names)
         pairs_list = sentence_transformers.util.semantic_search(action_embeddings,
                                                                 action_object_equivalent_embeddings,
                                                                 top_k=len(action_object_equivalent_embeddings))
@@ -883,26 +965,27 @@ class Bugs:
         @rtype: dict
         """
         concept_category_dict = dict()
-        for bug in tqdm(self.bugs):
+        steps = list()
+        for bug in tqdm(self.bugs, ascii=True):
             # print(bug.id)
             if bug.description.steps_to_reproduce:
                 for step in bug.description.steps_to_reproduce:
-                    # print(step)
-                    step = SeedExtractor.replace_seed_by_placeholder(step)
-                    # print(step)
-                    concept_category_pair_list = Category.extract_category(step)
-                    # concept_action_pair_list = Action.extract_action(step)
-
-                    if concept_category_pair_list:
-                        for concept_category_pair in concept_category_pair_list:
-                            concept = concept_category_pair[0]
-                            category = concept_category_pair[1]
-                            if concept is not None and category is not None:
-                                # print(concept, category)
-                                concept = SeedExtractor.PLACEHOLDER_SEED_DICT[concept]
-                                concept_category_dict[concept] = concept_category_dict.get(concept, dict())
-                                concept_category_dict[concept][category] = concept_category_dict[concept]. \
-                                                                               get(category, 0) + 1
+                    steps.append(SeedExtractor.replace_seed_by_placeholder(step))
+
+        logging.warning(f"extract categories from {len(steps)} steps by batch...")
+        concept_category_pair_lists = Category.extract_categories_by_batch(steps)
+        for concept_category_pair_list in concept_category_pair_lists:
+            # concept_action_pair_list = Action.extract_action(step)
+            if concept_category_pair_list:
+                for concept_category_pair in concept_category_pair_list:
+                    concept = concept_category_pair[0]
+                    category = concept_category_pair[1]
+                    if concept is not None and category is not None:
+                        # print(concept, category)
+                        concept = SeedExtractor.PLACEHOLDER_SEED_DICT[concept]
+                        concept_category_dict[concept] = concept_category_dict.get(concept, dict())
+                        concept_category_dict[concept][category] = concept_category_dict[concept]. \
+                                                                       get(category, 0) + 1
 
         # print(len(concept_category_dict.keys()))
         # print(concept_category_dict.keys())
@@ -927,20 +1010,27 @@ class Bugs:
         @return: bug_possible_steps: key: bug, value: possible_steps in bug
         @rtype: dict
         """
-        words = NLPUtil.preprocess(need_to_match_step.text)
+        words = set(NLPUtil.preprocess(need_to_match_step.text))
         # print(words)
         bug_possible_steps = dict()
 
         related_concepts = list()
 
+        # preprocess each concept name once, in batches
+        concept_names = list(dict.fromkeys(concept.name for bug in self.bugs
+                                           if bug.description.steps_to_reproduce
+                                           for step in bug.description.steps_to_reproduce if step.concepts
+                                           for concept in step.concepts))
+        concept_name_words_dict = dict(zip(concept_names, map(set, NLPUtil.preprocess_batch(concept_names))))
+
         for index, bug in tqdm(enumerate(self.bugs)):
             if bug.description.steps_to_reproduce:
                 for step in bug.description.steps_to_reproduce:
                     if step.concepts:
                         for concept in step.concepts:
-                            concept_words = NLPUtil.preprocess(concept.name)
+                            concept_words = concept_name_words_dict[concept.name]
                             # print(concept_words)
-                            if list(set(words) & set(concept_words)):
+                            if words & concept_words:
                                 # if not flag or flag != index:
                                 bug_possible_steps[bug] = bug_possible_steps.get(bug, list())
                                 bug_possible_steps[bug].append(step)
@@ -1043,14 +1133,9 @@ class Bugs:
         # (score, i, j) list
         paraphrases = util.paraphrase_mining(model, step_text_list, show_progress_bar=True)
         logging.warning("merge index_pairs into index_clusters by paraphrases...")
-        index_clusters = list()
-        for paraphrase in tqdm(paraphrases):
-            score, p_i, p_j = paraphrase
-            if score >= STEP_MERGE_THRESHOLD:
-                index_clusters.append({p_i, p_j})
-
-        logging.warning("merge sets with intersection in list...")
-        index_clusters = ListUtil.merge_sets_with_intersection_in_list(index_clusters)
+        # paraphrases are sorted by decreasing score
+        index_pairs = ((p_i, p_j) for score, p_i, p_j in tqdm(paraphrases) if score >= STEP_MERGE_THRESHOLD)
+        index_clusters = ListUtil.merge_pairs_into_sets(index_pairs)
 
         # merging_steps = list()
         steps_num = len(step_list)
@@ -1159,8 +1244,8 @@ class Bugs:
         logging.warning("Cluster steps by Fast Clustering...")
         step_index_set = set()
         # (score, i, j) list
-        step_embeddings = model.encode(step_text_list, batch_size=SBERT_BATCH_SIZE, show_progress_bar=True,
-                                       convert_to_tensor=True)
+        step_embeddings = EmbeddingUtil.encode(step_text_list, model, batch_size=SBERT_BATCH_SIZE,
+                                               show_progress_bar=True, convert_to_tensor=True)
         # step_embeddings = FileUtil.load_pickle(Path(DATA_DIR, 'step_embeddings.json'))
         # FileUtil.dump_pickle(Path(DATA_DIR, 'step_embeddings.json'), step_embeddings)
         step_embeddings = step_embeddings.to('cpu')
@@ -1174,7 +1259,8 @@ class Bugs:
         # init_max_size = 1000
         # if len(step_embeddings) < 1000:
         #     init_max_size = len(step_embeddings)
-        index_clusters = util.community_detection(step_embeddings, threshold=STEP_MERGE_THRESHOLD, min_community_size=1)
+        index_clusters = ClusteringUtil.community_detection(step_embeddings, threshold=STEP_MERGE_THRESHOLD,
+                                                            min_community_size=1)
         # step_num = 0
         # for index_cluster in index_clusters:
         #     step_num = step_num + len(index_cluster)
@@ -1201,3 +1287,177 @@ class Bugs:
                 step.cluster_index = index
 
         self.step_index_cluster_dict = index_cluster_dict
+
+    def get_step_cluster_index(self, model):
+        """
+        StepClusterIndex (cluster centroids) of the steps with cluster_index
+        step embeddings come from the embedding cache, so only steps never encoded go through the model
+        @param model: SBERT
+        @type model: sentence embedding
+        @return: step_cluster_index
+        @rtype: StepClusterIndex
+        """
+        step_list, step_text_list = self.get_steps()
+        rows = [row for row, step in enumerate(step_list) if step.cluster_index is not None]
+        step_embeddings = EmbeddingUtil.encode([step_text_list[row] for row in rows], model,
+                                               batch_size=SBERT_BATCH_SIZE, show_progress_bar=True)
+        return StepClusterIndex().add([step_list[row].cluster_index for row in rows], step_embeddings)
+
+    def merge_new_steps_by_nearest_cluster(self, model, step_cluster_index=None, threshold=STEP_CLUSTER_THRESHOLD):
+        """
+        incremental Bugs.merge_steps_by_fast_clustering for the steps added after the last clustering
+        (steps with cluster_index None), existing cluster indexes are kept:
+        1. encode the new steps only
+        2. assign each new step to its nearest cluster centroid if cos_sim >= threshold
+        3. cluster the unmatched new steps by fast clustering, each community (or the rest step) is a new cluster
+           with an index after the existing ones
+        4. update self.step_index_cluster_dict, Step.cluster_index and step_cluster_index
+        no clusters yet: Bugs.merge_steps_by_fast_clustering
+
+        @param model: SBERT
+        @type model: sentence embedding
+        @param step_cluster_index: centroids of the existing clusters, rebuilt if None or out of date
+        @type step_cluster_index: StepClusterIndex
+        @param threshold:
+        @type threshold: float
+        @return: step_cluster_index with the new steps
+        @rtype: StepClusterIndex
+        """
+        if not self.step_index_cluster_dict:
+            self.merge_steps_by_fast_clustering(model)
+            return self.get_step_cluster_index(model)
+        step_list, step_text_list = self.get_steps()
+        new_rows = [row for row, step in enumerate(step_list) if step.cluster_index is None]
+        if step_cluster_index is None or step_cluster_index.get_step_num() != len(step_list) - len(new_rows):
+            logging.warning("Build step cluster centroids...")
+            step_cluster_index = self.get_step_cluster_index(model)
+        logging.warning(f"Assign {len(new_rows)} / {len(step_list)} new steps to step clusters...")
+        if not new_rows:
+            return step_cluster_index
+        step_embeddings = EmbeddingUtil.encode([step_text_list[row] for row in new_rows], model,
+                                               batch_size=SBERT_BATCH_SIZE, show_progress_bar=True,
+                                               convert_to_tensor=True).to('cpu')
+        cluster_indexes, _ = step_cluster_index.search(step_embeddings, threshold)
+
+        unmatched_rows = np.flatnonzero(cluster_indexes == -1)
+        logging.warning(f"Cluster {len(unmatched_rows)} unmatched new steps by Fast Clustering...")
+        first_new_index = max(max(self.step_index_cluster_dict.keys()) + 1, len(step_cluster_index))
+        next_index = first_new_index
+        if len(unmatched_rows):
+            index_clusters = ClusteringUtil.community_detection(step_embeddings[unmatched_rows.tolist()],
+                                                                threshold=threshold, min_community_size=1)
+            for index_cluster in index_clusters:
+                cluster_indexes[unmatched_rows[index_cluster]] = next_index
+                next_index = next_index + 1
+            # the rest steps
+            for row in unmatched_rows:
+                if cluster_indexes[row] == -1:
+                    cluster_indexes[row] = next_index
+                    next_index = next_index + 1
+
+        for row, cluster_index in zip(new_rows, cluster_indexes.tolist()):
+            step = step_list[row]
+            step.cluster_index = cluster_index
+            self.step_index_cluster_dict[cluster_index] = self.step_index_cluster_dict.get(cluster_index, set())
+            self.step_index_cluster_dict[cluster_index].add(step)
+        logging.warning(f"{len(new_rows) - len(unmatched_rows)} new steps into existing clusters, "
+                        f"{len(unmatched_rows)} new steps into {next_index - first_new_index} new clusters")
+        return step_cluster_index.add(cluster_indexes, step_embeddings)
+
+    @staticmethod
+    def get_cluster_index_mapping(old_cluster_indexes, new_cluster_indexes):
+        """
+        map new cluster indexes to the old ones they share most steps with (greedy by decreasing shared step number,
+        each old index is used once), the other new cluster indexes get indexes after the old ones
+        @param old_cluster_indexes: old cluster_index of each step (None if the step was not clustered)
+        @type old_cluster_indexes: list
+        @param new_cluster_indexes: new cluster_index of each step
+        @type new_cluster_indexes: list
+        @return: dict{ key: new cluster_index, value: stable cluster_index }, Counter{ (old, new): shared step num }
+        @rtype: dict, Counter
+        """
+        pair_count_dict = Counter((old_index, new_index)
+                                  for old_index, new_index in zip(old_cluster_indexes, new_cluster_indexes)
+                                  if old_index is not None)
+        new_index_mapping = dict()
+        used_old_indexes = set()
+        for (old_index, new_index), _ in sorted(pair_count_dict.items(), key=lambda x: (-x[1], x[0])):
+            if new_index not in new_index_mapping and old_index not in used_old_indexes:
+                new_index_mapping[new_index] = old_index
+                used_old_indexes.add(old_index)
+        next_index = max((index for index in old_cluster_indexes if index is not None), default=-1) + 1
+        for new_index in sorted(set(new_cluster_indexes)):
+            if new_index not in new_index_mapping:
+                new_index_mapping[new_index] = next_index
+                next_index = next_index + 1
+        return new_index_mapping, pair_count_dict
+
+    @staticmethod
+    def get_adjusted_rand_index(pair_count_dict):
+        """
+        adjusted Rand index of two clusterings from their contingency table, 1 means the same clusters
+        @param pair_count_dict: Counter{ (cluster_index_1, cluster_index_2): step num }
+        @type pair_count_dict: Counter
+        @return: adjusted Rand index
+        @rtype: float
+        """
+        def get_pair_num(count):
+            return count * (count - 1) / 2
+
+        count_dict_1 = Counter()
+        count_dict_2 = Counter()
+        for (cluster_index_1, cluster_index_2), count in pair_count_dict.items():
+            count_dict_1[cluster_index_1] += count
+            count_dict_2[cluster_index_2] += count
+        index = sum(get_pair_num(count) for count in pair_count_dict.values())
+        pair_num_1 = sum(get_pair_num(count) for count in count_dict_1.values())
+        pair_num_2 = sum(get_pair_num(count) for count in count_dict_2.values())
+        all_pair_num = get_pair_num(sum(pair_count_dict.values()))
+        expected_index = pair_num_1 * pair_num_2 / all_pair_num if all_pair_num else 0
+        max_index = (pair_num_1 + pair_num_2) / 2
+        if max_index == expected_index:
+            return 1.0
+        return (index - expected_index) / (max_index - expected_index)
+
+    def recluster_steps_by_fast_clustering(self, model):
+        """
+        periodic full re-cluster for bugs clustered incrementally (Bugs.merge_new_steps_by_nearest_cluster):
+        1. Bugs.merge_steps_by_fast_clustering over all steps
+        2. keep cluster indexes stable: new clusters take the old cluster_index they share most steps with
+           (Bugs.get_cluster_index_mapping)
+        3. report the drift between the incremental and the full clustering
+
+        @param model: SBERT
+        @type model: sentence embedding
+        @return: drift report
+        @rtype: dict
+        """
+        step_list, _ = self.get_steps()
+        old_cluster_indexes = [step.cluster_index for step in step_list]
+        self.merge_steps_by_fast_clustering(model)
+        new_index_mapping, pair_count_dict = Bugs.get_cluster_index_mapping(
+            old_cluster_indexes, [step.cluster_index for step in step_list])
+
+        index_cluster_dict = dict()
+        for new_index, cluster in self.step_index_cluster_dict.items():
+            index = new_index_mapping[new_index]
+            index_cluster_dict[index] = index_cluster_dict.get(index, cluster)
+            for step in cluster:
+                step.cluster_index = index
+        self.step_index_cluster_dict = index_cluster_dict
+
+        old_step_num = sum(1 for index in old_cluster_indexes if index is not None)
+        moved_step_num = sum(1 for step, old_index in zip(step_list, old_cluster_indexes)
+                             if old_index is not None and step.cluster_index != old_index)
+        drift_report = {
+            "step_num": len(step_list),
+            "unclustered_step_num": len(step_list) - old_step_num,
+            "old_cluster_num": len({index for index in old_cluster_indexes if index is not None}),
+            "new_cluster_num": len(index_cluster_dict),
+            "kept_cluster_num": len(set(new_index_mapping.values()) & set(old_cluster_indexes)),
+            "moved_step_num": moved_step_num,
+            "moved_step_ratio": moved_step_num / old_step_num if old_step_num else 0,
+            "adjusted_rand_index": Bugs.get_adjusted_rand_index(pair_count_dict),
+        }
+        logging.warning(f"Step cluster drift: {json.dumps(drift_report)}")
+        return drift_report
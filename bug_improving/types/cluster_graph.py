@@ -0,0 +1,165 @@
+import os
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+
+class ClusterGraph:
+    """
+    step cluster transition graph in compressed sparse row (CSR) form, built once from the step clusters
+    edge cluster_index_1 -> cluster_index_2 if step.next_step of a step in cluster_index_1 is in cluster_index_2,
+    weight: number of such transitions (steps)
+    successors of cluster i: indices[indptr[i]:indptr[i + 1]] (ascending), weights aligned with indices
+    files in dirpath (next to a GraphStore): cluster_graph_indptr.npy, cluster_graph_indices.npy,
+    cluster_graph_weights.npy
+    """
+    NAMES = ["indptr", "indices", "weights"]
+
+    def __init__(self, indptr, indices, weights):
+        self.indptr = indptr  # int64 (cluster_num + 1)
+        self.indices = indices  # int64 (edge_num), successor cluster indexes
+        self.weights = weights  # int64 (edge_num), transition counts
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @staticmethod
+    def from_edges(source_cluster_indexes, target_cluster_indexes, cluster_num):
+        """
+        @param source_cluster_indexes: cluster index of each transition (step)
+        @type source_cluster_indexes: np.ndarray
+        @param target_cluster_indexes: cluster index of its next step
+        @type target_cluster_indexes: np.ndarray
+        @param cluster_num: clusters are 0, 1, ..., cluster_num - 1
+        @type cluster_num: int
+        @return:
+        @rtype: ClusterGraph
+        """
+        sources = np.asarray(source_cluster_indexes, dtype=np.int64)
+        targets = np.asarray(target_cluster_indexes, dtype=np.int64)
+        edges, weights = np.unique(sources * cluster_num + targets, return_counts=True)
+        sources, indices = np.divmod(edges, cluster_num) if cluster_num else (edges, edges)
+        indptr = np.zeros(cluster_num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=cluster_num), out=indptr[1:])
+        return ClusterGraph(indptr, indices.astype(np.int64), weights.astype(np.int64))
+
+    @staticmethod
+    def from_index_cluster_dict(index_cluster_dict):
+        """
+        walk step.next_step of every step once
+        @param index_cluster_dict: dict{ key: cluster_index, value: cluster (set of steps) }
+        @type index_cluster_dict: dict
+        @return:
+        @rtype: ClusterGraph
+        """
+        cluster_num = max(index_cluster_dict.keys()) + 1 if index_cluster_dict else 0
+        sources = []
+        targets = []
+        for cluster_index, cluster in index_cluster_dict.items():
+            for step in cluster:
+                if step.next_step and step.next_step.cluster_index is not None:
+                    sources.append(cluster_index)
+                    targets.append(step.next_step.cluster_index)
+        return ClusterGraph.from_edges(sources, targets, cluster_num)
+
+    @staticmethod
+    def from_step_columns(step_cluster_indexes, step_nexts, cluster_num, null_int=-1):
+        """
+        from the step_cluster_index and step_next columns of a GraphStore, without Step objects
+        """
+        step_cluster_indexes = np.asarray(step_cluster_indexes)
+        step_nexts = np.asarray(step_nexts)
+        steps = np.flatnonzero((step_nexts != null_int) & (step_cluster_indexes != null_int))
+        targets = step_cluster_indexes[step_nexts[steps]]
+        mask = targets != null_int
+        return ClusterGraph.from_edges(step_cluster_indexes[steps][mask], targets[mask], cluster_num)
+
+    @staticmethod
+    def exists(dirpath):
+        return all(os.path.exists(Path(dirpath, f"cluster_graph_{name}.npy")) for name in ClusterGraph.NAMES)
+
+    def save(self, dirpath):
+        os.makedirs(dirpath, exist_ok=True)
+        for name in ClusterGraph.NAMES:
+            np.save(Path(dirpath, f"cluster_graph_{name}.npy"), getattr(self, name))
+
+    @staticmethod
+    def load(dirpath, mmap_mode="r"):
+        return ClusterGraph(*[np.load(Path(dirpath, f"cluster_graph_{name}.npy"), mmap_mode=mmap_mode)
+                              for name in ClusterGraph.NAMES])
+
+    def get_successors(self, cluster_index):
+        """
+        @return: successor cluster indexes (ascending)
+        @rtype: np.ndarray
+        """
+        return self.indices[self.indptr[cluster_index]:self.indptr[cluster_index + 1]]
+
+    def get_successor_weights(self, cluster_index):
+        """
+        @return: transition counts, aligned with ClusterGraph.get_successors(cluster_index)
+        @rtype: np.ndarray
+        """
+        return self.weights[self.indptr[cluster_index]:self.indptr[cluster_index + 1]]
+
+    def get_transition_count(self, cluster_index_1, cluster_index_2):
+        successors = self.get_successors(cluster_index_1)
+        position = np.searchsorted(successors, cluster_index_2)
+        if position < len(successors) and successors[position] == cluster_index_2:
+            return int(self.get_successor_weights(cluster_index_1)[position])
+        return 0
+
+    def bfs(self, cluster_index, max_hop=None):
+        """
+        breadth-first search from cluster_index, each cluster is visited once
+        @param cluster_index: the start node
+        @type cluster_index: int
+        @param max_hop: stop after max_hop layers, None means all the reachable clusters
+        @type max_hop: int
+        @return: layers [[cluster_index], [1-hop cluster indexes], [2-hop cluster indexes], ...], without empty layers
+        @rtype: list
+        """
+        visited = {cluster_index}
+        layers = [[cluster_index]]
+        queue = deque([(cluster_index, 0)])
+        while queue:
+            node, hop = queue.popleft()
+            if max_hop is not None and hop >= max_hop:
+                continue
+            for neighbour in self.get_successors(node).tolist():
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    queue.append((neighbour, hop + 1))
+                    if len(layers) == hop + 1:
+                        layers.append([])
+                    layers[hop + 1].append(neighbour)
+        return layers
+
+    def get_k_hop_clusters(self, cluster_index, k):
+        """
+        @return: cluster indexes reachable in 1 - k hops (cluster_index excluded)
+        @rtype: set
+        """
+        return {neighbour for layer in self.bfs(cluster_index, k)[1:] for neighbour in layer}
+
+    def get_shortest_path(self, source_cluster_index, target_cluster_index):
+        """
+        fewest transitions from source to target by BFS
+        @return: [source_cluster_index, ..., target_cluster_index], None if target is not reachable
+        @rtype: list
+        """
+        parent_dict = {source_cluster_index: None}  # dict{ key: cluster_index, value: previous cluster_index }
+        queue = deque([source_cluster_index])
+        while queue and target_cluster_index not in parent_dict:
+            node = queue.popleft()
+            for neighbour in self.get_successors(node).tolist():
+                if neighbour not in parent_dict:
+                    parent_dict[neighbour] = node
+                    queue.append(neighbour)
+        if target_cluster_index not in parent_dict:
+            return None
+        path = [target_cluster_index]
+        while parent_dict[path[-1]] is not None:
+            path.append(parent_dict[path[-1]])
+        return path[::-1]
@@ -147,7 +147,7 @@ class Step:
         return False
 
     @staticmethod
-    def extract_action_target_condition_concept_tuple(text):
+    def extract_action_target_condition_concept_tuple(text, doc=None):
         """
         Have session store enabled.  -> verb + nsubj or nsubjpass
         Click the CONCEPT_13 button. -> verb + obj
@@ -194,7 +194,54 @@ class Step:
         # print(SentUtil.NLP.pipe_names)
         # if not doc:
         text = SeedExtractor.replace_seed_by_placeholder(text)
-        doc = NLPUtil.SPACY_NLP(text)
+        if doc is None:
+            doc = NLPUtil.SPACY_NLP(text)
+        verb_phrase, obj, main_part, concepts, concepts_in_object = Step.extract_action_target_concept_tuple(text, doc)
+
+        text = SeedExtractor.replace_placeholder_by_seed(text)[0]
+        conditions = Step.extract_condition(text, main_part)
+        # condition = Step.extract_condition(text, verb_phrase, obj)
+
+        return verb_phrase, obj, conditions, concepts, concepts_in_object
+
+    @staticmethod
+    def extract_action_target_condition_concept_tuples_by_batch(texts):
+        """
+        Step.extract_action_target_condition_concept_tuple for texts,
+        with docs (and docs of condition texts) of NLPUtil.get_docs_by_spacy_batch
+        @param texts:
+        @type texts: list
+        @return: [(verb_phrase, obj, conditions, concepts, concepts_in_object), ...] in the order of texts
+        @rtype: list
+        """
+        NLPUtil.SPACY_NLP.enable_pipe("merge_noun_chunks")
+        texts = [SeedExtractor.replace_seed_by_placeholder(text) for text in texts]
+        docs = NLPUtil.get_docs_by_spacy_batch(texts)
+        action_target_concept_tuples = list()
+        condition_texts = list()
+        for index, doc in enumerate(docs):
+            action_target_concept_tuples.append(Step.extract_action_target_concept_tuple(texts[index], doc))
+            texts[index] = SeedExtractor.replace_placeholder_by_seed(texts[index])[0]
+            condition_texts.append(Step.get_condition_text(texts[index], action_target_concept_tuples[-1][2]))
+        condition_docs = NLPUtil.get_docs_by_spacy_batch(condition_texts)
+
+        action_target_condition_concept_tuples = list()
+        for index, condition_doc in enumerate(condition_docs):
+            verb_phrase, obj, main_part, concepts, concepts_in_object = action_target_concept_tuples[index]
+            conditions = Step.extract_condition(texts[index], main_part, condition_doc)
+            action_target_condition_concept_tuples.append((verb_phrase, obj, conditions, concepts, concepts_in_object))
+        return action_target_condition_concept_tuples
+
+    @staticmethod
+    def extract_action_target_concept_tuple(text, doc):
+        """
+        @param text: text with placeholders
+        @type text: str
+        @param doc: NLPUtil.SPACY_NLP(text)
+        @type doc: spacy.tokens.Doc
+        @return: (verb_phrase, obj, main_part, concepts, concepts_in_object)
+        @rtype: tuple
+        """
         # extract root verb
         root = [token for token in doc if token.head == token]  # verb
         adv_left = None  # adv to modify verb advmod 状语
@@ -292,23 +339,35 @@ class Step:
             for index, concept in enumerate(concepts_in_object):
                 concepts_in_object[index] = SeedExtractor.replace_placeholder_by_seed(concept)[0]
 
-        text = SeedExtractor.replace_placeholder_by_seed(text)[0]
-        conditions = Step.extract_condition(text, main_part)
-        # condition = Step.extract_condition(text, verb_phrase, obj)
+        return verb_phrase, obj, main_part, concepts, concepts_in_object
 
-        return verb_phrase, obj, conditions, concepts, concepts_in_object
+    @staticmethod
+    def get_condition_text(text, main_part):
+        """
+        use click to replace Verb_phrase, use button replace obj for pps extraction
+        """
+        text = text.replace(main_part, "click button")
+        return SeedExtractor.replace_seed_by_placeholder(text)
 
     @classmethod
-    def extract_condition(cls, text, main_part):
+    def extract_condition(cls, text, main_part, doc=None):
+        """
+        @param text:
+        @type text: str
+        @param main_part:
+        @type main_part: str
+        @param doc: NLPUtil.SPACY_NLP(Step.get_condition_text(text, main_part)) if it is already parsed (by batch)
+        @type doc: spacy.tokens.Doc
+        @return: [prep phrase, ...] or None
+        @rtype: list
+        """
         # SpacyModel.NLP.disable_pipes("benepar")
         # logging.warning(SpacyModel.NLP.pipe_names)
         conditions = list()
         # print(main_part)
-        # use click to replace Verb_phrase, use button replace obj for pps extraction
-        text = text.replace(main_part, "click button")
-        text = SeedExtractor.replace_seed_by_placeholder(text)
-
-        doc = NLPUtil.SPACY_NLP(text)
+        if doc is None:
+            text = Step.get_condition_text(text, main_part)
+            doc = NLPUtil.SPACY_NLP(text)
         prep_phrases = SentUtil.extract_prep_phrases(doc)
         for pp in prep_phrases:
             pp = SeedExtractor.replace_placeholder_by_seed(str(pp))[0]
@@ -504,13 +563,17 @@ class Description:
         return steps
 
     @classmethod
-    def extract_steps(cls, section):
+    def extract_steps(cls, section, sent_table):
         """
         # 1. split section into steps
         # 2. remove non alphanumeric steps
         # 3. remove serial number from the step begining
         # 4. replace seed by placeholder
         5. split sentences into atomic steps
+        @param section: [step (str), ...]
+        @type section: list
+        @param sent_table: SentTable of a batch with the steps of section (SentUtil.get_sent_table)
+        @type sent_table: SentTable
         """
         # steps = section.splitlines()  # split section text into lines
         # logging.warning("SpaCy NLP for Constituency Dependency...")
@@ -525,7 +588,12 @@ class Description:
             # step = NLPUtil.remove_text_between_parenthesis(step)
             atomic_steps = [step]
             # if step has cconj
-            if SentUtil.SENT_HAS_CCONJ_LIST[SentUtil.SENT_LIST.index(step)]:
+            has_cconj = sent_table.has_cconj(step)
+            parsed_atomic_steps = sent_table.get_atomic_sents(step) if has_cconj else None
+            if parsed_atomic_steps is not None:
+                # parsed by SentUtil.split_atomic_sents_by_benepar_batch
+                atomic_steps = parsed_atomic_steps
+            elif has_cconj:
                 # step_doc = SentUtil.SENT_CONS_DOC_LIST[SentUtil.SENT_LIST.index(step)]
                 # have unlimited recursion
                 try:
@@ -358,6 +358,8 @@ class Element:
                         # "if category is not Others, "
                         "add categories into elements by data_l10n_id only + "
                         "add into category_element_dict")
+        # preprocess the data_l10n_ids in batches, get_category_from_data_l10n_id reads NLPUtil.PREPROCESS_CACHE
+        NLPUtil.preprocess_batch([element.id for element in elements if element.category is None and element.id])
         for element in tqdm(elements, ascii=True):
             if element.category is None:
                 # logging.warning(f"{element}")
@@ -8,6 +8,8 @@ import sentence_transformers
 from tqdm import tqdm
 
 from bug_improving.event_extraction.placeholder import Placeholder
+from bug_improving.utils.aho_corasick import AhoCorasick
+from bug_improving.utils.embedding_util import EmbeddingUtil
 from bug_improving.utils.list_util import ListUtil
 from bug_improving.utils.nlp_util import SentUtil, NLPUtil
 from config import ELEMENT_MERGE_THRESHOLD
@@ -58,8 +60,8 @@ class Action:
         return hash(str(self))
 
     def get_action_embedding_list(self):
-        self.equivalent_embedding = NLPUtil.SBERT_MODEL.encode(self.equivalent)
-        self.opposite_embedding = NLPUtil.SBERT_MODEL.encode(self.opposite)
+        self.equivalent_embedding = EmbeddingUtil.encode(self.equivalent)
+        self.opposite_embedding = EmbeddingUtil.encode(self.opposite)
 
     @staticmethod
     def merge_name_alias_from_action_name_list(action_name_list):
@@ -342,14 +344,45 @@ class Category:
         return self.name == other.name
 
     @staticmethod
-    def extract_category(text):
+    def extract_categories_by_batch(texts):
+        """
+        Category.extract_category for texts, with docs of NLPUtil.get_docs_by_spacy_batch
+        @param texts: [text (with placeholders), text, ...]
+        @type texts: list
+        @return: [concept_category_pair_list, ...] in the order of texts
+        @rtype: list
+        """
+        NLPUtil.SPACY_NLP.disable_pipes("merge_noun_chunks", "benepar")
+        # texts longer than 512 have no categories, not parsed
+        parsed_texts = [text for text in texts if len(text) <= 512]
+        docs = iter(NLPUtil.get_docs_by_spacy_batch(parsed_texts))
+        concept_category_pair_lists = list()
+        for text in texts:
+            if len(text) <= 512:
+                concept_category_pair_lists.append(Category.extract_category(text, next(docs)))
+            else:
+                concept_category_pair_lists.append(list())
+        return concept_category_pair_lists
+
+    @staticmethod
+    def extract_category(text, doc=None):
+        """
+        @param text: text with placeholders
+        @type text: str
+        @param doc: NLPUtil.SPACY_NLP(text) if it is already parsed (by batch)
+        @type doc: spacy.tokens.Doc
+        @return: [(concept placeholder, category or None), ...]
+        @rtype: list
+        """
         concept_category_pair_list = list()
 
-        NLPUtil.SPACY_NLP.disable_pipes("merge_noun_chunks", "benepar")
+        if doc is None:
+            NLPUtil.SPACY_NLP.disable_pipes("merge_noun_chunks", "benepar")
 
         # print(SentUtil.NLP.pipe_names)
         if len(text) <= 512:
-            doc = NLPUtil.SPACY_NLP(text)
+            if doc is None:
+                doc = NLPUtil.SPACY_NLP(text)
 
             concepts = [token for token in doc if re.fullmatch(rf"{Placeholder.CONCEPT}\d+", str(token), flags=0)]
             if len(concepts) == 0:
@@ -490,7 +523,7 @@ class Category:
             category = categories.find_category_by_name(category_name)
             if not category:
                 category = Category(category_name)
-                categories.categories.append(category)
+                categories.add_category(category)
             if category.name in Placeholder.EXTERNAL_KNOWLEDGE_DICT.keys():
                 for concept_name in Placeholder.EXTERNAL_KNOWLEDGE_DICT[category.name]:
                     id = len(concepts)
@@ -560,7 +593,7 @@ class Actions:
         # return self.concept_name_list
 
     def get_action_name_embedding_list(self):
-        self.action_name_embedding_list = NLPUtil.SBERT_MODEL.encode(self.action_name_list)
+        self.action_name_embedding_list = EmbeddingUtil.encode(self.action_name_list)
 
     def add_action_by_name(self, name):
         """
@@ -606,6 +639,11 @@ class Concepts:
         self.concepts = concepts
         self.concept_name_list = None
         self.concept_name_embedding_list = None
+        # name index, built by Concepts.update_name_index, maintained by add_concept / add_concept_alias / rename_concept
+        self.name_concept_dict = None  # key: concept name or alia, value: concept (the first one in self.concepts)
+        self.normalized_name_concept_dict = None  # key: Concepts.normalize_name(concept name or alia), value: concept
+        self.indexed_concept_num = 0  # self.concepts[:indexed_concept_num] are in the name index
+        self.name_automaton = None  # AhoCorasick over the keys of normalized_name_concept_dict, None after changes
         # self.num = len(categories)
 
     def __iter__(self):
@@ -628,7 +666,7 @@ class Concepts:
         # return self.concept_name_list
 
     def get_concept_name_embedding_list(self):
-        self.concept_name_embedding_list = NLPUtil.SBERT_MODEL.encode(self.concept_name_list)
+        self.concept_name_embedding_list = EmbeddingUtil.encode(self.concept_name_list)
 
     # def merge_concepts_by_util_cos(self, categories, category_concept_dict):
     #     """
@@ -785,13 +823,13 @@ class Concepts:
             # print(concept_clusters)
             # # ##########################################################################################################
             category_names = list(Placeholder.CATEGORY_TAG_DICT.keys())
-            category_names_embeddings = NLPUtil.SBERT_MODEL.encode(category_names, convert_to_tensor=True)
+            category_names_embeddings = EmbeddingUtil.encode(category_names, convert_to_tensor=True)
 
             concept_names = list(ListUtil.convert_nested_list_to_flatten_list(category_concept_dict.values()))
-            concept_names_embeddings = NLPUtil.SBERT_MODEL.encode(concept_names, convert_to_tensor=True)
+            concept_names_embeddings = EmbeddingUtil.encode(concept_names, convert_to_tensor=True)
             confirmed_concept_names = list(self.concept_name_list)
-            confirmed_concept_names_embeddings = NLPUtil.SBERT_MODEL.encode(confirmed_concept_names,
-                                                                            convert_to_tensor=True)
+            confirmed_concept_names_embeddings = EmbeddingUtil.encode(confirmed_concept_names,
+                                                                      convert_to_tensor=True)
 
             # cossim_pairs_list = NLPUtil.get_pairs_with_cossim_by_decreasing(concept_names_embeddings,
             #                                                                 confirmed_concept_names_embeddings)
@@ -805,15 +843,15 @@ class Concepts:
                 if cossim_pair[0]["score"] >= ELEMENT_MERGE_THRESHOLD:
                     if confirmed_concept_name != concept_name:
                         confirmed_concept = self.find_concept_by_name(confirmed_concept_name)
-                        confirmed_concept.add_alias(concept_name)
+                        self.add_concept_alias(confirmed_concept, concept_name)
                 else:
                     # embeddings1 = NLPUtil.SENTENCE_TRANSFORMER.encode(sentences1, convert_to_tensor=True)
                     # embeddings2 = NLPUtil.SENTENCE_TRANSFORMER.encode(sentences2, convert_to_tensor=True)
                     for key in category_concept_dict.keys():
                         if concept_name in category_concept_dict[key]:
                             concept_category = key
-                            concept_category_embeddings = NLPUtil.SBERT_MODEL.encode([concept_category],
-                                                                                     convert_to_tensor=True)
+                            concept_category_embeddings = EmbeddingUtil.encode([concept_category],
+                                                                               convert_to_tensor=True)
                             # cossim_pairs_list = NLPUtil.get_pairs_with_cossim_by_decreasing(concept_category_embeddings,
                             #                                                                 category_names_embeddings)
                             cossim_pair_list = sentence_transformers.util.semantic_search(concept_category_embeddings,
@@ -846,7 +884,7 @@ class Concepts:
                             #     self.concepts.append(new_concept)
                             # # ##########################################################################################################
                             new_concept = Concept(len(self.concepts), concept_name, concept_category)
-                            self.concepts.append(new_concept)
+                            self.add_concept(new_concept)
             self.get_concept_name_list()
             self.get_concept_name_embedding_list()
         return categories
@@ -860,25 +898,109 @@ class Concepts:
         """
         return
 
-    def find_concept_by_name(self, concept_name):
+    @staticmethod
+    def normalize_name(name):
+        """
+        lower case, whitespace collapsed: "Save  Page" -> "save page"
         """
+        return " ".join(str(name).split()).lower()
 
+    def index_concept_name(self, concept, name):
+        """
+        put name (concept name or alia) of concept into the name index,
+        if name is of several concepts, the first one in self.concepts (smallest id) is kept
+        """
+        for name_concept_dict, key in ((self.name_concept_dict, name),
+                                       (self.normalized_name_concept_dict, Concepts.normalize_name(name))):
+            indexed_concept = name_concept_dict.get(key, None)
+            if indexed_concept is None or concept.id < indexed_concept.id:
+                name_concept_dict[key] = concept
+        self.name_automaton = None
+
+    def update_name_index(self):
+        """
+        build the name index or add the concepts appended to self.concepts since the last update
+        """
+        if self.name_concept_dict is None:
+            self.name_concept_dict = dict()
+            self.normalized_name_concept_dict = dict()
+            self.indexed_concept_num = 0
+        for concept in self.concepts[self.indexed_concept_num:]:
+            self.index_concept_name(concept, concept.name)
+            if concept.alias:
+                for alia in concept.alias:
+                    self.index_concept_name(concept, alia)
+        self.indexed_concept_num = len(self.concepts)
+
+    def add_concept(self, concept):
+        self.concepts.append(concept)
+        if self.name_concept_dict is not None:
+            self.update_name_index()
+
+    def add_concept_alias(self, concept, alia):
+        concept.add_alias(alia)
+        if self.name_concept_dict is not None:
+            self.index_concept_name(concept, alia)
+
+    def rename_concept(self, concept, name):
+        """
+        the old name may be kept by other concepts (as name or alia), so the name index is rebuilt
+        """
+        concept.name = name
+        self.name_concept_dict = None
+        self.update_name_index()
+        if self.concept_name_list is not None:
+            self.get_concept_name_list()
+
+    def find_concept_by_name(self, concept_name):
+        """
+        O(1) lookup in the name index: the first concept with concept_name as its name or alia,
+        if none, the first concept with the same normalized name or alia (Concepts.normalize_name)
         @param concept_name:
-        @type concept_name:
-        @return:
-        @rtype:
+        @type concept_name: string
+        @return: concept or None
+        @rtype: Concept
         """
-        for concept in self.concepts:
-            if concept.name == concept_name:
-                return concept
-            elif concept.alias and concept_name in concept.alias:
-                return concept
-        return None
+        if self.name_concept_dict is None or self.indexed_concept_num != len(self.concepts):
+            self.update_name_index()
+        concept = self.name_concept_dict.get(concept_name, None)
+        if concept is None:
+            concept = self.normalized_name_concept_dict.get(Concepts.normalize_name(concept_name), None)
+        return concept
+
+    def find_concepts_in_text(self, text):
+        """
+        concepts whose (normalized) name or alia occurs in text as whole words,
+        by one pass of an AhoCorasick automaton over all names and alias,
+        longer matches first, then leftmost ones, without overlapping
+        @param text:
+        @type text: string
+        @return: [concept, ...] in the order of the text (repetitive concepts are kept)
+        @rtype: list
+        """
+        if self.name_concept_dict is None or self.indexed_concept_num != len(self.concepts):
+            self.update_name_index()
+        if self.name_automaton is None:
+            self.name_automaton = AhoCorasick({name: name for name in self.normalized_name_concept_dict.keys()})
+        text = Concepts.normalize_name(text)
+        matches = [(start, end, name) for start, end, name in self.name_automaton.find_all(text)
+                   if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())]
+        matches.sort(key=lambda match: (match[0] - match[1], match[0]))
+        occupied = bytearray(len(text))
+        spans = []
+        for start, end, name in matches:
+            if occupied.find(1, start, end) == -1:
+                occupied[start:end] = b"\x01" * (end - start)
+                spans.append((start, name))
+        spans.sort()
+        return [self.normalized_name_concept_dict[name] for _, name in spans]
 
 
 class Categories:
     def __init__(self, categories):
         self.categories = categories
+        self.name_category_dict = None  # key: category name, value: category (the first one in self.categories)
+        self.indexed_category_num = 0  # self.categories[:indexed_category_num] are in name_category_dict
         # self.num = len(categories)
 
     def __iter__(self):
@@ -894,6 +1016,22 @@ class Categories:
     # def __eq__(self, other):
     #     return f'{self.categories}'
 
+    def update_name_index(self):
+        """
+        build name_category_dict or add the categories appended to self.categories since the last update
+        """
+        if self.name_category_dict is None:
+            self.name_category_dict = dict()
+            self.indexed_category_num = 0
+        for category in self.categories[self.indexed_category_num:]:
+            self.name_category_dict[category.name] = self.name_category_dict.get(category.name, category)
+        self.indexed_category_num = len(self.categories)
+
+    def add_category(self, category):
+        self.categories.append(category)
+        if self.name_category_dict is not None:
+            self.update_name_index()
+
     def find_category_by_name(self, name):
         """
         find category by using category_name
@@ -910,9 +1048,11 @@ class Categories:
         @rtype:
         """
         if self.categories:
-            for category in self.categories:
-                if category.name == name:
-                    return category
+            if self.name_category_dict is None or self.indexed_category_num != len(self.categories):
+                self.update_name_index()
+            category = self.name_category_dict.get(name, None)
+            if category is not None:
+                return category
 
         # category = Category(name)
         # self.categories.append(category)
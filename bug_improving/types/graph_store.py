@@ -0,0 +1,412 @@
+import json
+import os
+import pickle
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from bug_improving.types.bug import Bug, Bugs
+from bug_improving.types.cluster_graph import ClusterGraph
+from bug_improving.types.description import Description, Step
+
+
+class LazyMapping(Mapping):
+    """
+    read-only dict whose values are got by get_value(key) when they are accessed first
+    """
+
+    def __init__(self, keys, get_value):
+        self.keys_list = keys
+        self.get_value = get_value
+        self.key_value_dict = dict()  # cache of accessed values
+
+    def __getitem__(self, key):
+        if key not in self.key_value_dict:
+            if key not in self.keys_list:
+                raise KeyError(key)
+            self.key_value_dict[key] = self.get_value(key)
+        return self.key_value_dict[key]
+
+    def __contains__(self, key):
+        return key in self.keys_list
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __len__(self):
+        return len(self.keys_list)
+
+
+class LazySequence(Sequence):
+    """
+    read-only list whose items are got by get_item(index) when they are accessed
+    """
+
+    def __init__(self, length, get_item):
+        self.length = length
+        self.get_item = get_item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_item(i) for i in range(*index.indices(self.length))]
+        if index < 0:
+            index = index + self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.get_item(index)
+
+    def __len__(self):
+        return self.length
+
+
+class BytesColumn(Sequence):
+    """
+    variable-length values: {name}.offsets.npy (int64, n + 1) and {name}.bytes.npy (uint8), both memory-mapped
+    None values are kept by {name}.nulls.npy (bool)
+    """
+
+    def __init__(self, dirpath, name):
+        self.offsets = np.load(Path(dirpath, f"{name}.offsets.npy"), mmap_mode="r")
+        self.data = np.load(Path(dirpath, f"{name}.bytes.npy"), mmap_mode="r")
+        self.nulls = np.load(Path(dirpath, f"{name}.nulls.npy"), mmap_mode="r")
+
+    @staticmethod
+    def write(dirpath, name, values):
+        """
+        @param values: [bytes or None, ...]
+        @type values: list
+        """
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        nulls = np.zeros(len(values), dtype=bool)
+        for index, value in enumerate(values):
+            nulls[index] = value is None
+            offsets[index + 1] = offsets[index] + (0 if value is None else len(value))
+        np.save(Path(dirpath, f"{name}.offsets.npy"), offsets)
+        np.save(Path(dirpath, f"{name}.bytes.npy"),
+                np.frombuffer(b"".join(value for value in values if value is not None), dtype=np.uint8))
+        np.save(Path(dirpath, f"{name}.nulls.npy"), nulls)
+
+    def __getitem__(self, index):
+        if self.nulls[index]:
+            return None
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __len__(self):
+        return len(self.nulls)
+
+
+class StringColumn(BytesColumn):
+    """
+    BytesColumn of utf-8 strings
+    """
+
+    @staticmethod
+    def write(dirpath, name, values):
+        BytesColumn.write(dirpath, name, [None if value is None else value.encode("utf-8") for value in values])
+
+    def __getitem__(self, index):
+        value = super().__getitem__(index)
+        if value is None:
+            return None
+        return value.decode("utf-8")
+
+
+class GraphStore:
+    """
+    columnar, memory-mapped store of the bug knowledge graph (Bugs with Step objects and step clusters)
+    files in dirpath:
+        meta.json
+        bug table (row = bug):
+            bug_id, bug_summary, bug_status: StringColumn (bug_id is json, int ids stay int)
+            bug_creation_time, bug_closed_time, bug_last_change_time: int64 microseconds, GraphStore.NULL_TIME if None
+            bug_step_offsets: int64 (bug_num + 1), steps of bug i are step rows [offsets[i], offsets[i + 1])
+            bug_has_steps: bool, False if description.steps_to_reproduce is None
+            bug_objects: BytesColumn, pickle of the other (rarely used) attributes of bug and description
+        step table (row = step, in the order of Bugs.get_steps):
+            step_bug: int64 bug row
+            step_id, step_cluster_index: int64, GraphStore.NULL_INT if None
+            step_is_operational: int8, -1 if None
+            step_text: StringColumn
+        edge lists: step_prev, step_next: int64 step row, GraphStore.NULL_INT if None
+        cluster index arrays: cluster_step_offsets (int64, cluster_num + 1) and cluster_steps (int64 step rows)
+        cluster transition graph: ClusterGraph files (cluster_graph_indptr, cluster_graph_indices, cluster_graph_weights)
+        embedding matrix (optional): step_embeddings.npy (float32, step_num x dim, rows aligned with the step table)
+    Bug and Step objects are materialized a bug (with all its steps) at a time, when a query touches them,
+    and cached, so the same bug is always the same object
+    """
+    NULL_INT = -1
+    NULL_TIME = np.iinfo(np.int64).min
+    EPOCH = datetime(1970, 1, 1)
+    BUG_OBJECT_ATTRIBUTES = ["product_component_pair", "tossing_path", "type", "attachments"]
+    DESCRIPTION_OBJECT_ATTRIBUTES = ["text", "prerequisites", "expected_results", "actual_results", "notes"]
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.meta = json.loads(Path(dirpath, "meta.json").read_text())
+        self.bug_ids = StringColumn(dirpath, "bug_id")
+        self.bug_summaries = StringColumn(dirpath, "bug_summary")
+        self.bug_statuses = StringColumn(dirpath, "bug_status")
+        self.bug_objects = BytesColumn(dirpath, "bug_objects")
+        self.bug_step_offsets = self.load_array("bug_step_offsets")
+        self.bug_has_steps = self.load_array("bug_has_steps")
+        self.bug_creation_times = self.load_array("bug_creation_time")
+        self.bug_closed_times = self.load_array("bug_closed_time")
+        self.bug_last_change_times = self.load_array("bug_last_change_time")
+
+        self.step_bugs = self.load_array("step_bug")
+        self.step_ids = self.load_array("step_id")
+        self.step_cluster_indexes = self.load_array("step_cluster_index")
+        self.step_is_operationals = self.load_array("step_is_operational")
+        self.step_texts = StringColumn(dirpath, "step_text")
+        self.step_prevs = self.load_array("step_prev")
+        self.step_nexts = self.load_array("step_next")
+
+        self.cluster_step_offsets = self.load_array("cluster_step_offsets")
+        self.cluster_steps = self.load_array("cluster_steps")
+        # None for stores written before the cluster graph was stored
+        self.cluster_graph = ClusterGraph.load(dirpath) if ClusterGraph.exists(dirpath) else None
+
+        self.row_bug_dict = dict()  # dict{ key: bug row, value: bug (Bug) }, materialized bugs
+        self.step_row_step_dict = dict()  # dict{ key: step row, value: step (Step) }, materialized steps
+        self.bug_id_row_dict = None  # dict{ key: Bugs.get_bug_id_key(bug id), value: bug row }
+
+        self.step_index_cluster_dict = LazyMapping(range(self.meta["cluster_num"]), self.get_cluster)
+        self.step_list = LazySequence(self.meta["step_num"], self.get_step)
+
+    def load_array(self, name):
+        return np.load(Path(self.dirpath, f"{name}.npy"), mmap_mode="r")
+
+    @staticmethod
+    def exists(dirpath):
+        return os.path.exists(Path(dirpath, "meta.json"))
+
+    @staticmethod
+    def datetime_to_int(value):
+        if value is None:
+            return GraphStore.NULL_TIME
+        return (value - GraphStore.EPOCH) // timedelta(microseconds=1)
+
+    @staticmethod
+    def int_to_datetime(value):
+        if value == GraphStore.NULL_TIME:
+            return None
+        return GraphStore.EPOCH + timedelta(microseconds=int(value))
+
+    @staticmethod
+    def write(bugs, dirpath, step_embeddings=None):
+        """
+        write bugs (with Step objects and bugs.step_index_cluster_dict) into dirpath
+        @param bugs:
+        @type bugs: Bugs
+        @param dirpath:
+        @type dirpath: Path
+        @param step_embeddings: embeddings of steps in the order of bugs.get_steps(), None means no embedding matrix
+        @type step_embeddings: numpy.ndarray or torch.Tensor
+        @return:
+        @rtype:
+        """
+        os.makedirs(dirpath, exist_ok=True)
+        step_list, step_text_list = bugs.get_steps()
+        step_row_dict = {id(step): row for row, step in enumerate(step_list)}  # key: id(step), value: step row
+
+        bug_step_offsets = np.zeros(len(bugs) + 1, dtype=np.int64)
+        bug_has_steps = np.zeros(len(bugs), dtype=bool)
+        bug_times = [np.zeros(len(bugs), dtype=np.int64) for _ in range(3)]
+        bug_objects = []
+        step_bug = np.zeros(len(step_list), dtype=np.int64)
+        for row, bug in enumerate(bugs):
+            steps = bug.description.steps_to_reproduce
+            bug_has_steps[row] = steps is not None
+            bug_step_offsets[row + 1] = bug_step_offsets[row] + (len(steps) if steps else 0)
+            step_bug[bug_step_offsets[row]:bug_step_offsets[row + 1]] = row
+            for index, value in enumerate([bug.creation_time, bug.closed_time, bug.last_change_time]):
+                bug_times[index][row] = GraphStore.datetime_to_int(value)
+            objects = {attribute: getattr(bug, attribute, None) for attribute in GraphStore.BUG_OBJECT_ATTRIBUTES}
+            for attribute in GraphStore.DESCRIPTION_OBJECT_ATTRIBUTES:
+                objects[attribute] = getattr(bug.description, attribute, None)
+            bug_objects.append(pickle.dumps(objects))
+        StringColumn.write(dirpath, "bug_id", [json.dumps(bug.id) for bug in bugs])
+        StringColumn.write(dirpath, "bug_summary", [bug.summary for bug in bugs])
+        StringColumn.write(dirpath, "bug_status", [bug.status for bug in bugs])
+        BytesColumn.write(dirpath, "bug_objects", bug_objects)
+        np.save(Path(dirpath, "bug_step_offsets.npy"), bug_step_offsets)
+        np.save(Path(dirpath, "bug_has_steps.npy"), bug_has_steps)
+        for name, times in zip(["bug_creation_time", "bug_closed_time", "bug_last_change_time"], bug_times):
+            np.save(Path(dirpath, f"{name}.npy"), times)
+
+        step_ids = np.full(len(step_list), GraphStore.NULL_INT, dtype=np.int64)
+        step_cluster_indexes = np.full(len(step_list), GraphStore.NULL_INT, dtype=np.int64)
+        step_is_operationals = np.full(len(step_list), -1, dtype=np.int8)
+        step_prevs = np.full(len(step_list), GraphStore.NULL_INT, dtype=np.int64)
+        step_nexts = np.full(len(step_list), GraphStore.NULL_INT, dtype=np.int64)
+        for row, step in enumerate(step_list):
+            if not isinstance(step, Step):
+                raise TypeError(f"steps to reproduce of bug {bugs[step_bug[row]].id} are not Step objects")
+            if step.id is not None:
+                step_ids[row] = step.id
+            if step.cluster_index is not None:
+                step_cluster_indexes[row] = step.cluster_index
+            if step.is_operational is not None:
+                step_is_operationals[row] = int(step.is_operational)
+            if step.prev_step is not None:
+                step_prevs[row] = step_row_dict[id(step.prev_step)]
+            if step.next_step is not None:
+                step_nexts[row] = step_row_dict[id(step.next_step)]
+        StringColumn.write(dirpath, "step_text", step_text_list)
+        for name, array in [("step_bug", step_bug), ("step_id", step_ids), ("step_cluster_index", step_cluster_indexes),
+                            ("step_is_operational", step_is_operationals), ("step_prev", step_prevs),
+                            ("step_next", step_nexts)]:
+            np.save(Path(dirpath, f"{name}.npy"), array)
+
+        # cluster index -> step rows (csr), cluster indexes are 0, 1, ..., cluster_num - 1
+        index_cluster_dict = bugs.step_index_cluster_dict or dict()
+        cluster_num = max(index_cluster_dict.keys()) + 1 if index_cluster_dict else 0
+        cluster_step_offsets = np.zeros(cluster_num + 1, dtype=np.int64)
+        cluster_steps = []
+        for cluster_index in range(cluster_num):
+            cluster = index_cluster_dict.get(cluster_index, set())
+            cluster_steps.extend(sorted(step_row_dict[id(step)] for step in cluster))
+            cluster_step_offsets[cluster_index + 1] = len(cluster_steps)
+        np.save(Path(dirpath, "cluster_step_offsets.npy"), cluster_step_offsets)
+        np.save(Path(dirpath, "cluster_steps.npy"), np.array(cluster_steps, dtype=np.int64))
+        ClusterGraph.from_step_columns(step_cluster_indexes, step_nexts, cluster_num, GraphStore.NULL_INT).save(dirpath)
+
+        embedding_dim = None
+        if step_embeddings is not None:
+            if hasattr(step_embeddings, "cpu"):
+                step_embeddings = step_embeddings.cpu().numpy()
+            step_embeddings = np.asarray(step_embeddings, dtype=np.float32)
+            embedding_dim = step_embeddings.shape[1]
+            np.save(Path(dirpath, "step_embeddings.npy"), step_embeddings)
+        elif os.path.exists(Path(dirpath, "step_embeddings.npy")):
+            os.remove(Path(dirpath, "step_embeddings.npy"))
+
+        # meta.json last: a store without it is not complete
+        Path(dirpath, "meta.json").write_text(json.dumps({"bug_num": len(bugs), "step_num": len(step_list),
+                                                          "cluster_num": cluster_num,
+                                                          "embedding_dim": embedding_dim}))
+
+    def __len__(self):
+        return self.meta["bug_num"]
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.get_bug(row)
+
+    def __getitem__(self, row):
+        return self.get_bug(row)
+
+    def get_bug(self, row):
+        """
+        materialize the bug of row with its description and steps (once)
+        @param row:
+        @type row: int
+        @return: bug
+        @rtype: Bug
+        """
+        row = int(row)
+        if row in self.row_bug_dict:
+            return self.row_bug_dict[row]
+        objects = pickle.loads(self.bug_objects[row])
+        bug = Bug(id=json.loads(self.bug_ids[row]), summary=self.bug_summaries[row],
+                  product_component_pair=objects["product_component_pair"], tossing_path=objects["tossing_path"],
+                  creation_time=GraphStore.int_to_datetime(self.bug_creation_times[row]),
+                  closed_time=GraphStore.int_to_datetime(self.bug_closed_times[row]),
+                  last_change_time=GraphStore.int_to_datetime(self.bug_last_change_times[row]),
+                  status=self.bug_statuses[row], bug_type=objects["type"], attachments=objects["attachments"])
+        bug.description = Description(bug, objects["text"], objects["prerequisites"], None,
+                                      objects["expected_results"], objects["actual_results"], objects["notes"])
+        self.row_bug_dict[row] = bug
+
+        step_rows = range(self.bug_step_offsets[row], self.bug_step_offsets[row + 1])
+        if self.bug_has_steps[row]:
+            steps = []
+            for step_row in step_rows:
+                is_operational = None if self.step_is_operationals[step_row] == -1 \
+                    else bool(self.step_is_operationals[step_row])
+                step = Step(GraphStore.get_int(self.step_ids[step_row]), bug, self.step_texts[step_row],
+                            is_operational, cluster_index=GraphStore.get_int(self.step_cluster_indexes[step_row]))
+                self.step_row_step_dict[step_row] = step
+                steps.append(step)
+            bug.description.steps_to_reproduce = steps
+            for step_row, step in zip(step_rows, steps):
+                if self.step_prevs[step_row] != GraphStore.NULL_INT:
+                    step.prev_step = self.get_step(self.step_prevs[step_row])
+                if self.step_nexts[step_row] != GraphStore.NULL_INT:
+                    step.next_step = self.get_step(self.step_nexts[step_row])
+        return bug
+
+    @staticmethod
+    def get_int(value):
+        if value == GraphStore.NULL_INT:
+            return None
+        return int(value)
+
+    def get_step(self, step_row):
+        step_row = int(step_row)
+        if step_row not in self.step_row_step_dict:
+            self.get_bug(self.step_bugs[step_row])
+        return self.step_row_step_dict[step_row]
+
+    def get_bug_row_by_id(self, bug_id):
+        """
+        the bug id -> bug row dict is built from the bug_id column at the first lookup
+        """
+        if self.bug_id_row_dict is None:
+            self.bug_id_row_dict = dict()
+            for row in range(len(self)):
+                bug_id_key = Bugs.get_bug_id_key(json.loads(self.bug_ids[row]))
+                self.bug_id_row_dict[bug_id_key] = self.bug_id_row_dict.get(bug_id_key, row)
+        return self.bug_id_row_dict.get(Bugs.get_bug_id_key(bug_id), None)
+
+    def get_bug_by_id(self, bug_id):
+        row = self.get_bug_row_by_id(bug_id)
+        if row is None:
+            return None
+        return self.get_bug(row)
+
+    def get_bug_id_bug_dict(self):
+        """
+        @return: LazyMapping{ key: bug.id, value: bug (Bug) }
+        @rtype: LazyMapping
+        """
+        bug_ids = dict.fromkeys(json.loads(self.bug_ids[row]) for row in range(len(self)))
+        return LazyMapping(bug_ids, self.get_bug_by_id)
+
+    def get_cluster_step_rows(self, cluster_index):
+        return self.cluster_steps[self.cluster_step_offsets[cluster_index]:self.cluster_step_offsets[cluster_index + 1]]
+
+    def get_cluster(self, cluster_index):
+        """
+        @return: cluster (set(step(object), step(object), ...)), only bugs of these steps are materialized
+        @rtype: set
+        """
+        return {self.get_step(step_row) for step_row in self.get_cluster_step_rows(cluster_index)}
+
+    def get_step_embeddings(self):
+        """
+        @return: memory-mapped embedding matrix (step_num x dim), None if not written
+        @rtype: numpy.memmap
+        """
+        if self.meta["embedding_dim"] is None:
+            return None
+        return self.load_array("step_embeddings")
+
+    def get_steps(self):
+        """
+        like Bugs.get_steps: step list (lazy) and step text list (memory-mapped)
+        """
+        return self.step_list, self.step_texts
+
+    def to_bugs(self):
+        """
+        materialize all bugs into Bugs (with step_index_cluster_dict)
+        @return: bugs
+        @rtype: Bugs
+        """
+        bugs = Bugs(list(self))
+        bugs.step_index_cluster_dict = {cluster_index: self.get_cluster(cluster_index)
+                                        for cluster_index in range(self.meta["cluster_num"])}
+        return bugs
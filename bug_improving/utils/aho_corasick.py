@@ -0,0 +1,107 @@
+class AhoCorasick:
+    """
+    Aho–Corasick automaton over a dict{ key: pattern, value: replacement }
+    1. find_all: every (start, end, pattern) occurrence in one pass over the text
+    2. replace: non-overlapping replacement in one pass, longer matches first, then leftmost ones
+    """
+
+    def __init__(self, pattern_value_dict):
+        self.pattern_value_dict = pattern_value_dict
+        self.goto = [dict()]  # goto[node]: dict{ key: char, value: child node }
+        self.fail = [0]  # fail[node]: node of the longest proper suffix in the trie
+        self.output = [None]  # output[node]: pattern ending at node
+        self.output_link = [0]  # output_link[node]: next node with output in the fail chain (0 means none)
+        for pattern in pattern_value_dict.keys():
+            self.add(pattern)
+        self.build()
+
+    def add(self, pattern):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            child = self.goto[node].get(char, None)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append(dict())
+                self.fail.append(0)
+                self.output.append(None)
+                self.output_link.append(0)
+            node = child
+        self.output[node] = pattern
+
+    def build(self):
+        """
+        fail links and output links by BFS
+        """
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[child] = fail
+                self.output_link[child] = fail if self.output[fail] is not None else self.output_link[fail]
+
+    def find_all(self, text):
+        """
+        @param text:
+        @type text: str
+        @return: [(start, end, pattern), ...]
+        @rtype: list
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        output_link = self.output_link
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match_node = node if output[node] is not None else output_link[node]
+            while match_node:
+                pattern = output[match_node]
+                matches.append((index + 1 - len(pattern), index + 1, pattern))
+                match_node = output_link[match_node]
+        return matches
+
+    def replace(self, text, get_span=None):
+        """
+        replace matches by their values, longer matches first, then leftmost ones, without overlapping
+        @param text:
+        @type text: str
+        @param get_span: get_span(text, start, end) -> (span_start, span_end) replaced by the value of the match,
+                         or None to skip the match; None means the match itself
+        @type get_span: function
+        @return: (replaced text, [value of each replaced match in the order of the text])
+        @rtype: tuple
+        """
+        matches = self.find_all(text)
+        if not matches:
+            return text, []
+        matches.sort(key=lambda match: (match[0] - match[1], match[0]))
+        occupied = bytearray(len(text))
+        spans = []
+        for start, end, pattern in matches:
+            span = (start, end) if get_span is None else get_span(text, start, end)
+            if span is None or occupied.find(1, span[0], span[1]) != -1:
+                continue
+            occupied[span[0]:span[1]] = b"\x01" * (span[1] - span[0])
+            spans.append((span[0], span[1], self.pattern_value_dict[pattern]))
+        spans.sort()
+
+        pieces = []
+        values = []
+        previous_end = 0
+        for start, end, value in spans:
+            pieces.append(text[previous_end:start])
+            pieces.append(value)
+            values.append(value)
+            previous_end = end
+        pieces.append(text[previous_end:])
+        return "".join(pieces), values
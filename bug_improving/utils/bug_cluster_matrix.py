@@ -0,0 +1,190 @@
+import csv
+import json
+import logging
+
+import numpy as np
+from scipy import sparse
+from tqdm import tqdm
+
+from bug_improving.types.graph_store import GraphStore
+from config import BUG_PAIR_BLOCK_SIZE
+
+
+class BugClusterMatrix:
+    """
+    sparse bug x step cluster incidence matrix A (A[i, j] = 1 if bug i has a step in cluster j)
+    overlap counts of all the bug pairs are A @ A.T, computed a block of bug rows at a time, so only
+    block_size x bug_num (sparse) counts are in memory
+    e.g., bug 1: {3, 5}, bug 2: {5, 7}, bug 3: {3, 5, 7} -> (1, 2, 1), (1, 3, 2), (2, 3, 2)
+    """
+
+    CSV_HEADER = ["bug_id_1", "bug_id_2", "overlap"]  # every pair once, bug_id_1 < bug_id_2
+    TOP_K_CSV_HEADER = ["bug_id", "top_k_bug_id", "overlap"]  # top_k bugs of each bug
+
+    def __init__(self, bug_ids, cluster_index_sets):
+        """
+        @param bug_ids: [bug_id, ...], rows of the matrix
+        @type bug_ids: list
+        @param cluster_index_sets: [{cluster_index, ...}, ...], aligned with bug_ids
+        @type cluster_index_sets: list
+        """
+        self.bug_ids = list(bug_ids)
+        lengths = np.fromiter((len(cluster_indexes) for cluster_indexes in cluster_index_sets), dtype=np.int64,
+                              count=len(self.bug_ids))
+        cluster_indexes = np.fromiter((cluster_index for cluster_indexes in cluster_index_sets
+                                       for cluster_index in cluster_indexes), dtype=np.int64, count=int(lengths.sum()))
+        bug_rows = np.repeat(np.arange(len(self.bug_ids), dtype=np.int64), lengths)
+        self.matrix = BugClusterMatrix.get_incidence_matrix(bug_rows, cluster_indexes, len(self.bug_ids))
+        self.transposed_matrix = self.matrix.T.tocsr()
+
+    def __len__(self):
+        return len(self.bug_ids)
+
+    @staticmethod
+    def get_incidence_matrix(bug_rows, cluster_indexes, bug_num):
+        """
+        cluster indexes are mapped to columns 0, 1, ... (they do not need to be contiguous)
+        duplicated (bug row, cluster index) pairs count once
+        @return: binary CSR matrix (bug_num, cluster_num), int32
+        @rtype: sparse.csr_matrix
+        """
+        cluster_indexes, columns = np.unique(cluster_indexes, return_inverse=True)
+        matrix = sparse.csr_matrix((np.ones(len(bug_rows), dtype=np.int32), (bug_rows, columns.reshape(-1))),
+                                   shape=(bug_num, len(cluster_indexes)))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    @staticmethod
+    def from_bugs(bugs):
+        """
+        bugs without description are skipped, steps without cluster_index are ignored
+        @param bugs:
+        @type bugs: Bugs or GraphStore
+        @return:
+        @rtype: BugClusterMatrix
+        """
+        if hasattr(bugs, "step_cluster_indexes"):
+            return BugClusterMatrix.from_graph_store(bugs)
+        bug_ids = []
+        cluster_index_sets = []
+        for bug in bugs:
+            description = getattr(bug, 'description', None)
+            if not description:
+                continue
+            steps_to_reproduce = getattr(description, 'steps_to_reproduce', None) or []
+            bug_ids.append(getattr(bug, 'id', None))
+            cluster_index_sets.append({step.cluster_index for step in steps_to_reproduce
+                                       if getattr(step, 'cluster_index', None) is not None})
+        return BugClusterMatrix(bug_ids, cluster_index_sets)
+
+    @staticmethod
+    def from_graph_store(graph_store):
+        """
+        from the step_bug and step_cluster_index columns, without materializing Bug or Step objects
+        @param graph_store:
+        @type graph_store: GraphStore
+        @return:
+        @rtype: BugClusterMatrix
+        """
+        matrix = BugClusterMatrix([], [])
+        matrix.bug_ids = [json.loads(graph_store.bug_ids[row]) for row in range(len(graph_store))]
+        step_cluster_indexes = np.asarray(graph_store.step_cluster_indexes)
+        mask = step_cluster_indexes != GraphStore.NULL_INT
+        matrix.matrix = BugClusterMatrix.get_incidence_matrix(np.asarray(graph_store.step_bugs)[mask],
+                                                              step_cluster_indexes[mask], len(matrix.bug_ids))
+        matrix.transposed_matrix = matrix.matrix.T.tocsr()
+        return matrix
+
+    def get_block_overlaps(self, start, end):
+        """
+        @return: overlap counts of bug rows [start, end) with all the bug rows, CSR (end - start, bug_num),
+                 sorted column indices, diagonal (bug with itself) included
+        @rtype: sparse.csr_matrix
+        """
+        overlaps = self.matrix[start:end] @ self.transposed_matrix
+        overlaps.sort_indices()
+        return overlaps
+
+    def iter_pair_blocks(self, threshold=1, top_k=None, block_size=BUG_PAIR_BLOCK_SIZE):
+        """
+        top_k is None: every pair (row_1 < row_2) with overlap >= threshold, once
+        top_k: for each bug, its top_k bugs with overlap >= threshold by decreasing overlap, then by row
+               (a pair shows up twice if both bugs are in the top_k of each other)
+        @return: generator of (rows_1, rows_2, overlaps) np.ndarray blocks, by row_1, then by overlap or row_2
+        @rtype: generator
+        """
+        threshold = max(threshold, 1)
+        for start in range(0, len(self), block_size):
+            end = min(start + block_size, len(self))
+            overlaps = self.get_block_overlaps(start, end)
+            row_lengths = np.diff(overlaps.indptr)
+            rows_1 = np.repeat(np.arange(start, end, dtype=np.int64), row_lengths)
+            rows_2 = overlaps.indices.astype(np.int64)
+            counts = overlaps.data
+            if top_k is None:
+                mask = (rows_2 > rows_1) & (counts >= threshold)
+            else:
+                mask = (rows_2 != rows_1) & (counts >= threshold)
+            rows_1, rows_2, counts = rows_1[mask], rows_2[mask], counts[mask]
+            if top_k is not None and len(counts):
+                # by row_1, then by decreasing overlap, then by row_2; keep the first top_k of each row_1
+                order = np.lexsort((rows_2, -counts, rows_1))
+                rows_1, rows_2, counts = rows_1[order], rows_2[order], counts[order]
+                row_starts = np.searchsorted(rows_1, rows_1, side="left")
+                mask = np.arange(len(rows_1)) - row_starts < top_k
+                rows_1, rows_2, counts = rows_1[mask], rows_2[mask], counts[mask]
+            yield rows_1, rows_2, counts
+
+    def iter_pairs_in_row_order(self, threshold=1, block_size=BUG_PAIR_BLOCK_SIZE):
+        """
+        every pair (bug_id_1 < bug_id_2) with overlap >= threshold, once, by row of bug_id_1 then row of bug_id_2,
+        i.e., in the order of the bugs the matrix was built from (not sorted by bug id)
+        @return: generator of (bug_id_1, bug_id_2, overlap)
+        @rtype: generator
+        """
+        threshold = max(threshold, 1)
+        for start in range(0, len(self), block_size):
+            overlaps = self.get_block_overlaps(start, min(start + block_size, len(self)))
+            for offset in range(overlaps.shape[0]):
+                bug_id_1 = self.bug_ids[start + offset]
+                row_start, row_end = overlaps.indptr[offset], overlaps.indptr[offset + 1]
+                for row_2, count in zip(overlaps.indices[row_start:row_end].tolist(),
+                                        overlaps.data[row_start:row_end].tolist()):
+                    if count >= threshold and bug_id_1 < self.bug_ids[row_2]:
+                        yield bug_id_1, self.bug_ids[row_2], count
+
+    def iter_pairs(self, threshold=1, top_k=None, block_size=BUG_PAIR_BLOCK_SIZE):
+        """
+        @return: generator of (bug_id_1, bug_id_2, overlap), see BugClusterMatrix.iter_pair_blocks
+        @rtype: generator
+        """
+        for rows_1, rows_2, counts in self.iter_pair_blocks(threshold, top_k, block_size):
+            for row_1, row_2, count in zip(rows_1.tolist(), rows_2.tolist(), counts.tolist()):
+                yield self.bug_ids[row_1], self.bug_ids[row_2], count
+
+    def dump_pairs(self, filepath, threshold=1, top_k=None, block_size=BUG_PAIR_BLOCK_SIZE):
+        """
+        stream pair rows into a csv file, a block at a time, in the order of BugClusterMatrix.iter_pair_blocks
+        top_k is None: (bug_id_1, bug_id_2, overlap), bug_id_1 < bug_id_2
+        top_k: (bug_id, top_k_bug_id, overlap)
+        @return: number of pairs
+        @rtype: int
+        """
+        pair_num = 0
+        with open(filepath, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(BugClusterMatrix.CSV_HEADER if top_k is None else BugClusterMatrix.TOP_K_CSV_HEADER)
+            for rows_1, rows_2, counts in tqdm(self.iter_pair_blocks(threshold, top_k, block_size),
+                                               total=-(-len(self) // block_size), ascii=True):
+                bug_ids_1 = [self.bug_ids[row] for row in rows_1.tolist()]
+                bug_ids_2 = [self.bug_ids[row] for row in rows_2.tolist()]
+                if top_k is None:
+                    # rows are not sorted by bug id
+                    bug_id_pairs = [(bug_id_1, bug_id_2) if bug_id_1 < bug_id_2 else (bug_id_2, bug_id_1)
+                                    for bug_id_1, bug_id_2 in zip(bug_ids_1, bug_ids_2)]
+                    bug_ids_1, bug_ids_2 = [pair[0] for pair in bug_id_pairs], [pair[1] for pair in bug_id_pairs]
+                writer.writerows(zip(bug_ids_1, bug_ids_2, counts.tolist()))
+                pair_num = pair_num + len(counts)
+        logging.warning(f"{pair_num} bug pairs with overlap >= {threshold} in {filepath}")
+        return pair_num
@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+
+
+class CheckpointJournal:
+    """
+    append-only JSONL journal of {"bug_id": ..., "ans": ...} results, keyed by bug id
+    1. every append is flushed and fsynced, so finished results survive a crash
+    2. a torn last line (crash while appending) is truncated when loading, so the next append starts on a new line
+    3. the last result of a bug id wins
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.bug_id_result_dict = dict()  # dict{ key: bug id, value: {"bug_id": ..., "ans": ...} }
+        self.load()
+
+    def __contains__(self, bug_id):
+        return bug_id in self.bug_id_result_dict
+
+    def __len__(self):
+        return len(self.bug_id_result_dict)
+
+    def repair_last_line(self):
+        """
+        make the journal end with a newline before anything is appended after it:
+        a torn last line (crash while appending) is truncated, a complete one missing its newline gets it
+        """
+        with open(self.filepath, 'rb') as f:
+            content = f.read()
+        if not content or content.endswith(b"\n"):
+            return
+        line_start = content.rfind(b"\n") + 1
+        try:
+            json.loads(content[line_start:])
+        except ValueError:
+            logging.warning(f"{self.filepath}: the last line is not complete, truncated")
+            os.truncate(self.filepath, line_start)
+            return
+        with open(self.filepath, 'ab') as f:
+            f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        self.bug_id_result_dict = dict()
+        if not os.path.exists(self.filepath):
+            return
+        self.repair_last_line()
+        with open(self.filepath, 'r') as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"{self.filepath}:{line_no} is not complete, skipped")
+                    continue
+                self.bug_id_result_dict[result["bug_id"]] = result
+
+    def append(self, results):
+        """
+        @param results: [{"bug_id": ..., "ans": ...}, ...]
+        @type results: list
+        @return:
+        @rtype:
+        """
+        if not results:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.filepath)), exist_ok=True)
+        with open(self.filepath, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for result in results:
+            self.bug_id_result_dict[result["bug_id"]] = result
+
+    def get_result_by_bug_id(self, bug_id):
+        return self.bug_id_result_dict.get(bug_id, None)
+
+    def get_results(self):
+        return list(self.bug_id_result_dict.values())
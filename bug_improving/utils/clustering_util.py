@@ -0,0 +1,96 @@
+import logging
+
+import numpy as np
+from tqdm import tqdm
+
+from bug_improving.utils.vector_index import VectorIndex
+from config import COMMUNITY_DETECTION_TILE_SIZE
+
+
+class ClusteringUtil:
+
+    @staticmethod
+    def get_neighbours(embeddings, threshold, tile_size=COMMUNITY_DETECTION_TILE_SIZE):
+        """
+        neighbours (cos_sim >= threshold, itself included) of each row in CSR form
+        the cosine similarity matrix is computed a tile_size x tile_size tile at a time,
+        only the neighbours of the tile are kept, so tiles take tile_size^2 floats at most
+        @param embeddings: (row_num, dimension)
+        @type embeddings: np.ndarray or torch.Tensor
+        @param threshold:
+        @type threshold: float
+        @param tile_size:
+        @type tile_size: int
+        @return: indptr (row_num + 1), indices (neighbours of row i: indices[indptr[i]:indptr[i + 1]], ascending)
+        @rtype: np.ndarray, np.ndarray
+        """
+        embeddings = VectorIndex.to_numpy(embeddings)
+        row_num = len(embeddings)
+        # normalize a tile at a time, so no temporary (row_num, dimension) array besides the normalized copy
+        normalized_embeddings = np.empty(embeddings.shape, dtype=np.float32)
+        for row_start in range(0, row_num, tile_size):
+            normalized_embeddings[row_start:row_start + tile_size] = VectorIndex.normalize(
+                embeddings[row_start:row_start + tile_size])
+        embeddings = normalized_embeddings
+        indptr = np.zeros(row_num + 1, dtype=np.int64)
+        indices_list = []
+        for row_start in tqdm(range(0, row_num, tile_size), ascii=True):
+            row_tile = embeddings[row_start:row_start + tile_size]
+            tile_rows_list = []
+            tile_columns_list = []
+            for column_start in range(0, row_num, tile_size):
+                scores = row_tile @ embeddings[column_start:column_start + tile_size].T
+                tile_rows, tile_columns = np.nonzero(scores >= threshold)
+                tile_rows_list.append(tile_rows.astype(np.int32))
+                tile_columns_list.append((tile_columns + column_start).astype(np.int32))
+                del scores
+            tile_rows = np.concatenate(tile_rows_list)
+            # column tiles are in ascending order, a stable sort by row keeps the columns ascending
+            order = np.argsort(tile_rows, kind="stable")
+            indices_list.append(np.concatenate(tile_columns_list)[order])
+            indptr[row_start + 1:row_start + len(row_tile) + 1] = np.cumsum(
+                np.bincount(tile_rows, minlength=len(row_tile))) + indptr[row_start]
+        indices = np.concatenate(indices_list) if indices_list else np.zeros(0, dtype=np.int32)
+        return indptr, indices
+
+    @staticmethod
+    def community_detection(embeddings, threshold=0.75, min_community_size=10,
+                            tile_size=COMMUNITY_DETECTION_TILE_SIZE):
+        """
+        memory-bounded sentence_transformers.util.community_detection (same communities, in the same order):
+        1. every row with >= min_community_size neighbours (cos_sim >= threshold) gives a community
+           (all its neighbours), largest communities first
+        2. remove overlapping: rows in an earlier community are removed from later ones,
+           communities still >= min_community_size are kept
+        util.community_detection keeps (batch_size x row_num) similarity scores in memory,
+        here they are computed by tiles (ClusteringUtil.get_neighbours) and only the neighbours are kept
+        @param embeddings: (row_num, dimension)
+        @type embeddings: np.ndarray or torch.Tensor
+        @param threshold:
+        @type threshold: float
+        @param min_community_size:
+        @type min_community_size: int
+        @param tile_size: rows (and columns) per similarity tile
+        @type tile_size: int
+        @return: communities [[row, ...], ...] (rows ascending), by decreasing size
+        @rtype: list
+        """
+        indptr, indices = ClusteringUtil.get_neighbours(embeddings, threshold, tile_size)
+        row_num = len(indptr) - 1
+        min_community_size = min(min_community_size, row_num)
+        neighbour_nums = np.diff(indptr)
+        community_rows = np.flatnonzero(neighbour_nums >= max(min_community_size, 1))
+        # largest communities first (stable: ties by row)
+        community_rows = community_rows[np.argsort(-neighbour_nums[community_rows], kind="stable")]
+
+        logging.warning(f"Remove overlapping communities of {len(community_rows)} rows...")
+        extracted = np.zeros(row_num, dtype=bool)
+        unique_communities = []
+        for row in community_rows.tolist():
+            community = indices[indptr[row]:indptr[row + 1]]
+            community = community[~extracted[community]]
+            if len(community) and len(community) >= min_community_size:
+                unique_communities.append(community.tolist())
+                extracted[community] = True
+        unique_communities.sort(key=len, reverse=True)
+        return unique_communities
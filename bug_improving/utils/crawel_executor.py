@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from bug_improving.utils.crawel_util import CrawelUtil
+from config import CRAWEL_MAX_IN_FLIGHT, CRAWEL_KEEPALIVE_TIMEOUT
+
+
+class CrawelExecutor:
+    """
+    long-lived crawler engine:
+    1. one CrawelUtil.get_client_session (one connection pool, keep-alive, gzip/deflate) for all requests
+    2. a work queue drained by max_in_flight workers, so a steady number of requests is in flight,
+       instead of a burst per batch and an idle gap while the batch is saved
+    3. each request is CrawelUtil.fetch (rate limit wait, retry with exponential backoff),
+       paced over the auth tokens by scheduler (RateLimitScheduler) if given
+    4. the HTTP cache hit ratio and bytes saved of the requests of this executor are logged on close
+    usage:
+        async with CrawelExecutor(headers=headers) as executor:
+            responses = await executor.fetch_multiple(urls)
+            async for index, responses in executor.iter_batches(urls_list):
+                ...
+    """
+
+    def __init__(self, max_in_flight=CRAWEL_MAX_IN_FLIGHT, headers=None, keepalive_timeout=CRAWEL_KEEPALIVE_TIMEOUT,
+                 scheduler=None):
+        self.max_in_flight = max_in_flight
+        self.headers = headers
+        self.keepalive_timeout = keepalive_timeout
+        self.scheduler = scheduler
+        self.session = None
+        self.http_cache_stats = None  # HttpCache.get_stats() on start
+
+    async def start(self):
+        # bound to the running event loop
+        self.session = CrawelUtil.get_client_session(self.max_in_flight, self.keepalive_timeout)
+        http_cache = await asyncio.to_thread(CrawelUtil.get_http_cache)
+        if http_cache is not None:
+            self.http_cache_stats = await asyncio.to_thread(http_cache.get_stats)
+        return self
+
+    def log_http_cache_stats(self, stats):
+        """
+        hit ratio and bytes saved of the requests since start (HttpCache counts since it was opened)
+        """
+        hit_num = stats["hit_num"] - self.http_cache_stats["hit_num"]
+        request_num = hit_num + stats["miss_num"] - self.http_cache_stats["miss_num"]
+        saved_byte_num = stats["saved_byte_num"] - self.http_cache_stats["saved_byte_num"]
+        byte_num = saved_byte_num + stats["downloaded_byte_num"] - self.http_cache_stats["downloaded_byte_num"]
+        logging.warning(f"HTTP cache: {hit_num} / {request_num} responses not modified "
+                        f"(hit ratio: {hit_num / request_num if request_num else 0.0:.2f}), "
+                        f"{saved_byte_num} / {byte_num} bytes saved, {stats['size']} responses cached")
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if CrawelUtil.HTTP_CACHE is not None:
+            # write the cached responses of this crawl (get_stats writes them first)
+            if self.http_cache_stats is None:
+                await asyncio.to_thread(CrawelUtil.HTTP_CACHE.flush)
+            else:
+                self.log_http_cache_stats(await asyncio.to_thread(CrawelUtil.HTTP_CACHE.get_stats))
+                self.http_cache_stats = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def fetch(self, url):
+        """
+        @return: response json, {"status", "error"} for non-200 responses, or the Exception after the retries
+        @rtype: dict or Exception
+        """
+        try:
+            return await CrawelUtil.fetch(self.session, url, headers=self.headers, scheduler=self.scheduler)
+        except Exception as e:
+            return e
+
+    async def iter_batches(self, urls_list):
+        """
+        all urls of urls_list go into one work queue,
+        a batch is yielded as soon as all its urls are fetched, while the workers go on with the next batches
+        @param urls_list: [[url, ...], ...]
+        @type urls_list: list
+        @return: (index of the batch, [response, ...] in the order of its urls), batches in the order of urls_list
+        @rtype: async generator
+        """
+        queue = asyncio.Queue()
+        batch_responses_list = [[None] * len(urls) for urls in urls_list]
+        left_url_nums = [len(urls) for urls in urls_list]
+        batch_events = [asyncio.Event() for _ in urls_list]
+        for batch_index, urls in enumerate(urls_list):
+            if not urls:
+                batch_events[batch_index].set()
+            for url_index, url in enumerate(urls):
+                queue.put_nowait((batch_index, url_index, url))
+
+        async def work():
+            while not queue.empty():
+                batch_index, url_index, url = queue.get_nowait()
+                batch_responses_list[batch_index][url_index] = await self.fetch(url)
+                left_url_nums[batch_index] = left_url_nums[batch_index] - 1
+                if not left_url_nums[batch_index]:
+                    batch_events[batch_index].set()
+
+        workers = [asyncio.create_task(work()) for _ in range(min(self.max_in_flight, queue.qsize()))]
+        try:
+            for batch_index in range(len(urls_list)):
+                await batch_events[batch_index].wait()
+                batch_responses = batch_responses_list[batch_index]
+                batch_responses_list[batch_index] = None
+                yield batch_index, batch_responses
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def fetch_multiple(self, urls):
+        """
+        @return: [response, ...] in the order of urls
+        @rtype: list
+        """
+        responses = []
+        async for _, responses in self.iter_batches([urls]):
+            pass
+        return responses
@@ -9,6 +9,7 @@ import requests
 import aiohttp
 import asyncio
 import json
+from urllib.parse import urlencode
 
 from dotenv import load_dotenv
 # from bs4 import BeautifulSoup
@@ -16,14 +17,23 @@ from tqdm import tqdm
 
 from bug_improving.utils.datetime_util import DatetimeUtil
 from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.http_cache import HttpCache
 from bug_improving.utils.nlp_util import NLPUtil
+from bug_improving.utils.path_util import PathUtil
+from bug_improving.utils.rate_limit_scheduler import RateLimitScheduler
 from config import DATA_DIR, COMMIT_MESSAGE_JSON_LINK, FILE_REVISIONS_JSON_LINK, MAX_RETRIES, SLEEP_TIME, BUG_JSON_LINK, \
     BUG_COMMENT, \
     BUG_HISTORY, BUG_ATTACHMENT, FILE_ANNOTATES_JSON_LINK, GITHUB_ISSUE_LINK, GITHUB_PULL_LINK, GITHUB_COMMIT_LINK, \
-    GITHUB_GRAPHQL_LINK, GITHUB_COMMIT_FILE_LINK
+    GITHUB_GRAPHQL_LINK, GITHUB_COMMIT_FILE_LINK, CRAWEL_MAX_IN_FLIGHT, CRAWEL_KEEPALIVE_TIMEOUT, HTTP_CACHE_ENABLED, \
+    GITHUB_ISSUE_PER_PAGE
 
 
 class CrawelUtil:
+    GRAPHQL_LINK = GITHUB_GRAPHQL_LINK  # GraphQL queries are posted here (a local stub server for benchmarks)
+    ISSUE_LINK = GITHUB_ISSUE_LINK  # issues are fetched and listed here (a local stub server for benchmarks)
+    USE_HTTP_CACHE = HTTP_CACHE_ENABLED
+    HTTP_CACHE = None  # HttpCache, validators and bodies of GET responses
+
     # https://bmo.readthedocs.io/en/latest/api/
     @staticmethod
     def get_specific_product_bug_ids(product):
@@ -274,29 +284,55 @@ class CrawelUtil:
 
     # ********************sync*********************
     @staticmethod
-    async def fetch_multiple(urls, retry_count=0, headers=None):
+    def get_client_session(max_in_flight=CRAWEL_MAX_IN_FLIGHT, keepalive_timeout=CRAWEL_KEEPALIVE_TIMEOUT):
+        """
+        one connection pool: at most max_in_flight connections (requests beyond wait for a free one),
+        kept alive between requests, gzip/deflate responses
+        create it in the running event loop, close it by "async with" or await session.close()
+        """
+        connector = aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=keepalive_timeout)
+        return aiohttp.ClientSession(connector=connector, headers={"Accept-Encoding": "gzip, deflate"})
+
+    @staticmethod
+    def filter_bug_responses(responses):
+        """
+        keep the responses labeled "bug", exceptions are turned into {"error": str(exception)}
+        """
+        processed_responses = []
+        for response in responses:
+            if isinstance(response, Exception):
+                logging.error(f"Error during fetch: {response}")
+                processed_responses.append({"error": str(response)})
+            else:
+                labels = response.get("labels", [])
+                if any(label.get("name", "").lower() == "bug" for label in labels):
+                    processed_responses.append(response)
+        return processed_responses
+
+    @staticmethod
+    async def fetch_multiple(urls, retry_count=0, headers=None, session=None, scheduler=None):
+        """
+        @param session: shared session (CrawelUtil.get_client_session, CrawelExecutor.session),
+                        None means a session for this call only
+        @param scheduler: RateLimitScheduler, see CrawelUtil.fetch
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                tasks = [CrawelUtil.fetch(session, url, headers=headers) for url in urls]
+            if session is None:
+                async with CrawelUtil.get_client_session() as session:
+                    tasks = [CrawelUtil.fetch(session, url, headers=headers, scheduler=scheduler) for url in urls]
+                    responses = await asyncio.gather(*tasks, return_exceptions=True)
+            else:
+                tasks = [CrawelUtil.fetch(session, url, headers=headers, scheduler=scheduler) for url in urls]
                 responses = await asyncio.gather(*tasks, return_exceptions=True)
 
-                # Handle exceptions in responses
-                processed_responses = []
-                for response in responses:
-                    if isinstance(response, Exception):
-                        logging.error(f"Error during fetch: {response}")
-                        processed_responses.append({"error": str(response)})
-                    else:
-                        labels = response.get("labels", [])
-                        if any(label.get("name", "").lower() == "bug" for label in labels):
-                            processed_responses.append(response)
-                return processed_responses
+            # Handle exceptions in responses
+            return CrawelUtil.filter_bug_responses(responses)
 
         except Exception as e:
             if retry_count >= MAX_RETRIES:
                 raise
             await asyncio.sleep(2 ** retry_count)  # Exponential backoff
-            return await CrawelUtil.fetch_multiple(urls, retry_count + 1, headers)
+            return await CrawelUtil.fetch_multiple(urls, retry_count + 1, headers, session, scheduler)
 
     # @staticmethod
     # async def fetch(session, url, retry_count=0, headers=None):
@@ -342,16 +378,54 @@ class CrawelUtil:
         return response
 
     @staticmethod
-    async def fetch(session, url, retry_count=0, headers=None):
+    def get_http_cache():
+        """
+        @return: HttpCache of GET responses, None if CrawelUtil.USE_HTTP_CACHE is False
+        @rtype: HttpCache
+        """
+        if not CrawelUtil.USE_HTTP_CACHE:
+            return None
+        if CrawelUtil.HTTP_CACHE is None:
+            CrawelUtil.HTTP_CACHE = HttpCache(PathUtil.get_http_cache_filepath())
+        return CrawelUtil.HTTP_CACHE
+
+    @staticmethod
+    async def read_json(response, url, headers=None, http_cache=None):
+        """
+        json of a 200 response, cached with its ETag / Last-Modified by http_cache if given
+        (keyed by url and the Authorization of the request headers, written in a thread)
+        """
+        if http_cache is None:
+            return await response.json()
+        body = await response.text()
+        await asyncio.to_thread(http_cache.put, url, headers, response.headers, body)
+        return json.loads(body)
+
+    @staticmethod
+    async def fetch(session, url, retry_count=0, headers=None, scheduler=None):
+        """
+        GET requests are conditional (If-None-Match / If-Modified-Since) if CrawelUtil.get_http_cache() has url
+        for the same Authorization, the body of a 304 response is the cached one
+        (the cache is read and written in a thread, off the event loop)
+        @param scheduler: RateLimitScheduler (tokens and pace of requests),
+                          None means waiting for X-RateLimit-Reset once a response has used up the limit
+        @type scheduler: RateLimitScheduler
+        """
         logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s',
                             level=logging.INFO,
                             datefmt='%Y-%m-%d %H:%M:%S')
+        if scheduler is not None:
+            return await CrawelUtil.fetch_by_scheduler(session, url, scheduler, retry_count, headers)
 
+        http_cache = None
         try:
             if not NLPUtil.is_url(url):
-                response = await session.post(GITHUB_GRAPHQL_LINK, headers=headers, json={"query": url})
+                response = await session.post(CrawelUtil.GRAPHQL_LINK, headers=headers, json={"query": url})
             else:
-                response = await session.get(url, headers=headers)
+                http_cache = CrawelUtil.get_http_cache()
+                request_headers = await asyncio.to_thread(http_cache.get_conditional_headers, url, headers) \
+                    if http_cache else headers
+                response = await session.get(url, headers=request_headers)
 
             async with response:
                 rate_limit_used = int(response.headers.get("X-RateLimit-Used", 0))
@@ -366,13 +440,21 @@ class CrawelUtil:
                     await asyncio.sleep(wait_time)
                     return await CrawelUtil.fetch(session, url, retry_count + 1, headers)
 
+                # Not modified since the cached response
+                if response.status == 304 and http_cache is not None:
+                    cached_response = await asyncio.to_thread(http_cache.get, url, headers)
+                    if cached_response is not None:
+                        return cached_response
+                    # invalidated meanwhile: send it again without validators
+                    return await CrawelUtil.fetch(session, url, retry_count, headers)
+
                 # Handle non-200 HTTP responses
                 if response.status != 200:
                     error_message = await response.text()
                     logging.error(f"Error: {response.status}, Details: {error_message}")
                     return {"status": response.status, "error": error_message}
 
-                return await response.json()
+                return await CrawelUtil.read_json(response, url, headers, http_cache)
 
         except Exception as e:
             logging.error(f"Exception during fetch: {e}")
@@ -381,15 +463,64 @@ class CrawelUtil:
             await asyncio.sleep(2 ** retry_count)  # Exponential backoff
             return await CrawelUtil.fetch(session, url, retry_count + 1, headers)
 
+    @staticmethod
+    async def fetch_by_scheduler(session, url, scheduler, retry_count=0, headers=None):
+        """
+        the auth token and the time of the request are chosen by scheduler (RateLimitScheduler),
+        requests rejected by a rate limit are sent again when the scheduler allows (not counted as retries),
+        exceptions while sending or reading the response are retried with exponential backoff
+        """
+        is_graphql = not NLPUtil.is_url(url)
+        resource = RateLimitScheduler.RESOURCE_GRAPHQL if is_graphql else RateLimitScheduler.RESOURCE_CORE
+        http_cache = None if is_graphql else CrawelUtil.get_http_cache()
+        token = await scheduler.acquire(resource)
+        request_headers = RateLimitScheduler.get_headers(token, headers)
+        is_updated = False  # the scheduler got the response of token (not released again on exceptions)
+        try:
+            if is_graphql:
+                response = await session.post(CrawelUtil.GRAPHQL_LINK, headers=request_headers, json={"query": url})
+            else:
+                if http_cache is not None:
+                    request_headers = await asyncio.to_thread(http_cache.get_conditional_headers, url,
+                                                              request_headers)
+                response = await session.get(url, headers=request_headers)
+
+            async with response:
+                error_message = await response.text() if response.status not in (200, 304) else ""
+                is_updated = True
+                if not scheduler.update(token, resource, response.status, response.headers, error_message):
+                    # Not modified since the cached response (None: invalidated meanwhile, sent again)
+                    if response.status == 304 and http_cache is not None:
+                        cached_response = await asyncio.to_thread(http_cache.get, url, request_headers)
+                        if cached_response is not None:
+                            return cached_response
+                    # Handle non-200 HTTP responses
+                    elif response.status != 200:
+                        logging.error(f"Error: {response.status}, Details: {error_message}")
+                        return {"status": response.status, "error": error_message}
+                    else:
+                        return await CrawelUtil.read_json(response, url, request_headers, http_cache)
+        except Exception as e:
+            if not is_updated:
+                scheduler.release(token, resource)
+            logging.error(f"Exception during fetch: {e}")
+            if retry_count >= MAX_RETRIES:
+                raise
+            await asyncio.sleep(2 ** retry_count)  # Exponential backoff
+            return await CrawelUtil.fetch_by_scheduler(session, url, scheduler, retry_count + 1, headers)
+
+        # rejected by a rate limit, or the cached response was invalidated meanwhile (send it without validators)
+        return await CrawelUtil.fetch_by_scheduler(session, url, scheduler, retry_count, headers)
+
     @staticmethod
     @staticmethod
-    async def crawel_by_async(urls, headers=None):
+    async def crawel_by_async(urls, headers=None, session=None):
         """
         Wrapper around fetch_multiple to handle async crawling of URLs.
         """
         try:
             logging.info(f"Starting asynchronous crawl for {len(urls)} URLs.")
-            responses = await CrawelUtil.fetch_multiple(urls, headers=headers)
+            responses = await CrawelUtil.fetch_multiple(urls, headers=headers, session=session)
             return responses
         except Exception as e:
             logging.error(f"Error during asynchronous crawling: {e}")
@@ -398,13 +529,30 @@ class CrawelUtil:
     # get urls for github
     @staticmethod
     def get_github_issue_urls(owner_name, repo_name, max_issue_id, min_issue_id=0):
-        issue_link = GITHUB_ISSUE_LINK.format(owner_name=owner_name, repo_name=repo_name)
+        issue_link = CrawelUtil.ISSUE_LINK.format(owner_name=owner_name, repo_name=repo_name)
         issue_links = []
         for i in range(max_issue_id, min_issue_id, -1):
             new_issue_link = issue_link + f'/{i}'
             issue_links.append(new_issue_link)
         return issue_links
 
+    @staticmethod
+    def get_github_issue_list_url(owner_name, repo_name, since=None, labels=None, page=1,
+                                  per_page=GITHUB_ISSUE_PER_PAGE):
+        """
+        one page of the issues (and pull requests) of the list endpoint, all states, sorted by updated time ascending
+        @param since: ISO 8601 time ("2024-01-01T00:00:00Z"), only the issues updated at or after it, None means all
+        @type since: str
+        @param labels: comma-separated label names, only the issues with all of them, None means any
+        @type labels: str
+        """
+        params = {"state": "all", "sort": "updated", "direction": "asc", "per_page": per_page, "page": page}
+        if since:
+            params["since"] = since
+        if labels:
+            params["labels"] = labels
+        return CrawelUtil.ISSUE_LINK.format(owner_name=owner_name, repo_name=repo_name) + "?" + urlencode(params)
+
     @staticmethod
     def get_github_issue_or_pull_request_nums(issue_or_pull_requests):
         numbers = []
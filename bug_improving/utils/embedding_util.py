@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from bug_improving.utils.nlp_util import NLPUtil
+from config import SBERT_BATCH_SIZE, SBERT_MODEL_NAME, EMBEDDING_CACHE_DIR
+
+
+class EmbeddingCache:
+    """
+    on-disk, content-addressed embedding store of one SBERT model
+    EMBEDDING_CACHE_DIR/{model_name}/
+        meta.json: {"model_name": ..., "dimension": ...}
+        keys.txt: text key (sha1 of normalized text) per line, the line number is the row in embeddings.f32
+        embeddings.f32: float32 rows (append only), memory-mapped when reading
+    """
+    META_FILENAME = "meta.json"
+    KEYS_FILENAME = "keys.txt"
+    EMBEDDINGS_FILENAME = "embeddings.f32"
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dirpath = Path(cache_dir, re.sub(r"[^\w.\-]+", "_", model_name))
+        self.dimension = None
+        self.key_row_dict = dict()  # dict{ key: text key, value: row in embeddings }
+        self.row_num = 0  # rows in embeddings.f32 (and lines in keys.txt)
+        self.embeddings = None  # np.memmap (row_num, dimension)
+        self.load()
+
+    def __len__(self):
+        return len(self.key_row_dict)
+
+    def load(self):
+        """
+        load keys and memory-map embeddings
+        an interrupted append is cut off: a torn last line of keys.txt is truncated,
+        rows written without keys and keys without rows are dropped,
+        so the next append starts at the same row in both files
+        @return:
+        @rtype:
+        """
+        meta_filepath = Path(self.dirpath, EmbeddingCache.META_FILENAME)
+        if not os.path.exists(meta_filepath):
+            return
+        with open(meta_filepath, 'r') as f:
+            self.dimension = json.load(f)["dimension"]
+        keys = []
+        keys_filepath = Path(self.dirpath, EmbeddingCache.KEYS_FILENAME)
+        if os.path.exists(keys_filepath):
+            with open(keys_filepath, 'r') as f:
+                content = f.read()
+            keys = content[:content.rfind("\n") + 1].splitlines()
+        embeddings_filepath = Path(self.dirpath, EmbeddingCache.EMBEDDINGS_FILENAME)
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+        row_num = 0
+        if os.path.exists(embeddings_filepath):
+            row_num = os.path.getsize(embeddings_filepath) // row_bytes
+        row_num = min(row_num, len(keys))
+        if os.path.exists(embeddings_filepath) and os.path.getsize(embeddings_filepath) != row_num * row_bytes:
+            os.truncate(embeddings_filepath, row_num * row_bytes)
+        if os.path.exists(keys_filepath) and (len(keys) != row_num or not content.endswith("\n")):
+            with open(keys_filepath, 'w') as f:
+                f.write("".join(f"{key}\n" for key in keys[:row_num]))
+                f.flush()
+                os.fsync(f.fileno())
+        self.key_row_dict = dict()
+        for row, key in enumerate(keys[:row_num]):
+            self.key_row_dict[key] = self.key_row_dict.get(key, row)
+        self.row_num = row_num
+        self.map_embeddings()
+
+    def map_embeddings(self):
+        self.embeddings = None
+        if self.row_num:
+            self.embeddings = np.memmap(Path(self.dirpath, EmbeddingCache.EMBEDDINGS_FILENAME), dtype=np.float32,
+                                        mode='r', shape=(self.row_num, self.dimension))
+
+    def get_rows(self, keys):
+        """
+        @param keys: text keys
+        @type keys: list
+        @return: row of each key (None if missing)
+        @rtype: list
+        """
+        return [self.key_row_dict.get(key, None) for key in keys]
+
+    def get_embeddings(self, rows):
+        """
+        @param rows: rows in embeddings
+        @type rows: list
+        @return: embeddings of rows (copied out of the memmap)
+        @rtype: np.ndarray (len(rows), dimension)
+        """
+        return np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)])
+
+    def add(self, keys, embeddings):
+        """
+        append (keys, embeddings) into the store
+        embeddings are written (and fsynced) before keys, so a key is never visible without its row
+        the new keys are indexed and the memmap is extended in place, keys.txt is not read again
+        @param keys: text keys not in the store
+        @type keys: list
+        @param embeddings:
+        @type embeddings: np.ndarray (len(keys), dimension)
+        @return:
+        @rtype:
+        """
+        if not keys:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = embeddings.shape[1]
+            os.makedirs(self.dirpath, exist_ok=True)
+            with open(Path(self.dirpath, EmbeddingCache.META_FILENAME), 'w') as f:
+                json.dump({"model_name": self.model_name, "dimension": self.dimension}, f)
+        with open(Path(self.dirpath, EmbeddingCache.EMBEDDINGS_FILENAME), 'ab') as f:
+            f.write(embeddings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(Path(self.dirpath, EmbeddingCache.KEYS_FILENAME), 'a') as f:
+            f.write("".join(f"{key}\n" for key in keys))
+            f.flush()
+            os.fsync(f.fileno())
+        for row, key in enumerate(keys, start=self.row_num):
+            self.key_row_dict[key] = self.key_row_dict.get(key, row)
+        self.row_num = self.row_num + len(keys)
+        self.map_embeddings()
+
+    def clear(self):
+        for filename in [EmbeddingCache.META_FILENAME, EmbeddingCache.KEYS_FILENAME,
+                         EmbeddingCache.EMBEDDINGS_FILENAME]:
+            filepath = Path(self.dirpath, filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        self.dimension = None
+        self.key_row_dict = dict()
+        self.row_num = 0
+        self.embeddings = None
+
+
+class EmbeddingUtil:
+    """
+    every SBERT encode goes through EmbeddingUtil.encode:
+    texts are keyed by (model name, sha1 of normalized text), only cache misses are encoded (in batches)
+    """
+    MODEL_NAME_EMBEDDING_CACHE_DICT = dict()  # dict{ key: model_name, value: EmbeddingCache }
+
+    @staticmethod
+    def normalize_text(text):
+        """
+        NFC + collapse whitespaces, which does not change the tokens seen by the SBERT tokenizer
+        """
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @staticmethod
+    def get_text_key(text):
+        return hashlib.sha1(EmbeddingUtil.normalize_text(text).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def normalize_model_name(model_name):
+        """
+        one cache per model however it was loaded:
+        "paraphrase-MiniLM-L6-v2", "sentence-transformers/paraphrase-MiniLM-L6-v2",
+        ".../sentence_transformers/sentence-transformers_paraphrase-MiniLM-L6-v2/" -> "paraphrase-MiniLM-L6-v2"
+        """
+        model_name = re.split(r"[/\\]", model_name.rstrip("/\\"))[-1]
+        return re.sub(r"^sentence-transformers_", "", model_name)
+
+    @staticmethod
+    def get_model_name(model):
+        """
+        NLPUtil.SBERT_MODEL -> SBERT_MODEL_NAME
+        other SentenceTransformer -> the name_or_path of its tokenizer
+        normalized by EmbeddingUtil.normalize_model_name
+        """
+        if model is NLPUtil.SBERT_MODEL:
+            return EmbeddingUtil.normalize_model_name(SBERT_MODEL_NAME)
+        model_name = getattr(model, "model_name", None)
+        if not model_name:
+            model_name = model.tokenizer.name_or_path
+        return EmbeddingUtil.normalize_model_name(model_name)
+
+    @staticmethod
+    def get_embedding_cache(model_name):
+        if model_name not in EmbeddingUtil.MODEL_NAME_EMBEDDING_CACHE_DICT.keys():
+            EmbeddingUtil.MODEL_NAME_EMBEDDING_CACHE_DICT[model_name] = EmbeddingCache(model_name)
+        return EmbeddingUtil.MODEL_NAME_EMBEDDING_CACHE_DICT[model_name]
+
+    @staticmethod
+    def encode(texts, model=None, batch_size=SBERT_BATCH_SIZE, show_progress_bar=False, convert_to_tensor=False):
+        """
+        drop-in for model.encode(texts) backed by EmbeddingCache
+        @param texts: text or text list
+        @type texts: str or list
+        @param model: SentenceTransformer, default NLPUtil.SBERT_MODEL
+        @type model: SentenceTransformer
+        @param batch_size: batch size to encode cache misses
+        @type batch_size: int
+        @param show_progress_bar:
+        @type show_progress_bar: bool
+        @param convert_to_tensor: return torch.Tensor instead of np.ndarray
+        @type convert_to_tensor: bool
+        @return: embedding (text) or embeddings (text list)
+        @rtype: np.ndarray or torch.Tensor
+        """
+        if model is None:
+            model = NLPUtil.SBERT_MODEL
+        is_single_text = isinstance(texts, str)
+        if is_single_text:
+            texts = [texts]
+        else:
+            texts = list(texts)
+        if not texts:
+            return model.encode(texts, convert_to_tensor=convert_to_tensor)
+
+        embedding_cache = EmbeddingUtil.get_embedding_cache(EmbeddingUtil.get_model_name(model))
+        keys = [EmbeddingUtil.get_text_key(text) for text in texts]
+        miss_key_text_dict = dict()
+        for key, row, text in zip(keys, embedding_cache.get_rows(keys), texts):
+            if row is None:
+                miss_key_text_dict[key] = miss_key_text_dict.get(key, text)
+        if miss_key_text_dict:
+            logging.warning(f"Encode {len(miss_key_text_dict)} / {len(texts)} texts (embedding cache misses)...")
+            miss_embeddings = model.encode(list(miss_key_text_dict.values()), batch_size=batch_size,
+                                           show_progress_bar=show_progress_bar, convert_to_numpy=True)
+            embedding_cache.add(list(miss_key_text_dict.keys()), miss_embeddings)
+
+        embeddings = embedding_cache.get_embeddings(embedding_cache.get_rows(keys))
+        if convert_to_tensor:
+            embeddings = torch.from_numpy(embeddings)
+        if is_single_text:
+            return embeddings[0]
+        return embeddings
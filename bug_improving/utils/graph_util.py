@@ -1,12 +1,17 @@
+import heapq
 import json
+import os
 from collections import Counter
 
 from bug_improving.event_extraction.placeholder import Placeholder
 from bug_improving.pipelines.generator import ScenarioLinker, ScenarioCombiner
+from bug_improving.types.cluster_graph import ClusterGraph
+from bug_improving.types.graph_store import GraphStore, LazyMapping
+from bug_improving.utils.embedding_util import EmbeddingUtil
 from bug_improving.utils.file_util import FileUtil
-from bug_improving.utils.nlp_util import NLPUtil
 from bug_improving.utils.path_util import PathUtil
-from config import STEP_MERGE_THRESHOLD
+from bug_improving.utils.vector_index import VectorIndex, VectorIndexUtil
+from config import STEP_MERGE_THRESHOLD, VECTOR_INDEX_TYPE
 
 
 class GraphUtil:
@@ -18,6 +23,13 @@ class GraphUtil:
     STEP_LIST = None
     STEP_TEXT_LIST = None
     STEP_TEXT_EMBEDDING_LIST = None
+    STEP_VECTOR_INDEX = None  # VectorIndex over STEP_TEXT_EMBEDDING_LIST
+    # dict() key: cluster_index value: [(bug_id, step_id, is_operational), ...], postings of GraphUtil.get_cluster_postings
+    CLUSTER_INDEX_POSTINGS_DICT = None
+    CLUSTER_INDEX_DF_DICT = None  # dict() key: cluster_index value: number of bugs with steps in the cluster
+    BUG_ID_CREATION_TIME_DICT = None  # dict() key: bug_id value: bug.creation_time
+    CLUSTER_POSTINGS_BUGS = None  # bugs indexed by GraphUtil.get_cluster_postings
+    CLUSTER_GRAPH = None  # ClusterGraph over INDEX_CLUSTER_DICT (step cluster transitions)
 
     LAYER = "layer"
 
@@ -57,18 +69,68 @@ class GraphUtil:
                     step_text_list.append(step.text)
         GraphUtil.STEP_LIST = step_list
         GraphUtil.STEP_TEXT_LIST = step_text_list
-        GraphUtil.STEP_TEXT_EMBEDDING_LIST = NLPUtil.SBERT_MODEL.encode(step_text_list, convert_to_tensor=True)
+        GraphUtil.STEP_TEXT_EMBEDDING_LIST = EmbeddingUtil.encode(step_text_list, convert_to_tensor=True)
+        GraphUtil.STEP_VECTOR_INDEX = None
         # return step_list, step_text_list
 
+    @staticmethod
+    def get_step_vector_index(index_type=VECTOR_INDEX_TYPE, filepath=None):
+        """
+        get GraphUtil.STEP_VECTOR_INDEX (VectorIndex over GraphUtil.STEP_TEXT_EMBEDDING_LIST)
+        load it from filepath if it was built on the same step texts, else build and save it
+        @param index_type: "exact" or "ivf" (approximate, opt-in, see IVFVectorIndex)
+        @type index_type: str
+        @param filepath: default PathUtil.get_step_vector_index_filepath(), next to the bugs
+        @type filepath: Path
+        @return: None
+        @rtype: None
+        """
+        if filepath is None:
+            filepath = PathUtil.get_step_vector_index_filepath()
+        step_text_key = EmbeddingUtil.get_text_key("\n".join(GraphUtil.STEP_TEXT_LIST))
+        if os.path.exists(filepath):
+            step_vector_index = VectorIndex.load(filepath)
+            if getattr(step_vector_index, "step_text_key", None) == step_text_key and \
+                    type(step_vector_index) is VectorIndexUtil.INDEX_TYPE_CLASS_DICT[index_type]:
+                GraphUtil.STEP_VECTOR_INDEX = step_vector_index
+                return
+        step_vector_index = VectorIndexUtil.build_vector_index(GraphUtil.STEP_TEXT_EMBEDDING_LIST, index_type)
+        step_vector_index.step_text_key = step_text_key
+        step_vector_index.save(filepath)
+        GraphUtil.STEP_VECTOR_INDEX = step_vector_index
+
+    @staticmethod
+    def load_graph_store(graph_store):
+        """
+        use a GraphStore (memory-mapped) instead of Bugs loaded from the pickle:
+        GraphUtil.BUGS, GraphUtil.BUG_ID_BUG_DICT, GraphUtil.INDEX_CLUSTER_DICT, GraphUtil.STEP_LIST,
+        GraphUtil.STEP_TEXT_LIST and GraphUtil.STEP_TEXT_EMBEDDING_LIST (if stored) are backed by it,
+        bugs and steps are materialized when they are accessed
+        @param graph_store:
+        @type graph_store: GraphStore
+        @return: None
+        @rtype: None
+        """
+        GraphUtil.BUGS = graph_store
+        GraphUtil.get_bug_id_bug_dict(graph_store)
+        GraphUtil.get_index_cluster_dict(graph_store)
+        GraphUtil.CLUSTER_GRAPH = graph_store.cluster_graph
+        GraphUtil.STEP_LIST, GraphUtil.STEP_TEXT_LIST = graph_store.get_steps()
+        GraphUtil.STEP_TEXT_EMBEDDING_LIST = graph_store.get_step_embeddings()
+        GraphUtil.STEP_VECTOR_INDEX = None
+
     @staticmethod
     def get_bug_id_bug_dict(bugs):
         """
         get GraphUtil.BUG_ID_BUG_DICT (key: bug.id, value: bug (Bug))
         @param bugs:
-        @type bugs: Bugs
+        @type bugs: Bugs or GraphStore
         @return: None
         @rtype: None
         """
+        if isinstance(bugs, GraphStore):
+            GraphUtil.BUG_ID_BUG_DICT = bugs.get_bug_id_bug_dict()
+            return
         GraphUtil.BUG_ID_BUG_DICT = dict()
         for bug in bugs:
             GraphUtil.BUG_ID_BUG_DICT[bug.id] = GraphUtil.BUG_ID_BUG_DICT.get(bug.id, bug)
@@ -76,6 +138,35 @@ class GraphUtil:
     @staticmethod
     def get_index_cluster_dict(bugs):
         GraphUtil.INDEX_CLUSTER_DICT = bugs.step_index_cluster_dict
+        GraphUtil.CLUSTER_GRAPH = None
+
+    @staticmethod
+    def get_cluster_graph():
+        """
+        get GraphUtil.CLUSTER_GRAPH (ClusterGraph), built once from GraphUtil.INDEX_CLUSTER_DICT
+        @return: GraphUtil.CLUSTER_GRAPH
+        @rtype: ClusterGraph
+        """
+        if GraphUtil.CLUSTER_GRAPH is None:
+            if isinstance(GraphUtil.BUGS, GraphStore) and GraphUtil.INDEX_CLUSTER_DICT is \
+                    GraphUtil.BUGS.step_index_cluster_dict:
+                graph_store = GraphUtil.BUGS
+                GraphUtil.CLUSTER_GRAPH = ClusterGraph.from_step_columns(
+                    graph_store.step_cluster_indexes, graph_store.step_nexts, graph_store.meta["cluster_num"],
+                    GraphStore.NULL_INT)
+            else:
+                GraphUtil.CLUSTER_GRAPH = ClusterGraph.from_index_cluster_dict(GraphUtil.INDEX_CLUSTER_DICT)
+        return GraphUtil.CLUSTER_GRAPH
+
+    @staticmethod
+    def get_cluster_index(cluster):
+        """
+        @return: cluster_index of the steps in cluster, None if cluster is empty
+        @rtype: int
+        """
+        for step in cluster:
+            return step.cluster_index
+        return None
 
     # @staticmethod
     # def get_index_cluster_expected_actual_result_dict():
@@ -124,28 +215,45 @@ class GraphUtil:
         @return: None
         @rtype: None
         """
+        if isinstance(GraphUtil.INDEX_CLUSTER_DICT, LazyMapping):
+            # clusters of a GraphStore: get the list of a cluster when it is accessed
+            GraphUtil.INDEX_CLUSTER_EXPECTED_ACTUAL_RESULT_DICT = LazyMapping(
+                GraphUtil.INDEX_CLUSTER_DICT.keys_list,
+                lambda cluster_index: GraphUtil.get_expected_actual_result_list(
+                    GraphUtil.INDEX_CLUSTER_DICT[cluster_index]))
+            return
         GraphUtil.INDEX_CLUSTER_EXPECTED_ACTUAL_RESULT_DICT = dict()
         for cluster_index in GraphUtil.INDEX_CLUSTER_DICT.keys():
             cluster = GraphUtil.INDEX_CLUSTER_DICT[cluster_index]
             # bugid_stepid_expected_actual_result_list = [('BugID', 'No. Step', 'Expected Result', 'Actual Result')]
 
             if cluster:
-                bugid_stepid_expected_actual_result_list = []
-                for step in cluster:
-                    if step.next_step is None:
-                        if step.bug.description.expected_results or step.bug.description.actual_results:
-                            expected_results = None
-                            actual_results = None
-                            if step.bug.description.expected_results:
-                                expected_results = step.bug.description.expected_results
-                            if step.bug.description.actual_results:
-                                actual_results = step.bug.description.actual_results
-                            bugid_stepid_expected_actual_result_list.append((step.bug.id, step.id,
-                                                                             expected_results,
-                                                                             actual_results))
                 GraphUtil.INDEX_CLUSTER_EXPECTED_ACTUAL_RESULT_DICT[cluster_index] = \
-                    GraphUtil.INDEX_CLUSTER_EXPECTED_ACTUAL_RESULT_DICT.get(cluster_index,
-                                                                            bugid_stepid_expected_actual_result_list)
+                    GraphUtil.INDEX_CLUSTER_EXPECTED_ACTUAL_RESULT_DICT.get(
+                        cluster_index, GraphUtil.get_expected_actual_result_list(cluster))
+
+    @staticmethod
+    def get_expected_actual_result_list(cluster):
+        """
+        @param cluster: set(step(object), step(object), ...)
+        @type cluster: set
+        @return: [(bug_id, step_id, expected results, actual results), ...] of the last steps in cluster
+        @rtype: list
+        """
+        bugid_stepid_expected_actual_result_list = []
+        for step in cluster:
+            if step.next_step is None:
+                if step.bug.description.expected_results or step.bug.description.actual_results:
+                    expected_results = None
+                    actual_results = None
+                    if step.bug.description.expected_results:
+                        expected_results = step.bug.description.expected_results
+                    if step.bug.description.actual_results:
+                        actual_results = step.bug.description.actual_results
+                    bugid_stepid_expected_actual_result_list.append((step.bug.id, step.id,
+                                                                     expected_results,
+                                                                     actual_results))
+        return bugid_stepid_expected_actual_result_list
 
     @staticmethod
     def find_clusters_by_element(element):
@@ -168,136 +276,131 @@ class GraphUtil:
         index_set = set()
         # if not GraphUtil.STEP_TEXT_LIST:
         #     bugs.get_steps()
-        embedding1 = NLPUtil.SBERT_MODEL.encode([text], convert_to_tensor=True)
-        pairs_list = NLPUtil.get_pairs_with_cossim_by_decreasing(embedding1, GraphUtil.STEP_TEXT_EMBEDDING_LIST)
+        if GraphUtil.STEP_VECTOR_INDEX is None:
+            GraphUtil.get_step_vector_index()
+        embedding1 = EmbeddingUtil.encode([text])
+        # [(step index, score), ...] with score >= STEP_MERGE_THRESHOLD
+        pairs_list = GraphUtil.STEP_VECTOR_INDEX.search(embedding1, threshold=STEP_MERGE_THRESHOLD)
         for pairs in pairs_list:
-            for pair in pairs:
-                # {'index': [i, j], 'score': cosine_scores[i][j]}
-                if pair['score'] >= STEP_MERGE_THRESHOLD:
-                    cluster_index = GraphUtil.STEP_LIST[pair['index'][1]].cluster_index
-                    index_set.add(cluster_index)
-                else:
-                    break
+            for step_index, score in pairs:
+                cluster_index = GraphUtil.STEP_LIST[step_index].cluster_index
+                index_set.add(cluster_index)
 
         for index in index_set:
             cluster_list.append(GraphUtil.INDEX_CLUSTER_DICT[index])
         return cluster_list
 
     @staticmethod
-    def find_relevant_ranked_bugs_by_bug_id(bugs, bug_id):
+    def get_cluster_postings(bugs):
         """
-        get all relevant bugs of a bug (whose id is bug_id)
-        ranking by relevance
-        what is relevance:
-            a. the number of steps in the same cluster (the same step.cluster_index)
-            b. if a is the same, the bug with the smaller sum of cluster_index_count (like df, the number of times cluster_index appears in different bugs) is ranked higher
-            c. sort by bug.creation_time (reverse=True)
-            # d. more same elements (Concept object)
-        @param bugs: bugs
-        @type bugs: Bugs
+        get the inverted index over step clusters of bugs:
+        GraphUtil.CLUSTER_INDEX_POSTINGS_DICT (key: cluster_index, value: [(bug_id, step_id, is_operational), ...])
+        GraphUtil.CLUSTER_INDEX_DF_DICT (key: cluster_index, value: number of bugs with steps in the cluster, df)
+        GraphUtil.BUG_ID_CREATION_TIME_DICT (key: bug_id, value: bug.creation_time)
+        a GraphStore is indexed from its columns, without materializing bugs
+        @param bugs:
+        @type bugs: Bugs or GraphStore
+        @return: None
+        @rtype: None
+        """
+        cluster_index_postings_dict = dict()
+        bug_id_creation_time_dict = dict()
+        if isinstance(bugs, GraphStore):
+            bug_ids = [json.loads(bugs.bug_ids[row]) for row in range(len(bugs))]
+            for row, bug_id in enumerate(bug_ids):
+                bug_id_creation_time_dict[bug_id] = GraphStore.int_to_datetime(bugs.bug_creation_times[row])
+            for step_row in range(len(bugs.step_texts)):
+                cluster_index = GraphStore.get_int(bugs.step_cluster_indexes[step_row])
+                is_operational = None if bugs.step_is_operationals[step_row] == -1 \
+                    else bool(bugs.step_is_operationals[step_row])
+                cluster_index_postings_dict[cluster_index] = cluster_index_postings_dict.get(cluster_index, [])
+                cluster_index_postings_dict[cluster_index].append((bug_ids[bugs.step_bugs[step_row]],
+                                                                   GraphStore.get_int(bugs.step_ids[step_row]),
+                                                                   is_operational))
+        else:
+            for bug in bugs:
+                bug_id_creation_time_dict[bug.id] = bug.creation_time
+                if bug.description.steps_to_reproduce:
+                    for step in bug.description.steps_to_reproduce:
+                        cluster_index_postings_dict[step.cluster_index] = \
+                            cluster_index_postings_dict.get(step.cluster_index, [])
+                        cluster_index_postings_dict[step.cluster_index].append((bug.id, step.id, step.is_operational))
+        cluster_index_df_dict = dict()
+        for cluster_index, postings in cluster_index_postings_dict.items():
+            cluster_index_df_dict[cluster_index] = len({bug_id for bug_id, _, _ in postings})
+        GraphUtil.CLUSTER_INDEX_POSTINGS_DICT = cluster_index_postings_dict
+        GraphUtil.CLUSTER_INDEX_DF_DICT = cluster_index_df_dict
+        GraphUtil.BUG_ID_CREATION_TIME_DICT = bug_id_creation_time_dict
+        GraphUtil.CLUSTER_POSTINGS_BUGS = bugs
+
+    @staticmethod
+    def rank_relevant_bugs(bugs, bug_id, with_step_type=False, top_k=None):
+        """
+        rank relevant bugs of the bug (bug_id) by the postings of its step clusters only
+        (see GraphUtil.find_relevant_ranked_bugs_by_bug_id for the ranking rules)
+        @param bugs:
+        @type bugs: Bugs or GraphStore
         @param bug_id: the id of bug
         @type bug_id: int
-        @return: bug list (ranked by relevance of the bug)
-        @rtype: list
-        """
-        bug_list = list()
+        @param with_step_type: only use operational steps of the bug
+        @type with_step_type: bool
+        @param top_k: the number of bugs to return (selected by a heap), None means all
+        @type top_k: int
+        @return: bug list (ranked by relevance of the bug), bug_ranking_details_dict
+        @rtype: list, dict
+        """
+        if GraphUtil.CLUSTER_POSTINGS_BUGS is not bugs:
+            GraphUtil.get_cluster_postings(bugs)
+        # key: bug_id      value: [cluster_index, cluster_index, ...], in the order the bugs are found
+        bug_id_cluster_index_list_dict = dict()
         # key: cluster_index   value: count (number of cluster occurs in different bugs, like df)
         cluster_index_count_dict = dict()
-        # key: bug      value: [cluster_index, cluster_index, ...]
-        bug_cluster_index_list_dict = dict()
-        # for concept ranking **************************************************************************
-        # key: bug      value: [concept_]
-        # bug_concept_list_dict = dict()
-        # ***********************************************************************************************
-        """
-        key: bug
-        value: ([cluster_index, cluster_index, ...], cluster_index_count_sum)
-                "cluster_index_list": [cluster_index, cluster_index, ...]
-                cluster_index_count_sum: sum of cluster_index_df
-        """
-        bug_ranking_details_dict = dict()
 
-        # find input_bug
-        input_bug = None
-        for bug in bugs:
-            if bug.id == bug_id:
-                input_bug = bug
-                break
-        # initiate cluster_index_count_dict (key: cluster_index   value: count (like df))
-        # get bug_cluster_dict (key: bug      value: [cluster_index, cluster_index, ...])
-        if input_bug:
+        input_bug = bugs.get_bug_by_id(bug_id)
+        if input_bug and input_bug.description.steps_to_reproduce:
             for input_bug_step in input_bug.description.steps_to_reproduce:
+                if with_step_type and not input_bug_step.is_operational:
+                    continue
                 cluster_index = input_bug_step.cluster_index
-                cluster_index_count_dict[cluster_index] = cluster_index_count_dict.get(cluster_index, 0)
-                cluster = GraphUtil.INDEX_CLUSTER_DICT[cluster_index]
-                for step in cluster:
-                    if step.bug.id != input_bug.id:
-                        bug_cluster_index_list_dict[step.bug] = bug_cluster_index_list_dict.get(step.bug, [])
-                        bug_cluster_index_list_dict[step.bug].append(cluster_index)
-        # assign values to cluster_index_count_dict
-        for bug in bug_cluster_index_list_dict.keys():
-            for cluster_index in cluster_index_count_dict.keys():
-                if cluster_index in bug_cluster_index_list_dict[bug]:
-                    cluster_index_count_dict[cluster_index] = cluster_index_count_dict[cluster_index] + 1
-            # print(f"{bug.id}: {bug_cluster_index_list_dict[bug]}")
-        # for cluster_index in cluster_index_count_dict.keys():
-        # print(f"{cluster_index}: {cluster_index_count_dict[cluster_index]}")
-
-        # ranking rules
-        # sort bugs by number of steps in the same cluster
-        cluster_index_list_len_bug_list_dict = dict()  # key: cluster_index_list_len, value: (bug, sum)_list
-        # sum: the sum of cluster_index_count
-        for bug in sorted(bug_cluster_index_list_dict,
-                          key=lambda k: len(bug_cluster_index_list_dict[k]), reverse=True):
-            cluster_index_list_len_bug_list_dict[len(bug_cluster_index_list_dict[bug])] = \
-                cluster_index_list_len_bug_list_dict.get(len(bug_cluster_index_list_dict[bug]), [])
+                # the input bug has steps in the cluster, so it is not counted
+                cluster_index_count_dict[cluster_index] = GraphUtil.CLUSTER_INDEX_DF_DICT.get(cluster_index, 1) - 1
+                for posting_bug_id, _, _ in GraphUtil.CLUSTER_INDEX_POSTINGS_DICT.get(cluster_index, []):
+                    if posting_bug_id != input_bug.id:
+                        bug_id_cluster_index_list_dict[posting_bug_id] = \
+                            bug_id_cluster_index_list_dict.get(posting_bug_id, [])
+                        bug_id_cluster_index_list_dict[posting_bug_id].append(cluster_index)
+
+        """
+        sorted by:
+        1. the number of steps in the same cluster (descending)
+        2. cluster_index_df_sum (ascending)
+        3. bug.creation_time (descending), bugs without creation_time last
+        4. the order the bugs are found
+        """
+        ranking_keys = []
+        for order, (candidate_bug_id, cluster_index_list) in enumerate(bug_id_cluster_index_list_dict.items()):
             cluster_index_df_sum = 0
-            for cluster_index in bug_cluster_index_list_dict[bug]:
+            for cluster_index in cluster_index_list:
                 cluster_index_df_sum = cluster_index_df_sum + cluster_index_count_dict[cluster_index]
-            """
-            if want to add concept ranking:
-            (bug, cluster_index_df_sum) -> (bug, cluster_index_df_sum, concept_count, concept_df_sum)
-            """
-            cluster_index_list_len_bug_list_dict[len(bug_cluster_index_list_dict[bug])].append((bug,
-                                                                                                cluster_index_df_sum))
-            # print(bug)
-        # sort bugs by the sum of cluster_index_count (like df) (Ascending)
-        for cluster_index_list_len in cluster_index_list_len_bug_list_dict.keys():
-            # print(f"{cluster_index_list_len}: ")
-            """
-            if want to add concept ranking:
-            key=lambda x: x[1] -> key=lambda x: (x[1], x[2], x[3])
-            """
-            # cluster_index_list_len_bug_list_dict[cluster_index_list_len] = \
-            #     sorted(cluster_index_list_len_bug_list_dict[cluster_index_list_len], key=lambda x: x[1])
-            temp_bug_list = list()
-            for bug, cluster_index_df_sum in cluster_index_list_len_bug_list_dict[cluster_index_list_len]:
-                # print(f"\t\t{bug.id}: {cluster_index_df_sum}")
-                temp_bug_list.append((-cluster_index_df_sum,
-                                      bug))  # smaller cluster_index_df_sum, higher ranking, for reverse sorting, get the -cluster_index_df_sum
-                # bug_list.append(bug)
-            """
-            sorted by:
-            1. -cluster_index_df_sum
-            2. bug.creation_time
-            """
-            temp_bug_list = sorted(temp_bug_list, key=lambda x: (x[0], x[1].creation_time), reverse=True)
-            for _, bug in temp_bug_list:
-                bug_list.append(bug)
-        # get bug_ranking_details_dict
-        for bug in bug_list:
-            cluster_index_count_sum = 0
-            for cluster_index in bug_cluster_index_list_dict[bug]:
-                cluster_index_count_sum = cluster_index_count_sum + cluster_index_count_dict[cluster_index]
-
-            bug_ranking_details_dict[bug] = bug_ranking_details_dict.get(bug, (bug_cluster_index_list_dict[bug],
-                                                                               cluster_index_count_sum))
-        # print(bug_ranking_details_dict)
+            creation_time = GraphUtil.BUG_ID_CREATION_TIME_DICT.get(candidate_bug_id, None)
+            timestamp = -creation_time.timestamp() if creation_time else float("inf")
+            ranking_keys.append((-len(cluster_index_list), cluster_index_df_sum, timestamp, order, candidate_bug_id))
+        if top_k is None:
+            ranking_keys.sort()
+        else:
+            ranking_keys = heapq.nsmallest(top_k, ranking_keys)
 
+        bug_list = list()
+        bug_ranking_details_dict = dict()
+        for _, cluster_index_df_sum, _, _, candidate_bug_id in ranking_keys:
+            bug = bugs.get_bug_by_id(candidate_bug_id)
+            bug_list.append(bug)
+            bug_ranking_details_dict[bug] = bug_ranking_details_dict.get(
+                bug, (bug_id_cluster_index_list_dict[candidate_bug_id], cluster_index_df_sum))
         return bug_list, bug_ranking_details_dict
 
     @staticmethod
-    def find_relevant_ranked_bugs_by_bug_id_with_step_type(bugs, bug_id):
+    def find_relevant_ranked_bugs_by_bug_id(bugs, bug_id, top_k=None):
         """
         get all relevant bugs of a bug (whose id is bug_id)
         ranking by relevance
@@ -306,109 +409,33 @@ class GraphUtil:
             b. if a is the same, the bug with the smaller sum of cluster_index_count (like df, the number of times cluster_index appears in different bugs) is ranked higher
             c. sort by bug.creation_time (reverse=True)
             # d. more same elements (Concept object)
+        only the postings of the bug's clusters are touched (GraphUtil.CLUSTER_INDEX_POSTINGS_DICT)
         @param bugs: bugs
-        @type bugs: Bugs
+        @type bugs: Bugs or GraphStore
         @param bug_id: the id of bug
         @type bug_id: int
-        @return: bug list (ranked by relevance of the bug)
-        @rtype: list
+        @param top_k: the number of bugs to return, None means all
+        @type top_k: int
+        @return: bug list (ranked by relevance of the bug),
+                 bug_ranking_details_dict (key: bug, value: ([cluster_index, cluster_index, ...], cluster_index_count_sum))
+        @rtype: list, dict
         """
-        bug_list = list()
-        # key: cluster_index   value: count (number of cluster occurs in different bugs, like df)
-        cluster_index_count_dict = dict()
-        # key: bug      value: [cluster_index, cluster_index, ...]
-        bug_cluster_index_list_dict = dict()
-        # for concept ranking **************************************************************************
-        # key: bug      value: [concept_]
-        # bug_concept_list_dict = dict()
-        # ***********************************************************************************************
-        """
-        key: bug
-        value: ([cluster_index, cluster_index, ...], cluster_index_count_sum)
-                "cluster_index_list": [cluster_index, cluster_index, ...]
-                cluster_index_count_sum: sum of cluster_index_df
-        """
-        bug_ranking_details_dict = dict()
+        return GraphUtil.rank_relevant_bugs(bugs, bug_id, with_step_type=False, top_k=top_k)
 
-        # find input_bug
-        input_bug = None
-        for bug in bugs:
-            if bug.id == bug_id:
-                input_bug = bug
-                break
-        # initiate cluster_index_count_dict (key: cluster_index   value: count (like df))
-        # get bug_cluster_dict (key: bug      value: [cluster_index, cluster_index, ...])
-        if input_bug:
-            for input_bug_step in input_bug.description.steps_to_reproduce:
-                if input_bug_step.is_operational:
-                    cluster_index = input_bug_step.cluster_index
-                    cluster_index_count_dict[cluster_index] = cluster_index_count_dict.get(cluster_index, 0)
-                    cluster = GraphUtil.INDEX_CLUSTER_DICT[cluster_index]
-                    for step in cluster:
-                        if step.bug.id != input_bug.id:
-                            bug_cluster_index_list_dict[step.bug] = bug_cluster_index_list_dict.get(step.bug, [])
-                            bug_cluster_index_list_dict[step.bug].append(cluster_index)
-        # assign values to cluster_index_count_dict
-        for bug in bug_cluster_index_list_dict.keys():
-            for cluster_index in cluster_index_count_dict.keys():
-                if cluster_index in bug_cluster_index_list_dict[bug]:
-                    cluster_index_count_dict[cluster_index] = cluster_index_count_dict[cluster_index] + 1
-            # print(f"{bug.id}: {bug_cluster_index_list_dict[bug]}")
-        # for cluster_index in cluster_index_count_dict.keys():
-        # print(f"{cluster_index}: {cluster_index_count_dict[cluster_index]}")
-
-        # ranking rules
-        # sort bugs by number of steps in the same cluster
-        cluster_index_list_len_bug_list_dict = dict()  # key: cluster_index_list_len, value: (bug, sum)_list
-        # sum: the sum of cluster_index_count
-        for bug in sorted(bug_cluster_index_list_dict,
-                          key=lambda k: len(bug_cluster_index_list_dict[k]), reverse=True):
-            cluster_index_list_len_bug_list_dict[len(bug_cluster_index_list_dict[bug])] = \
-                cluster_index_list_len_bug_list_dict.get(len(bug_cluster_index_list_dict[bug]), [])
-            cluster_index_df_sum = 0
-            for cluster_index in bug_cluster_index_list_dict[bug]:
-                cluster_index_df_sum = cluster_index_df_sum + cluster_index_count_dict[cluster_index]
-            """
-            if want to add concept ranking:
-            (bug, cluster_index_df_sum) -> (bug, cluster_index_df_sum, concept_count, concept_df_sum)
-            """
-            cluster_index_list_len_bug_list_dict[len(bug_cluster_index_list_dict[bug])].append((bug,
-                                                                                                cluster_index_df_sum))
-            # print(bug)
-        # sort bugs by the sum of cluster_index_count (like df) (Ascending)
-        for cluster_index_list_len in cluster_index_list_len_bug_list_dict.keys():
-            # print(f"{cluster_index_list_len}: ")
-            """
-            if want to add concept ranking:
-            key=lambda x: x[1] -> key=lambda x: (x[1], x[2], x[3])
-            """
-            # cluster_index_list_len_bug_list_dict[cluster_index_list_len] = \
-            #     sorted(cluster_index_list_len_bug_list_dict[cluster_index_list_len], key=lambda x: x[1])
-            temp_bug_list = list()
-            for bug, cluster_index_df_sum in cluster_index_list_len_bug_list_dict[cluster_index_list_len]:
-                # print(f"\t\t{bug.id}: {cluster_index_df_sum}")
-                temp_bug_list.append((-cluster_index_df_sum,
-                                      bug))  # smaller cluster_index_df_sum, higher ranking, for reverse sorting, get the -cluster_index_df_sum
-                # bug_list.append(bug)
-            """
-            sorted by:
-            1. -cluster_index_df_sum
-            2. bug.creation_time
-            """
-            temp_bug_list = sorted(temp_bug_list, key=lambda x: (x[0], x[1].creation_time), reverse=True)
-            for _, bug in temp_bug_list:
-                bug_list.append(bug)
-        # get bug_ranking_details_dict
-        for bug in bug_list:
-            cluster_index_count_sum = 0
-            for cluster_index in bug_cluster_index_list_dict[bug]:
-                cluster_index_count_sum = cluster_index_count_sum + cluster_index_count_dict[cluster_index]
-
-            bug_ranking_details_dict[bug] = bug_ranking_details_dict.get(bug, (bug_cluster_index_list_dict[bug],
-                                                                               cluster_index_count_sum))
-        # print(bug_ranking_details_dict)
-
-        return bug_list, bug_ranking_details_dict
+    @staticmethod
+    def find_relevant_ranked_bugs_by_bug_id_with_step_type(bugs, bug_id, top_k=None):
+        """
+        GraphUtil.find_relevant_ranked_bugs_by_bug_id with the operational steps of the bug only
+        @param bugs: bugs
+        @type bugs: Bugs or GraphStore
+        @param bug_id: the id of bug
+        @type bug_id: int
+        @param top_k: the number of bugs to return, None means all
+        @type top_k: int
+        @return: bug list (ranked by relevance of the bug), bug_ranking_details_dict
+        @rtype: list, dict
+        """
+        return GraphUtil.rank_relevant_bugs(bugs, bug_id, with_step_type=True, top_k=top_k)
 
     @staticmethod
     def get_test_reports_from_two_bugs(bug1, bug2):
@@ -696,52 +723,36 @@ class GraphUtil:
     @staticmethod
     def get_next_clusters(cluster):
         """
-        get cluster's next one layer clusters
+        get cluster's next one layer clusters (successors in GraphUtil.CLUSTER_GRAPH, by cluster index)
         @param cluster:
         @type cluster:
         @return: cluster_list
         @rtype: list
         """
-        index_set = set()
-        cluster_list = list()
-        for step in cluster:
-            if step.next_step:
-                index_set.add(step.next_step.cluster_index)
-
-        for index in index_set:
-            cluster_list.append(GraphUtil.INDEX_CLUSTER_DICT[index])
-        return cluster_list
+        cluster_index = GraphUtil.get_cluster_index(cluster)
+        if cluster_index is None:
+            return []
+        return [GraphUtil.INDEX_CLUSTER_DICT[index]
+                for index in GraphUtil.get_cluster_graph().get_successors(cluster_index).tolist()]
 
     @staticmethod
-    def get_next_clusters_by_bfs(cluster):
+    def get_next_clusters_by_bfs(cluster, max_hop=None):
         """
-        get all next clusters (all layers) by using Breadth-first search (BFS)
+        get all next clusters (all layers) by using Breadth-first search (BFS) on GraphUtil.CLUSTER_GRAPH
         @param cluster: the start node
         @type cluster: step list
+        @param max_hop: stop after max_hop layers, None means all layers
+        @type max_hop: int
         @return: next_clusters (clusters splitted by GraphUtil.LAYER)
         @rtype: list [cluster, GraphUtil.LAYER, cluster, cluster, GraphUtil.LAYER, cluster, cluster]
         """
-        visited = []
-        queue = []
+        cluster_index = GraphUtil.get_cluster_index(cluster)
+        if cluster_index is None:
+            return [cluster, GraphUtil.LAYER]
         next_clusters = []
-
-        visited.append(cluster)
-        queue.append(cluster)
-        queue.append(GraphUtil.LAYER)
-
-        while queue:
-            s = queue.pop(0)
-            if s == GraphUtil.LAYER:
-                next_clusters.append(GraphUtil.LAYER)
-                if queue and queue[-1] != GraphUtil.LAYER:
-                    queue.append(GraphUtil.LAYER)
-                continue
-            next_clusters.append(s)
-            # print(s, end=" ")
-            for neighbour in GraphUtil.get_next_clusters(s):
-                if neighbour not in visited:
-                    visited.append(neighbour)
-                    queue.append(neighbour)
+        for layer in GraphUtil.get_cluster_graph().bfs(cluster_index, max_hop):
+            next_clusters.extend(GraphUtil.INDEX_CLUSTER_DICT[index] for index in layer)
+            next_clusters.append(GraphUtil.LAYER)
         return next_clusters
 
     # @staticmethod
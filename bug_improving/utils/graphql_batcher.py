@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import re
+
+from bug_improving.utils.crawel_executor import CrawelExecutor
+from config import GRAPHQL_BATCH_SIZE, GRAPHQL_MAX_NODE_NUM
+
+
+class GraphQLBatcher:
+    """
+    send many GraphQL queries (e.g., CrawelUtil.get_github_*_queries_for_graphql) as few requests:
+    1. the top-level fields of batch_size queries are packed into one document under aliases (q0_0: repository(...)),
+       as long as the estimated nodes stay under max_node_num (GitHub's node limit of a call)
+    2. the response of a document is split back into one response per query, in the shape of an unbatched one
+       ({"data": {"repository": ...}})
+    3. queries with errors or without data in a batched response are sent again one by one
+    """
+    PATTERN_FIRST_LAST = re.compile(r"\b(?:first|last)\s*:\s*(\d+)")
+    PATTERN_FIELD_NAME = re.compile(r"^\s*(?:(\w+)\s*:\s*)?(\w+)")
+
+    def __init__(self, batch_size=GRAPHQL_BATCH_SIZE, max_node_num=GRAPHQL_MAX_NODE_NUM):
+        self.batch_size = batch_size
+        self.max_node_num = max_node_num
+        self.request_num = 0  # requests sent by the last run
+        self.retried_query_num = 0  # queries sent again one by one by the last run
+
+    @staticmethod
+    def remove_comments(query):
+        """
+        remove "# ..." comments, except inside strings (e.g., file paths)
+        """
+        chars = []
+        in_string = False
+        in_comment = False
+        previous_char = ""
+        for char in query:
+            if in_comment:
+                if char == "\n":
+                    in_comment = False
+                    chars.append(char)
+            elif char == "#" and not in_string:
+                in_comment = True
+            else:
+                if char == '"' and previous_char != "\\":
+                    in_string = not in_string
+                chars.append(char)
+            previous_char = char
+        return "".join(chars)
+
+    @staticmethod
+    def get_top_level_fields(query):
+        """
+        @param query: query document: "{ field(...) { ... } ... }" or "query { ... }" (without variables)
+        @type query: str
+        @return: [(response key of the field (its alias or name), field text), ...]
+        @rtype: list
+        """
+        query = GraphQLBatcher.remove_comments(query)
+        text = query[query.index("{") + 1:query.rindex("}")]
+        fields = []
+        depth = 0
+        start = None
+        in_string = False
+        previous_char = ""
+        for index, char in enumerate(text):
+            if in_string:
+                if char == '"' and previous_char != "\\":
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "({":
+                depth = depth + 1
+            elif char in ")}":
+                depth = depth - 1
+                if depth == 0 and char == "}":
+                    fields.append(text[start:index + 1].strip())
+                    start = None
+            elif depth == 0 and start is None and not char.isspace():
+                start = index
+            previous_char = char
+        if start is not None and text[start:].strip():
+            # scalar field without selection set
+            fields.append(text[start:].strip())
+        field_pairs = []
+        for field in fields:
+            alias, name = GraphQLBatcher.PATTERN_FIELD_NAME.match(field).groups()
+            field_pairs.append((alias or name, field))
+        return field_pairs
+
+    @staticmethod
+    def estimate_node_num(query):
+        """
+        nodes requested by query, like GitHub's node limit:
+        a connection with first/last: n under connections with first/last: m requests m * n nodes
+        """
+        query = GraphQLBatcher.remove_comments(query)
+        position_num_dict = {match.start(): int(match.group(1))
+                             for match in GraphQLBatcher.PATTERN_FIRST_LAST.finditer(query)}
+        multipliers = [1]
+        pending_num = None
+        node_num = 0
+        for index, char in enumerate(query):
+            if index in position_num_dict:
+                pending_num = position_num_dict[index]
+            elif char == "{":
+                if pending_num is not None:
+                    node_num = node_num + multipliers[-1] * pending_num
+                    multipliers.append(multipliers[-1] * pending_num)
+                else:
+                    multipliers.append(multipliers[-1])
+                pending_num = None
+            elif char == "}" and len(multipliers) > 1:
+                multipliers.pop()
+        return max(node_num, 1)
+
+    def get_batches(self, queries):
+        """
+        @return: [[query index, ...], ...], at most batch_size queries and max_node_num estimated nodes per batch
+        @rtype: list
+        """
+        batches = []
+        batch = []
+        batch_node_num = 0
+        for index, query in enumerate(queries):
+            node_num = GraphQLBatcher.estimate_node_num(query)
+            if batch and (len(batch) >= self.batch_size or batch_node_num + node_num > self.max_node_num):
+                batches.append(batch)
+                batch = []
+                batch_node_num = 0
+            batch.append(index)
+            batch_node_num = batch_node_num + node_num
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def get_alias(index, field_index):
+        return f"q{index}_{field_index}"
+
+    @staticmethod
+    def get_batch_query(queries, indexes):
+        """
+        one document with the top-level fields of queries[indexes] under aliases (GraphQLBatcher.get_alias)
+        @return: document, {alias: (query index, response key of the field in the query)}
+        @rtype: str, dict
+        """
+        lines = ["{"]
+        alias_index_key_dict = dict()
+        for index in indexes:
+            for field_index, (key, field) in enumerate(GraphQLBatcher.get_top_level_fields(queries[index])):
+                alias = GraphQLBatcher.get_alias(index, field_index)
+                # replace the alias of the field in the query, if any: "key: name(...)" -> "alias: name(...)"
+                lines.append(f"  {alias}: {field[GraphQLBatcher.PATTERN_FIELD_NAME.match(field).start(2):]}")
+                alias_index_key_dict[alias] = (index, key)
+        lines.append("}")
+        return "\n".join(lines), alias_index_key_dict
+
+    @staticmethod
+    def split_batch_response(response, alias_index_key_dict):
+        """
+        @param response: response of a batch document
+        @type response: dict or Exception
+        @return: {query index: response in the shape of the unbatched query, None if to be sent again}
+        @rtype: dict
+        """
+        index_response_dict = {index: None for index, _ in alias_index_key_dict.values()}
+        if not isinstance(response, dict) or not isinstance(response.get("data", None), dict):
+            return index_response_dict
+        failed_indexes = set()
+        for error in response.get("errors", None) or []:
+            path = error.get("path", None)
+            if path and path[0] in alias_index_key_dict:
+                failed_indexes.add(alias_index_key_dict[path[0]][0])
+            else:
+                # an error not of one field (e.g., the whole document is too expensive): send every query again
+                return index_response_dict
+        index_data_dict = dict()
+        for alias, (index, key) in alias_index_key_dict.items():
+            data = response["data"].get(alias, None)
+            if data is None:
+                failed_indexes.add(index)
+            index_data_dict[index] = index_data_dict.get(index, dict())
+            index_data_dict[index][key] = data
+        for index, data in index_data_dict.items():
+            if index not in failed_indexes:
+                index_response_dict[index] = {"data": data}
+        return index_response_dict
+
+    async def fetch_all(self, queries, executor):
+        """
+        @param queries: query documents
+        @type queries: list
+        @param executor: started CrawelExecutor (session, in-flight bound, rate limit scheduler)
+        @type executor: CrawelExecutor
+        @return: [response, ...] in the order of queries, as if each query were sent alone
+        @rtype: list
+        """
+        responses = [None] * len(queries)
+        batch_queries = []
+        alias_index_key_dicts = []
+        for indexes in self.get_batches(queries):
+            batch_query, alias_index_key_dict = GraphQLBatcher.get_batch_query(queries, indexes)
+            batch_queries.append(batch_query)
+            alias_index_key_dicts.append(alias_index_key_dict)
+        batch_responses = await executor.fetch_multiple(batch_queries)
+        for batch_response, alias_index_key_dict in zip(batch_responses, alias_index_key_dicts):
+            for index, response in GraphQLBatcher.split_batch_response(batch_response,
+                                                                       alias_index_key_dict).items():
+                responses[index] = response
+
+        failed_indexes = [index for index, response in enumerate(responses) if response is None]
+        if failed_indexes:
+            logging.warning(f"Send {len(failed_indexes)} GraphQL queries again one by one")
+            for index, response in zip(failed_indexes,
+                                       await executor.fetch_multiple([queries[index] for index in failed_indexes])):
+                responses[index] = response
+        self.request_num = len(batch_queries) + len(failed_indexes)
+        self.retried_query_num = len(failed_indexes)
+        return responses
+
+    def run(self, queries, headers=None, scheduler=None):
+        """
+        blocking wrapper of fetch_all with its own CrawelExecutor
+        """
+        async def fetch_all():
+            async with CrawelExecutor(headers=headers, scheduler=scheduler) as executor:
+                return await self.fetch_all(queries, executor)
+
+        return asyncio.run(fetch_all())
@@ -0,0 +1,164 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import HTTP_CACHE_WRITE_BATCH_SIZE
+
+
+class HttpCache:
+    """
+    disk-backed HTTP response cache for conditional GET requests (SQLite in WAL mode)
+    key: (url, sha256 of the Authorization header of the request), since GitHub varies responses on Authorization
+         (e.g., private repositories), and RateLimitScheduler rotates the auth tokens: the response cached for
+         one token is only revalidated and served with the same token (tokens are not stored)
+    value: validators (ETag, Last-Modified) and body of the latest 200 response
+    1. get_conditional_headers: If-None-Match / If-Modified-Since of the cached response, if any
+    2. 304 Not Modified: the body is served from the cache (GitHub does not count 304s against the rate limit)
+    3. 200 with a validator: the body is cached (put), written in batches of write_batch_size rows
+       (flush, also at exit), without fsync per row (synchronous=NORMAL)
+    thread-safe: CrawelUtil calls it through asyncio.to_thread, so the SQLite I/O stays off the event loop
+    """
+
+    def __init__(self, filepath, write_batch_size=HTTP_CACHE_WRITE_BATCH_SIZE):
+        self.filepath = filepath
+        self.write_batch_size = write_batch_size
+        self.hit_num = 0  # 304 responses served from the cache
+        self.miss_num = 0  # 200 responses downloaded
+        self.saved_byte_num = 0  # body bytes not downloaded thanks to 304 responses
+        self.downloaded_byte_num = 0  # body bytes of 200 responses
+        self.key_row_dict = dict()  # rows not written yet, dict{ key: (url, auth), value: row }
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self.connection = sqlite3.connect(str(filepath), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS conditional_response ("
+                                "url TEXT, auth TEXT, etag TEXT, last_modified TEXT, body TEXT, created_time REAL, "
+                                "PRIMARY KEY (url, auth))")
+        self.connection.commit()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def get_key(url, headers=None):
+        authorization = (headers or dict()).get("Authorization", "")
+        return url, hashlib.sha256(authorization.encode("utf-8")).hexdigest() if authorization else ""
+
+    def get_row(self, key):
+        """
+        @return: (etag, last_modified, body) of key, from the rows not written yet or the database
+        @rtype: tuple
+        """
+        row = self.key_row_dict.get(key, None)
+        if row is not None:
+            return row[2:5]
+        return self.connection.execute("SELECT etag, last_modified, body FROM conditional_response "
+                                       "WHERE url = ? AND auth = ?", key).fetchone()
+
+    def get_conditional_headers(self, url, headers=None):
+        """
+        @param headers: request headers (with the Authorization of the request, if any)
+        @type headers: dict
+        @return: headers with If-None-Match / If-Modified-Since of the cached response of url (copied if added)
+        @rtype: dict
+        """
+        with self.lock:
+            row = self.get_row(HttpCache.get_key(url, headers))
+        if row is None:
+            return headers
+        headers = dict(headers) if headers else dict()
+        etag, last_modified, _ = row
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def get(self, url, headers=None):
+        """
+        body of a 304 response of url
+        @param headers: request headers (with the Authorization of the request, if any)
+        @type headers: dict
+        @return: cached response json, None if missing
+        @rtype: dict or list
+        """
+        with self.lock:
+            row = self.get_row(HttpCache.get_key(url, headers))
+            if row is None:
+                return None
+            self.hit_num = self.hit_num + 1
+            self.saved_byte_num = self.saved_byte_num + len(row[2].encode("utf-8"))
+        return json.loads(row[2])
+
+    def put(self, url, headers, response_headers, body):
+        """
+        @param headers: request headers (with the Authorization of the request, if any)
+        @type headers: dict
+        @param response_headers: headers of the 200 response
+        @type response_headers: dict-like
+        @param body: response text
+        @type body: str
+        """
+        etag = response_headers.get("ETag", None)
+        last_modified = response_headers.get("Last-Modified", None)
+        with self.lock:
+            self.miss_num = self.miss_num + 1
+            self.downloaded_byte_num = self.downloaded_byte_num + len(body.encode("utf-8"))
+            if etag is None and last_modified is None:
+                return
+            key = HttpCache.get_key(url, headers)
+            self.key_row_dict[key] = key + (etag, last_modified, body, time.time())
+            if len(self.key_row_dict) >= self.write_batch_size:
+                self.write()
+
+    def write(self):
+        """
+        write the rows not written yet in one transaction (call with self.lock held)
+        """
+        if not self.key_row_dict:
+            return
+        self.connection.executemany("INSERT OR REPLACE INTO conditional_response VALUES (?, ?, ?, ?, ?, ?)",
+                                    list(self.key_row_dict.values()))
+        self.connection.commit()
+        self.key_row_dict = dict()
+
+    def flush(self):
+        with self.lock:
+            self.write()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self.connection.close()
+
+    def invalidate(self, url=None):
+        """
+        delete the cached responses of url, for every Authorization (all responses if url is None)
+        @return: the number of deleted responses
+        @rtype: int
+        """
+        with self.lock:
+            self.write()
+            if url is None:
+                cursor = self.connection.execute("DELETE FROM conditional_response")
+            else:
+                cursor = self.connection.execute("DELETE FROM conditional_response WHERE url = ?", (url,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def get_stats(self):
+        """
+        @return: {"hit_num", "miss_num", "hit_ratio", "saved_byte_num", "downloaded_byte_num", "size"}
+        @rtype: dict
+        """
+        with self.lock:
+            self.write()
+            size = self.connection.execute("SELECT COUNT(*) FROM conditional_response").fetchone()[0]
+        request_num = self.hit_num + self.miss_num
+        return {"hit_num": self.hit_num, "miss_num": self.miss_num,
+                "hit_ratio": self.hit_num / request_num if request_num else 0.0,
+                "saved_byte_num": self.saved_byte_num, "downloaded_byte_num": self.downloaded_byte_num,
+                "size": size}
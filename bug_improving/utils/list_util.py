@@ -1,5 +1,7 @@
 from functools import reduce
 
+from bug_improving.utils.union_find import UnionFind
+
 
 class ListUtil:
     @staticmethod
@@ -35,42 +37,29 @@ class ListUtil:
     @staticmethod
     def merge_sets_with_intersection_in_list(bondlist):
         """
-        python 多层列表 合并有相同数值的元素
-        问题描述：假如有一个列表，列表中有许多集合，集合之间可能有重复的元素，设计一个算法，将有相同元素的集合进行合并, # 并且保留值相同的重复元素。
-        问题实际应用场景：成对信息在分组后需要保留的情况。
-        如不需保留，将分组后用sorted函数合并相同元素
-        ————————————————
-        版权声明：本文为CSDN博主「YnagShanwen」的原创文章，遵循CC 4.0 BY-SA版权协议，转载请附上原文出处链接及本声明。
-        原文链接：https://blog.csdn.net/YnagShanwen/article/details/111344386
-        @param bondlist:
-        @type bondlist:
-        @return:
-        @rtype:
+        merge the sets sharing any element into one set, transitively
+        merge by union-find (near-linear), instead of rescanning bondlist until a fixed point
+        @param bondlist: e.g., [{1, 2}, {2, 3}, {4, 5}, {6, 2}, {7, 5}, {8, 9}]
+        @type bondlist: list
+        @return: e.g., [{1, 2, 3, 6}, {4, 5, 7}, {8, 9}], in the order of first seen elements
+        @rtype: list
+        """
+        union_find = UnionFind()
+        union_find.union_sets(bondlist)
+        return union_find.get_components()
+
+    @staticmethod
+    def merge_pairs_into_sets(pairs):
+        """
+        connected components of a pair stream (e.g., (i, j) of util.paraphrase_mining)
+        @param pairs: e.g., [(1, 2), (2, 3), (4, 5), (6, 2), (7, 5), (8, 9)]
+        @type pairs: iterable
+        @return: e.g., [{1, 2, 3, 6}, {4, 5, 7}, {8, 9}]
+        @rtype: list
         """
-        groups = []
-        break1 = False
-        while bondlist:
-            pair1 = bondlist.pop(0)
-            pair1 = list(pair1)
-            b = len(pair1)
-            a = b + 1  # 判断是否循环的初始值
-            while b != a:
-                a = b
-                for atomid in pair1:
-                    for i, pair2 in enumerate(bondlist):
-                        if atomid in pair2:
-                            pair1 = pair1 + list(pair2)
-                            bondlist.pop(i)
-                            if not bondlist:
-                                break1 = True
-                            break
-                    if break1:
-                        break
-                b = len(pair1)
-                # print(pair1)  # 测试分类过程和结果用
-                # print(b)  # 测试分类过程和结果用
-            groups.append(set(pair1))
-        return groups
+        union_find = UnionFind()
+        union_find.union_pairs(pairs)
+        return union_find.get_components()
 
     @staticmethod
     def convert_flatten_list_to_nested_list_by_value(flatten_list, value):
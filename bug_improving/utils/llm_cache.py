@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """
+    disk-backed LLM response cache (SQLite in WAL mode, rows are only inserted or deleted)
+    key: sha256 of the canonical json of (model, temperature, messages)
+    ttl: seconds an answer stays valid, None means forever
+    thread-safe: LLMExecutor calls it through asyncio.to_thread, so the SQLite I/O stays off the event loop
+    """
+
+    def __init__(self, filepath, ttl=None):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.hit_num = 0
+        self.miss_num = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self.connection = sqlite3.connect(str(filepath), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS llm_response ("
+                                "key TEXT PRIMARY KEY, model TEXT, temperature REAL, answer TEXT, "
+                                "total_tokens INTEGER, created_time REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS llm_response_model ON llm_response (model)")
+        self.connection.commit()
+
+    @staticmethod
+    def get_key(model, temperature, messages):
+        """
+        canonical hash of (model, temperature, messages): sorted keys, no whitespace, float temperature
+        """
+        canonical_json = json.dumps({"model": model, "temperature": float(temperature), "messages": messages},
+                                    sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
+
+    def get(self, model, temperature, messages):
+        """
+        @return: cached answer, None if missing or expired
+        @rtype: str
+        """
+        key = LLMCache.get_key(model, temperature, messages)
+        with self.lock:
+            row = self.connection.execute("SELECT answer, created_time FROM llm_response WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+                self.miss_num = self.miss_num + 1
+                return None
+            self.hit_num = self.hit_num + 1
+        return row[0]
+
+    def put(self, model, temperature, messages, answer, total_tokens=None):
+        row = (LLMCache.get_key(model, temperature, messages), model, float(temperature),
+               answer, total_tokens, time.time())
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO llm_response VALUES (?, ?, ?, ?, ?, ?)", row)
+            self.connection.commit()
+
+    def invalidate(self, model=None):
+        """
+        delete answers of model (all answers if model is None)
+        @return: the number of deleted answers
+        @rtype: int
+        """
+        with self.lock:
+            if model is None:
+                cursor = self.connection.execute("DELETE FROM llm_response")
+            else:
+                cursor = self.connection.execute("DELETE FROM llm_response WHERE model = ?", (model,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def remove_expired(self):
+        if self.ttl is None:
+            return 0
+        with self.lock:
+            cursor = self.connection.execute("DELETE FROM llm_response WHERE created_time < ?",
+                                             (time.time() - self.ttl,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def get_stats(self):
+        """
+        @return: {"hit_num", "miss_num", "hit_ratio", "size"}
+        @rtype: dict
+        """
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM llm_response").fetchone()[0]
+        request_num = self.hit_num + self.miss_num
+        return {"hit_num": self.hit_num, "miss_num": self.miss_num,
+                "hit_ratio": self.hit_num / request_num if request_num else 0.0,
+                "size": size}
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+from bug_improving.utils.llm_util import LLMUtil
+from config import LLM_MAX_IN_FLIGHT, LLM_TOKENS_PER_MINUTE, LLM_COMPLETION_TOKEN_NUM
+
+
+class LLMExecutor:
+    """
+    run chat requests concurrently:
+    1. at most max_in_flight requests are in flight
+    2. token bucket of tokens_per_minute (refilled continuously):
+       each request reserves (estimated prompt tokens + completion_token_num) before it is sent,
+       and the reservation is corrected by the usage of its response
+    3. answers are returned in the order of messages_list
+    4. retry is LLMUtil.request_turbo_async's (backoff.expo on RateLimitError), like LLMUtil.ask_turbo
+    5. answers in LLMUtil.LLM_CACHE are returned without requests (cache I/O runs in threads, off the event loop)
+    6. on_answer(index, answer) is called as soon as each answer completes (e.g., to journal it)
+    set OPENAI_API_BASE (e.g., http://127.0.0.1:8080/v1) to run against a local stub server
+    """
+
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 completion_token_num=LLM_COMPLETION_TOKEN_NUM):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.completion_token_num = completion_token_num
+        self.token_num = tokens_per_minute  # tokens left in the bucket
+        self.refill_time = time.monotonic()
+        self.semaphore = None
+        self.token_lock = None
+
+    @staticmethod
+    def estimate_token_num(messages):
+        """
+        ~4 characters per token, +4 tokens per message for role and separators
+        """
+        token_num = 0
+        for message in messages:
+            token_num = token_num + len(str(message['content'])) // 4 + 4
+        return token_num
+
+    def refill(self):
+        now = time.monotonic()
+        self.token_num = min(self.tokens_per_minute,
+                             self.token_num + (now - self.refill_time) * self.tokens_per_minute / 60)
+        self.refill_time = now
+
+    async def reserve(self, token_num):
+        """
+        wait until the bucket has token_num tokens, then take them
+        a request larger than the whole budget waits for a full bucket
+        """
+        token_num = min(token_num, self.tokens_per_minute)
+        async with self.token_lock:
+            self.refill()
+            while self.token_num < token_num:
+                await asyncio.sleep((token_num - self.token_num) * 60 / self.tokens_per_minute)
+                self.refill()
+            self.token_num = self.token_num - token_num
+
+    async def ask(self, messages, model=LLMUtil.TURBO_MODEL_NAME, temperature=1):
+        # cached answers take neither a slot nor tokens
+        answer = await asyncio.to_thread(LLMUtil.get_cached_answer, messages, model, temperature)
+        if answer is not None:
+            return answer
+        reserved_token_num = LLMExecutor.estimate_token_num(messages) + self.completion_token_num
+        async with self.semaphore:
+            await self.reserve(reserved_token_num)
+            answer, total_tokens = await LLMUtil.request_turbo_async(messages, model, temperature)
+        await asyncio.to_thread(LLMUtil.cache_answer, messages, model, temperature, answer, total_tokens)
+        if total_tokens is not None:
+            # give back (or take) the difference between the reservation and the usage
+            self.token_num = self.token_num + min(reserved_token_num, self.tokens_per_minute) - total_tokens
+        return answer
+
+    async def run_async(self, messages_list, model=LLMUtil.TURBO_MODEL_NAME, temperature=1, on_answer=None):
+        """
+        @param messages_list: [messages, messages, ...], None messages are skipped (answer None)
+        @type messages_list: list
+        @param model:
+        @type model: str
+        @param temperature:
+        @type temperature: float
+        @param on_answer: called with (index in messages_list, answer or Exception) as soon as each answer completes,
+                          not called for skipped messages
+        @type on_answer: function
+        @return: [answer or Exception, ...] in the order of messages_list
+        @rtype: list
+        """
+        # bound to the running event loop
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.token_lock = asyncio.Lock()
+        if LLMUtil.USE_LLM_CACHE:
+            # opened once here, not by the threads of ask
+            LLMUtil.get_llm_cache()
+
+        async def ask_or_skip(index, messages):
+            if messages is None:
+                return None
+            try:
+                answer = await self.ask(messages, model, temperature)
+            except Exception as e:
+                answer = e
+            if on_answer is not None:
+                on_answer(index, answer)
+            return answer
+
+        answers = await asyncio.gather(*[ask_or_skip(index, messages) for index, messages in enumerate(messages_list)],
+                                       return_exceptions=True)
+        for answer in answers:
+            if isinstance(answer, Exception):
+                logging.warning(f"LLM request failed: {answer}")
+        return answers
+
+    def run(self, messages_list, model=LLMUtil.TURBO_MODEL_NAME, temperature=1, on_answer=None):
+        """
+        blocking wrapper of run_async
+        """
+        return asyncio.run(self.run_async(messages_list, model, temperature, on_answer))
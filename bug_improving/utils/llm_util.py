@@ -5,6 +5,10 @@ import backoff
 import openai
 from dotenv import load_dotenv
 
+from bug_improving.utils.llm_cache import LLMCache
+from bug_improving.utils.path_util import PathUtil
+from config import LLM_CACHE_ENABLED, LLM_CACHE_TTL
+
 
 class LLMUtil:
     load_dotenv()
@@ -27,6 +31,9 @@ class LLMUtil:
     GPT3 = 'GPT-3'
     CHATGPT = 'chatGPT'
 
+    USE_LLM_CACHE = LLM_CACHE_ENABLED
+    LLM_CACHE = None  # LLMCache, answers of asked questions
+
     # @staticmethod
     # def ask_davinci(question, chat_log=None):
     #     """
@@ -101,7 +108,27 @@ class LLMUtil:
     #     return False
 
     @staticmethod
-    @backoff.on_exception(backoff.expo, openai.error.RateLimitError)
+    def get_llm_cache():
+        if LLMUtil.LLM_CACHE is None:
+            LLMUtil.LLM_CACHE = LLMCache(PathUtil.get_llm_cache_filepath(), LLM_CACHE_TTL)
+        return LLMUtil.LLM_CACHE
+
+    @staticmethod
+    def get_cached_answer(messages, model=TURBO_MODEL_NAME, temperature=1):
+        """
+        @return: cached answer of (model, temperature, messages), None if missing or LLMUtil.USE_LLM_CACHE is False
+        @rtype: str
+        """
+        if not LLMUtil.USE_LLM_CACHE:
+            return None
+        return LLMUtil.get_llm_cache().get(model, temperature, messages)
+
+    @staticmethod
+    def cache_answer(messages, model, temperature, answer, total_tokens=None):
+        if LLMUtil.USE_LLM_CACHE:
+            LLMUtil.get_llm_cache().put(model, temperature, messages, answer, total_tokens)
+
+    @staticmethod
     def ask_turbo(messages, model=TURBO_MODEL_NAME, temperature=1):
         """
         ask LLM question
@@ -114,8 +141,20 @@ class LLMUtil:
             model ():
             messages ():
 
-        Returns: answer
+        Returns: answer (from LLMUtil.LLM_CACHE if the same question was asked before)
+
+        """
+        answer = LLMUtil.get_cached_answer(messages, model, temperature)
+        if answer is None:
+            answer, total_tokens = LLMUtil.request_turbo(messages, model, temperature)
+            LLMUtil.cache_answer(messages, model, temperature, answer, total_tokens)
+        return answer
 
+    @staticmethod
+    @backoff.on_exception(backoff.expo, openai.error.RateLimitError)
+    def request_turbo(messages, model=TURBO_MODEL_NAME, temperature=1):
+        """
+        Returns: answer, total_tokens (usage of the request)
         """
         # time.sleep(25)
 
@@ -126,7 +165,24 @@ class LLMUtil:
             # max_tokens=10240,
         )
         answer = response['choices'][0]['message']['content'].strip()
-        return answer
+        total_tokens = response.get('usage', {}).get('total_tokens', None)
+        return answer, total_tokens
+
+    @staticmethod
+    @backoff.on_exception(backoff.expo, openai.error.RateLimitError)
+    async def request_turbo_async(messages, model=TURBO_MODEL_NAME, temperature=1):
+        """
+        async version of request_turbo (same retry on RateLimitError)
+        Returns: answer, total_tokens (usage of the request)
+        """
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        answer = response['choices'][0]['message']['content'].strip()
+        total_tokens = response.get('usage', {}).get('total_tokens', None)
+        return answer, total_tokens
 
     @staticmethod
     def get_messages_for_turbo(session_prompt, qa_pairs=None):
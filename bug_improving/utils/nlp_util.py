@@ -1,7 +1,9 @@
 import logging
+import multiprocessing
 import re
-import signal
 import string
+import sys
+from collections import OrderedDict
 from re import finditer
 import nltk
 import openai
@@ -12,6 +14,7 @@ from nltk.corpus import stopwords
 from sentence_transformers import util, SentenceTransformer
 from spacy.matcher import Matcher
 from spacy.util import filter_spans
+import regex
 from tqdm import tqdm
 
 from bug_improving.event_extraction.placeholder import Placeholder
@@ -19,8 +22,61 @@ from bug_improving.event_extraction.placeholder import Placeholder
 import spacy
 import benepar
 
-from bug_improving.utils.timeout_util import break_after
-from config import SPACY_BATCH_SIZE
+from bug_improving.utils.parse_cache import ParseCache
+from bug_improving.utils.path_util import PathUtil
+from bug_improving.utils.timeout_util import break_after, TimeoutUtil
+from config import SPACY_BATCH_SIZE, SPACY_N_PROCESS, SBERT_MODEL_NAME, BENEPAR_N_PROCESS, BENEPAR_CHUNK_SIZE, \
+    BENEPAR_RECURSION_LIMIT, PREPROCESS_CACHE_SIZE
+
+
+class SentTable:
+    """
+    per-batch sentence table: unique sents with their offsets, cconj flags and atomic sents, looked up by hash
+    passed explicitly (picklable), so step extraction of a batch does not depend on class-level globals
+    """
+
+    def __init__(self, sents, sent_has_cconj_list=None, sent_atomic_sents_dict=None):
+        """
+        @param sents: sents of the batch, duplicated sents are kept once (the first offset)
+        @type sents: list
+        @param sent_has_cconj_list: if sent has cconj, aligned with self.sents
+        @type sent_has_cconj_list: list
+        @param sent_atomic_sents_dict: dict{ key: sent, value: [atomic sent, ...] } of the sents with cconj
+        @type sent_atomic_sents_dict: dict
+        """
+        self.sent_offset_dict = dict()  # dict{ key: sent, value: offset in self.sents }
+        for sent in sents:
+            self.sent_offset_dict[sent] = self.sent_offset_dict.get(sent, len(self.sent_offset_dict))
+        self.sents = list(self.sent_offset_dict.keys())
+        self.sent_has_cconj_list = sent_has_cconj_list
+        self.sent_atomic_sents_dict = sent_atomic_sents_dict
+
+    def __len__(self):
+        return len(self.sents)
+
+    def __contains__(self, sent):
+        return sent in self.sent_offset_dict
+
+    def get_offset(self, sent):
+        """
+        @raise KeyError: sent is not in the table
+        """
+        return self.sent_offset_dict[sent]
+
+    def has_cconj(self, sent):
+        return self.sent_has_cconj_list[self.sent_offset_dict[sent]]
+
+    def get_sents_with_cconj(self):
+        return [sent for sent, has_cconj in zip(self.sents, self.sent_has_cconj_list) if has_cconj]
+
+    def get_atomic_sents(self, sent):
+        """
+        @return: a copy of the atomic sents of sent, None if not split yet
+        @rtype: list
+        """
+        if self.sent_atomic_sents_dict is None or sent not in self.sent_atomic_sents_dict:
+            return None
+        return list(self.sent_atomic_sents_dict[sent])
 
 
 class SentUtil:
@@ -34,15 +90,20 @@ class SentUtil:
     # else:
     #     NLP.add_pipe("benepar", config={"model": "benepar_en3"})
 
-    SENT_LIST = None  # [sent (string), sent, ..., sent]
-    SENT_HAS_CCONJ_LIST = None  # [True, False, ...,True]
     SENT_CONS_DOC_LIST = None  # [cons_doc, cons_doc, ..., cons_doc]
+    PARSE_CACHE = None  # ParseCache, parse strings and atomic sents of parsed sents
 
     import re
 
 
     @staticmethod
     def get_sent_has_cconj_list(sents):
+        """
+        @param sents:
+        @type sents: list
+        @return: [True, False, ..., True], if sent has cconj, aligned with sents
+        @rtype: list
+        """
         logging.warning("SpaCy NLP for pos ...")
         # SpacyModel.NLP.disable_pipes("benepar", "merge_noun_chunks")
         # logging.warning(NLPUtil.SPACY_NLP.pipe_names)
@@ -50,19 +111,43 @@ class SentUtil:
         pos_docs = NLPUtil.SPACY_NLP.pipe(sents, batch_size=SPACY_BATCH_SIZE, disable=["benepar", "merge_noun_chunks"])
         # list if step has cconj: True else: False
         logging.warning("get sents if has cconj list...")
-        SentUtil.SENT_HAS_CCONJ_LIST = []
+        sent_has_cconj_list = []
         # step_has_cconj_count = 0
         for doc in tqdm(pos_docs, ascii=True):
             doc_len = len(doc)
             if doc_len == 0:
-                SentUtil.SENT_HAS_CCONJ_LIST.append(False)
+                sent_has_cconj_list.append(False)
             for token_index, token in enumerate(doc):
                 if token.pos_ == "CCONJ":
-                    SentUtil.SENT_HAS_CCONJ_LIST.append(True)
+                    sent_has_cconj_list.append(True)
                     # step_has_cconj_count = step_has_cconj_count + 1
                     break
                 if token_index == doc_len - 1:
-                    SentUtil.SENT_HAS_CCONJ_LIST.append(False)
+                    sent_has_cconj_list.append(False)
+        return sent_has_cconj_list
+
+    @staticmethod
+    def get_sent_table(sents, n_process=BENEPAR_N_PROCESS):
+        """
+        SentTable of sents (a batch, e.g., all steps of bugs):
+        1. if sent has cconj (spaCy pos), duplicated sents are tagged once
+        2. atomic sents of the sents with cconj (SentUtil.split_atomic_sents_by_benepar_batch),
+           enables "benepar" and "merge_noun_chunks" of NLPUtil.SPACY_NLP
+        @param sents:
+        @type sents: list
+        @param n_process: benepar worker processes
+        @type n_process: int
+        @return: sent_table
+        @rtype: SentTable
+        """
+        sent_table = SentTable(sents)
+        sent_table.sent_has_cconj_list = SentUtil.get_sent_has_cconj_list(sent_table.sents)
+        NLPUtil.SPACY_NLP.enable_pipe("benepar")
+        NLPUtil.SPACY_NLP.enable_pipe("merge_noun_chunks")
+        logging.warning(NLPUtil.SPACY_NLP.pipe_names)
+        sent_table.sent_atomic_sents_dict = SentUtil.split_atomic_sents_by_benepar_batch(
+            sent_table.get_sents_with_cconj(), n_process)
+        return sent_table
 
     @staticmethod
     def get_sent_cons_doc_list(sents):
@@ -238,6 +323,94 @@ class SentUtil:
 
         return atomic_sents
 
+    @staticmethod
+    def get_parse_cache():
+        if SentUtil.PARSE_CACHE is None:
+            SentUtil.PARSE_CACHE = ParseCache(PathUtil.get_parse_cache_filepath())
+        return SentUtil.PARSE_CACHE
+
+    @staticmethod
+    def init_benepar_worker():
+        """
+        initializer of the SentUtil.split_atomic_sents_by_benepar_batch workers: load the model once per process
+        spawned workers do not inherit the recursion limit set in __main__ of the scripts, set it again
+        """
+        sys.setrecursionlimit(BENEPAR_RECURSION_LIMIT)
+        NLPUtil.load_spacy_model()
+        NLPUtil.SPACY_NLP.enable_pipe("benepar")
+        NLPUtil.SPACY_NLP.enable_pipe("merge_noun_chunks")
+
+    @staticmethod
+    def parse_and_split_atomic_sents(sent):
+        """
+        SentUtil.split_atomic_sents_by_benepar, keeping the parse string of the first sentence of sent
+        SpacyModel.NLP need to enable "benepar" and "merge_noun_chunks"
+        @param sent:
+        @type sent: str
+        @return: sent, parse string (None if no sentence), atomic sents (None if maximum recursion depth exceeded)
+        @rtype: tuple
+        """
+        sents_list = list(NLPUtil.SPACY_NLP(sent).sents)
+        parse = sents_list[0]._.parse_string if sents_list else None
+        try:
+            atomic_sents = SentUtil.split_atomic_sents_by_benepar(sent, sents_list)
+        except RuntimeError:
+            logging.warning(f'{sent}: maximum recursion depth exceeded')
+            atomic_sents = None
+        return sent, parse, atomic_sents
+
+    @staticmethod
+    def split_atomic_sents_by_benepar_batch(sents, n_process=BENEPAR_N_PROCESS, chunk_size=BENEPAR_CHUNK_SIZE):
+        """
+        SentUtil.split_atomic_sents_by_benepar for sents:
+        1. duplicated sents are parsed once
+        2. sents in SentUtil.PARSE_CACHE are not parsed again
+        3. the others are sharded across n_process worker processes (spawned, each loads the model once),
+           results are put into SentUtil.PARSE_CACHE as they come, so an interrupted run keeps them
+        4. sents exceeding the maximum recursion depth are split into [sent], not cached (parsed again next time)
+        n_process <= 1: parse in this process (NLPUtil.SPACY_NLP with "benepar" and "merge_noun_chunks" enabled)
+        @param sents:
+        @type sents: list
+        @param n_process:
+        @type n_process: int
+        @param chunk_size: sents per task of a worker
+        @type chunk_size: int
+        @return: dict{ key: sent, value: [atomic sent, ...] }
+        @rtype: dict
+        """
+        sents = list(dict.fromkeys(sents))
+        parse_cache = SentUtil.get_parse_cache()
+        sent_atomic_sents_dict = parse_cache.get_many(sents)
+        miss_sents = [sent for sent in sents if sent not in sent_atomic_sents_dict]
+        logging.warning(f"Parse {len(miss_sents)} / {len(sents)} sents by benepar (parse cache misses)...")
+        if not miss_sents:
+            return sent_atomic_sents_dict
+
+        if n_process > 1 and len(miss_sents) > chunk_size:
+            context = multiprocessing.get_context("spawn")
+            pool = context.Pool(min(n_process, -(-len(miss_sents) // chunk_size)),
+                                initializer=SentUtil.init_benepar_worker)
+            items = pool.imap(SentUtil.parse_and_split_atomic_sents, miss_sents, chunksize=chunk_size)
+        else:
+            pool = None
+            items = map(SentUtil.parse_and_split_atomic_sents, miss_sents)
+        try:
+            parsed_items = []
+            for sent, parse, atomic_sents in tqdm(items, total=len(miss_sents), ascii=True):
+                if atomic_sents is None:
+                    sent_atomic_sents_dict[sent] = [sent]
+                    continue
+                parsed_items.append((sent, parse, atomic_sents))
+                sent_atomic_sents_dict[sent] = atomic_sents
+                if len(parsed_items) >= chunk_size * max(n_process, 1):
+                    parse_cache.put_many(parsed_items)
+                    parsed_items = []
+            parse_cache.put_many(parsed_items)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return sent_atomic_sents_dict
+
     @staticmethod
     def find_cc_by_benepar(sent):
         """
@@ -265,17 +438,14 @@ class SentUtil:
         return None, None
 
 
-def time_out(b, c):
-    raise TimeoutError
-
-
 class NLPUtil:
     # use spacy instead https://explosion.ai/demos/displacy
     # spacy glossary https://github.com/explosion/spaCy/blob/master/spacy/glossary.py
+    # compiled by regex (not re), so TimeoutUtil can match them with a timeout in any thread
     PATTERN_URL = [
-        re.compile(
+        regex.compile(
             r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))",
-            flags=re.MULTILINE),
+            flags=regex.MULTILINE),
     ]
 
     PATTERNS_CLEAN = [
@@ -284,11 +454,14 @@ class NLPUtil:
     ]
 
     PATTEN_SERIAL_NUMBER = [
-        re.compile(r"^[\d]*[a-zA-Z]?[^a-zA-Z][\s]*")  # 1. / - / 1) / a)
+        regex.compile(r"^[\d]*[a-zA-Z]?[^a-zA-Z][\s]*")  # 1. / - / 1) / a)
     ]
 
     SPACY_NLP = None
     SBERT_MODEL = None
+    STOPWORD_SET = None  # set(stopwords.words('english')), loaded once by NLPUtil.get_stopword_set
+    # LRU memo of NLPUtil.preprocess, key: (paragraph, enabled pipe names of SPACY_NLP), value: tuple of words
+    PREPROCESS_CACHE = OrderedDict()
     # # SBert model, to do sentence embedding
     # # SENTENCE_TRANSFORMER = SentenceTransformer('all-MiniLM-L6-v2')
     # SENTENCE_TRANSFORMER = SentenceTransformer('paraphrase-MiniLM-L6-v2')
@@ -310,25 +483,19 @@ class NLPUtil:
     def load_sbert_model():
         # # SBert model, to do sentence embedding
         # # SENTENCE_TRANSFORMER = SentenceTransformer('all-MiniLM-L6-v2')
-        SENTENCE_TRANSFORMER = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+        SENTENCE_TRANSFORMER = SentenceTransformer(SBERT_MODEL_NAME)
         NLPUtil.SBERT_MODEL = SENTENCE_TRANSFORMER
 
     @staticmethod
     def replace_url_by_placeholder(text):
         """
         for regex into dead cycle, https://www.jianshu.com/p/e040b86e43d9
+        a pattern timeout (REGEX_TIMEOUT) leaves text unchanged by it, thread-safe (no SIGALRM)
         :param text:
         :return:
         """
         for pattern in NLPUtil.PATTERN_URL:
-            signal.signal(signal.SIGALRM, time_out)
-            # 开启信号处理
-            signal.alarm(1)
-            try:
-                text = pattern.sub(Placeholder.URL, text)
-                signal.alarm(0)  # 关闭信号处理  # 这个一定要有，不会后续会报错timeoutError
-            except TimeoutError:
-                pass
+            text = TimeoutUtil.sub(pattern, Placeholder.URL, text)
 
         return text
 
@@ -342,14 +509,7 @@ class NLPUtil:
                                                         -> created a WebExtensions with two locales (fr and en).
         """
         for pattern in NLPUtil.PATTEN_SERIAL_NUMBER:
-            signal.signal(signal.SIGALRM, time_out)
-            # 开启信号处理
-            signal.alarm(1)
-            try:
-                text = pattern.sub('', text)
-                signal.alarm(0)  # 关闭信号处理  # 这个一定要有，不会后续会报错timeoutError
-            except TimeoutError:
-                pass
+            text = TimeoutUtil.sub(pattern, '', text)
 
         return text
 
@@ -545,13 +705,16 @@ class NLPUtil:
         return ' '.join(NLPUtil.find_longest_common_substring(s1_words, s2_words))
 
     @staticmethod
-    def get_pairs_with_cossim_by_decreasing(embeddings1, embeddings2):
+    def get_pairs_with_cossim_by_decreasing(embeddings1, embeddings2, top_k=None):
         """
         pair -> {'index': [i, j], 'score': cosine_scores[i][j]}
+        for repeated queries over the same embeddings2, use VectorIndex (bug_improving.utils.vector_index) instead
         @param embeddings1:
         @type embeddings1:
         @param embeddings2:
         @type embeddings2:
+        @param top_k: only keep top_k pairs for each embedding1, None means all pairs
+        @type top_k: int
         @return:
         @rtype:
         """
@@ -560,17 +723,17 @@ class NLPUtil:
         # embeddings2 = NLPUtil.SENTENCE_TRANSFORMER.encode(sentences2, convert_to_tensor=True)
         # Compute cosine-similarits
         cosine_scores = util.cos_sim(embeddings1, embeddings2)
-        # Find the pairs with the highest cosine similarity scores
+        if top_k is None or top_k > cosine_scores.shape[1]:
+            top_k = cosine_scores.shape[1]
+        # Find the pairs with the highest cosine similarity scores (sorted in decreasing order)
+        top_k_scores, top_k_indices = torch.topk(cosine_scores, k=top_k, dim=1, largest=True, sorted=True)
+        top_k_indices = top_k_indices.tolist()
         pairs_list = []
-        for i in range(len(embeddings1)):
+        for i in range(len(top_k_indices)):
             pairs = []
-            for j in range(len(embeddings2)):
-                pairs.append({'index': [i, j], 'score': cosine_scores[i][j]})
-                # print("{} \t\t {} \t\t Score: {:.4f}".format(sentences1[i], sentences2[j], cosine_scores[i][j]))
-            # Sort scores in decreasing order
-            pairs = sorted(pairs, key=lambda x: x['score'], reverse=True)
+            for k, j in enumerate(top_k_indices[i]):
+                pairs.append({'index': [i, j], 'score': top_k_scores[i][k]})
             pairs_list.append(pairs)
-            # print(pairs)
 
         return pairs_list
 
@@ -637,6 +800,23 @@ class NLPUtil:
             paragraph_sents.append(sents)
         return paragraph_sents
 
+    @staticmethod
+    def get_docs_by_spacy_batch(texts, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS):
+        """
+        NLPUtil.SPACY_NLP.pipe with the pipes enabled now, docs in the order of texts
+        @param texts:
+        @type texts: list
+        @param batch_size:
+        @type batch_size: int
+        @param n_process:
+        @type n_process: int
+        @return: [doc, doc, ...]
+        @rtype: list
+        """
+        if not texts:
+            return []
+        return list(NLPUtil.SPACY_NLP.pipe(texts, batch_size=batch_size, n_process=n_process))
+
     @staticmethod
     def sentence_tokenize_by_spacy(paragraph):
         """
@@ -685,6 +865,12 @@ class NLPUtil:
         # for word in word_tokenize(sentence):
         #     yield wnl.lemmatize(word)
 
+    @staticmethod
+    def get_stopword_set():
+        if NLPUtil.STOPWORD_SET is None:
+            NLPUtil.STOPWORD_SET = set(stopwords.words('english'))
+        return NLPUtil.STOPWORD_SET
+
     @staticmethod
     def remove_stopwords(words):
         """
@@ -692,7 +878,8 @@ class NLPUtil:
         :param words:
         :return:
         """
-        filtered_words = [word for word in words if word not in stopwords.words('english')]
+        stopword_set = NLPUtil.get_stopword_set()
+        filtered_words = [word for word in words if word not in stopword_set]
         return filtered_words
 
     @staticmethod
@@ -765,44 +952,67 @@ class NLPUtil:
         5. 分词 词性标注 词形还原
         # 6. remove stopword
         # 7. remove number
+        memoized (NLPUtil.PREPROCESS_CACHE), see NLPUtil.preprocess_batch
         :param paragraph:
         :return:
         """
+        return NLPUtil.preprocess_batch([paragraph])[0]
+
+    @staticmethod
+    def normalize_paragraph(paragraph):
+        """
+        preprocess step 1 and 2: remove line breaks, camel case split, lower case
+        """
         # 去掉回车，换成空格
         paragraph = paragraph.replace('\n', ' ')
-        # print(paragraph)
         # 驼峰
         paragraph = NLPUtil.camel_case_split(paragraph)
-        # print(paragraph)
-
         # 变成小写表示
-        paragraph = paragraph.lower()
-        # print(paragraph)
-
-        # 分句
-        # sentences = NLPUtil.sentence_tokenize_by_nltk(paragraph)
-        sentences = NLPUtil.sentence_tokenize_by_spacy(paragraph)
+        return paragraph.lower()
 
-        # print(sentences)
-
-        filtered_words_list = []
-        for sentence in sentences:
-            # print(sentence)
-            # 去标点符号
-            sentence_p = NLPUtil.remove_punctuation(sentence)
-            # print(sentence_p)
+    @staticmethod
+    def preprocess_batch(paragraphs, batch_size=SPACY_BATCH_SIZE):
+        """
+        NLPUtil.preprocess of many paragraphs: the same words, but
+        1. paragraphs in NLPUtil.PREPROCESS_CACHE (LRU, PREPROCESS_CACHE_SIZE) are not processed again,
+           the key includes the enabled pipes of SPACY_NLP, as they change the tokens (e.g., merge_noun_chunks)
+        2. the others (once per unique paragraph) are split into sentences and lemmatized by SPACY_NLP.pipe
+        @param paragraphs:
+        @type paragraphs: list
+        @param batch_size:
+        @type batch_size: int
+        @return: [[word, ...], ...] in the order of paragraphs
+        @rtype: list
+        """
+        pipe_names = tuple(NLPUtil.SPACY_NLP.pipe_names)
+        paragraph_words_dict = dict()
+        for paragraph in paragraphs:
+            key = (paragraph, pipe_names)
+            if key in NLPUtil.PREPROCESS_CACHE:
+                NLPUtil.PREPROCESS_CACHE.move_to_end(key)
+                paragraph_words_dict[paragraph] = NLPUtil.PREPROCESS_CACHE[key]
+        missed_paragraphs = list(dict.fromkeys(paragraph for paragraph in paragraphs
+                                               if paragraph not in paragraph_words_dict))
+        if missed_paragraphs:
+            # 分句 + 去标点符号
+            paragraph_sentences_list = []
+            for doc in NLPUtil.SPACY_NLP.pipe([NLPUtil.normalize_paragraph(paragraph)
+                                               for paragraph in missed_paragraphs], batch_size=batch_size):
+                paragraph_sentences_list.append([NLPUtil.remove_punctuation(sent.text.strip())
+                                                 for sent in doc.sents])
             # 分词 词性标注 词形还原
-            filtered_words_list.extend(NLPUtil.lemmatize_by_spacy(sentence_p))
-
-            # words = NLPUtil.lemmatize_by_nltk(sentence_p)
-            # # 去除停词
-            # # words = NLPUtil.remove_stopwords(words)
-            # # 去数字
-            # # words = NLPUtil.remove_number(words)
-            # for fword in words:
-            #     # print(fword)
-            #     filtered_words_list.append(fword)
-        return filtered_words_list
+            sentence_docs = NLPUtil.SPACY_NLP.pipe([sentence for sentences in paragraph_sentences_list
+                                                    for sentence in sentences], batch_size=batch_size)
+            for paragraph, sentences in zip(missed_paragraphs, paragraph_sentences_list):
+                words = []
+                for _ in sentences:
+                    words.extend(str(word.lemma_) for word in next(sentence_docs))
+                words = tuple(words)
+                paragraph_words_dict[paragraph] = words
+                NLPUtil.PREPROCESS_CACHE[(paragraph, pipe_names)] = words
+                if len(NLPUtil.PREPROCESS_CACHE) > PREPROCESS_CACHE_SIZE:
+                    NLPUtil.PREPROCESS_CACHE.popitem(last=False)
+        return [list(paragraph_words_dict[paragraph]) for paragraph in paragraphs]
 
     @staticmethod
     def get_embedding_by_openai(corpus, model="text-embedding-ada-002"):
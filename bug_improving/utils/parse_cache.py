@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class ParseCache:
+    """
+    disk-backed cache of benepar constituency parsing (SQLite in WAL mode)
+    key: sha256 of the sentence
+    value: parse string of its first sentence (sent._.parse_string) and its atomic sentences
+           (SentUtil.split_atomic_sents_by_benepar), so a cached sentence is never parsed again
+    """
+    QUERY_BATCH_SIZE = 500  # keys per SELECT ... IN (...)
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.hit_num = 0
+        self.miss_num = 0
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self.connection = sqlite3.connect(str(filepath), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sentence_parse ("
+                                "key TEXT PRIMARY KEY, parse TEXT, atomic_sents TEXT, created_time REAL)")
+        self.connection.commit()
+
+    @staticmethod
+    def get_key(sent):
+        return hashlib.sha256(sent.encode("utf-8")).hexdigest()
+
+    def get_many(self, sents):
+        """
+        @param sents:
+        @type sents: list
+        @return: dict{ key: sent, value: atomic sents } of the cached sents
+        @rtype: dict
+        """
+        key_sent_dict = {ParseCache.get_key(sent): sent for sent in sents}
+        keys = list(key_sent_dict.keys())
+        sent_atomic_sents_dict = dict()
+        for start in range(0, len(keys), ParseCache.QUERY_BATCH_SIZE):
+            batch_keys = keys[start:start + ParseCache.QUERY_BATCH_SIZE]
+            rows = self.connection.execute(f"SELECT key, atomic_sents FROM sentence_parse WHERE key IN "
+                                           f"({', '.join('?' * len(batch_keys))})", batch_keys).fetchall()
+            for key, atomic_sents in rows:
+                sent_atomic_sents_dict[key_sent_dict[key]] = json.loads(atomic_sents)
+        self.hit_num = self.hit_num + len(sent_atomic_sents_dict)
+        self.miss_num = self.miss_num + len(key_sent_dict) - len(sent_atomic_sents_dict)
+        return sent_atomic_sents_dict
+
+    def get_parse(self, sent):
+        """
+        @return: cached parse string of sent, None if missing (or sent has no sentence)
+        @rtype: str
+        """
+        row = self.connection.execute("SELECT parse FROM sentence_parse WHERE key = ?",
+                                      (ParseCache.get_key(sent),)).fetchone()
+        return None if row is None else row[0]
+
+    def put_many(self, items):
+        """
+        @param items: [(sent, parse string, atomic sents), ...]
+        @type items: list
+        """
+        created_time = time.time()
+        self.connection.executemany("INSERT OR REPLACE INTO sentence_parse VALUES (?, ?, ?, ?)",
+                                    [(ParseCache.get_key(sent), parse, json.dumps(atomic_sents), created_time)
+                                     for sent, parse, atomic_sents in items])
+        self.connection.commit()
+
+    def get_stats(self):
+        """
+        @return: {"hit_num", "miss_num", "hit_ratio", "size"}
+        @rtype: dict
+        """
+        request_num = self.hit_num + self.miss_num
+        return {"hit_num": self.hit_num, "miss_num": self.miss_num,
+                "hit_ratio": self.hit_num / request_num if request_num else 0.0,
+                "size": self.connection.execute("SELECT COUNT(*) FROM sentence_parse").fetchone()[0]}
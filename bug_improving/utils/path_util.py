@@ -74,4 +74,42 @@ class PathUtil:
     def get_scenarios_filepath(filename="scenarios"):
         return Path(DATA_DIR, f"{filename}.json")
 
+    @staticmethod
+    def get_step_vector_index_filepath(filename="step_vector_index"):
+        return Path(DATA_DIR, f"{filename}.pkl")
+
+    @staticmethod
+    def get_llm_cache_filepath(filename="llm_cache"):
+        return Path(DATA_DIR, f"{filename}.sqlite")
+
+    @staticmethod
+    def get_section_journal_filepath(filename="bug_id_ans_pairs"):
+        return Path(DATA_DIR, "section", f"{filename}.jsonl")
+
+    @staticmethod
+    def get_step_journal_filepath(filename="bug_id_ans_pairs"):
+        return Path(DATA_DIR, "step", f"{filename}.jsonl")
+
+    @staticmethod
+    def get_scenario_journal_filepath(seed_bug_id, kind, foldername="scenarios"):
+        return Path(DATA_DIR, foldername, f"{seed_bug_id}_{kind}.jsonl")
 
+    @staticmethod
+    def get_bug_graph_store_dirpath(dirname="bug_graph"):
+        return Path(DATA_DIR, dirname)
+
+    @staticmethod
+    def get_bug_pairs_filepath(filename="bug_pairs"):
+        return Path(DATA_DIR, f"{filename}.csv")
+
+    @staticmethod
+    def get_step_cluster_index_filepath(filename="step_cluster_index"):
+        return Path(DATA_DIR, f"{filename}.pkl")
+
+    @staticmethod
+    def get_parse_cache_filepath(filename="parse_cache"):
+        return Path(DATA_DIR, f"{filename}.sqlite")
+
+    @staticmethod
+    def get_http_cache_filepath(filename="http_cache"):
+        return Path(DATA_DIR, f"{filename}.sqlite")
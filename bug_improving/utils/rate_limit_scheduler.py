@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from config import GITHUB_REST_POINTS_PER_MINUTE, GITHUB_GRAPHQL_POINTS_PER_MINUTE, RATE_LIMIT_RESET_MARGIN
+
+
+class RateLimitBucket:
+    """
+    quota of one auth token on one GitHub rate limit resource ("core": REST API, "graphql": GraphQL API)
+    1. primary rate limit (token bucket refilled at X-RateLimit-Reset):
+       remaining and reset time of the latest X-RateLimit-* headers of the current window,
+       requests in flight are taken from remaining before they are sent
+    2. secondary rate limit: at most points requests sent in any points_window seconds,
+       and no request before retry_after_time (Retry-After of a secondary rate limit response)
+    """
+    POLL_TIME = 0.05  # seconds, waiting for the first response of a bucket (quota unknown)
+
+    def __init__(self, points, points_window):
+        self.points = points
+        self.points_window = points_window
+        self.limit = None  # X-RateLimit-Limit, None until the first response
+        self.remaining = None  # X-RateLimit-Remaining of the current window, None until the first response
+        self.reset_time = 0  # X-RateLimit-Reset (epoch seconds) of the current window
+        self.retry_after_time = 0  # epoch seconds
+        self.in_flight = 0
+        self.sent_times = deque()  # epoch seconds of the requests sent in the last points_window
+
+    def roll_window(self, now, reset_margin):
+        """
+        the window is over: the quota is full again until the next response tells otherwise
+        """
+        if self.remaining is not None and now >= self.reset_time + reset_margin:
+            self.remaining = self.limit
+
+    def get_wait_time(self, now, reset_margin):
+        """
+        @return: seconds to wait before a request can be sent, 0 means now
+        @rtype: float
+        """
+        self.roll_window(now, reset_margin)
+        while self.sent_times and self.sent_times[0] <= now - self.points_window - reset_margin:
+            self.sent_times.popleft()
+        wait_time = max(self.retry_after_time - now, 0)
+        if len(self.sent_times) >= self.points:
+            wait_time = max(wait_time, self.sent_times[0] + self.points_window + reset_margin - now)
+        if self.remaining is None:
+            if self.in_flight:
+                wait_time = max(wait_time, RateLimitBucket.POLL_TIME)
+        elif self.remaining - self.in_flight <= 0:
+            if now < self.reset_time + reset_margin:
+                wait_time = max(wait_time, self.reset_time + reset_margin - now)
+            else:
+                # the quota of the new window is told by the responses in flight
+                wait_time = max(wait_time, RateLimitBucket.POLL_TIME)
+        return wait_time
+
+    def take(self, now):
+        self.in_flight = self.in_flight + 1
+        self.sent_times.append(now)
+
+    def update(self, now, status, headers, message=""):
+        """
+        @param status: HTTP status of the response
+        @type status: int
+        @param headers: response headers
+        @type headers: dict-like
+        @param message: response text of a 403 / 429 response
+        @type message: str
+        @return: True if the request was rejected by a rate limit (to be sent again)
+        @rtype: bool
+        """
+        self.in_flight = self.in_flight - 1
+        remaining = headers.get("X-RateLimit-Remaining", None)
+        if remaining is not None:
+            remaining = int(remaining)
+            reset_time = int(headers.get("X-RateLimit-Reset", 0))
+            self.limit = int(headers.get("X-RateLimit-Limit", remaining))
+            if reset_time > self.reset_time or self.remaining is None:
+                # the first response of a new window
+                self.remaining = remaining
+                self.reset_time = reset_time
+            elif reset_time == self.reset_time:
+                # responses may come out of order, the smallest remaining is the latest
+                self.remaining = min(self.remaining, remaining)
+        if status not in (403, 429):
+            return False
+        retry_after = headers.get("Retry-After", None)
+        if retry_after is not None:
+            self.retry_after_time = max(self.retry_after_time, now + int(retry_after))
+            return True
+        if remaining == 0:
+            return True
+        # secondary rate limit without Retry-After: wait at least one minute
+        if status == 429 or "rate limit" in message.lower():
+            self.retry_after_time = max(self.retry_after_time, now + 60)
+            return True
+        return False
+
+
+class RateLimitScheduler:
+    """
+    schedule GitHub API requests over several auth tokens, each with its own REST and GraphQL quota (RateLimitBucket)
+    1. acquire(resource): wait for the token which can send a request first, take one request from its quota
+    2. update(token, resource, status, headers): correct the quota by the X-RateLimit-* / Retry-After headers
+    so the whole hourly budget of every token is used, and the requests over it wait for the reset instead of 403
+    usage: CrawelExecutor(scheduler=RateLimitScheduler(tokens))
+    """
+    RESOURCE_CORE = "core"
+    RESOURCE_GRAPHQL = "graphql"
+
+    def __init__(self, tokens, rest_points=GITHUB_REST_POINTS_PER_MINUTE,
+                 graphql_points=GITHUB_GRAPHQL_POINTS_PER_MINUTE, points_window=60,
+                 reset_margin=RATE_LIMIT_RESET_MARGIN):
+        """
+        @param tokens: auth tokens, [None] means unauthenticated requests
+        @type tokens: list
+        @param rest_points: secondary rate limit of REST API requests per points_window (per token)
+        @type rest_points: int
+        @param graphql_points: secondary rate limit of GraphQL API requests per points_window (per token)
+        @type graphql_points: int
+        @param points_window: seconds
+        @type points_window: float
+        @param reset_margin: seconds waited after a reset time, for clock skew
+        @type reset_margin: float
+        """
+        self.tokens = list(tokens) if tokens else [None]
+        self.reset_margin = reset_margin
+        self.token_resource_bucket_dict = dict()
+        for token in self.tokens:
+            self.token_resource_bucket_dict[(token, RateLimitScheduler.RESOURCE_CORE)] = RateLimitBucket(
+                rest_points, points_window)
+            self.token_resource_bucket_dict[(token, RateLimitScheduler.RESOURCE_GRAPHQL)] = RateLimitBucket(
+                graphql_points, points_window)
+        self.rate_limited_num = 0  # responses rejected by a rate limit
+
+    def get_bucket(self, token, resource):
+        return self.token_resource_bucket_dict[(token, resource)]
+
+    async def acquire(self, resource):
+        """
+        @param resource: RateLimitScheduler.RESOURCE_CORE or RateLimitScheduler.RESOURCE_GRAPHQL
+        @type resource: str
+        @return: token to send the request with (call update with its response)
+        @rtype: str
+        """
+        while True:
+            now = time.time()
+            wait_time, index = min((self.get_bucket(token, resource).get_wait_time(now, self.reset_margin), index)
+                                   for index, token in enumerate(self.tokens))
+            token = self.tokens[index]
+            if wait_time <= 0:
+                self.get_bucket(token, resource).take(now)
+                return token
+            await asyncio.sleep(wait_time)
+
+    def update(self, token, resource, status, headers, message=""):
+        """
+        @return: True if the request was rejected by a rate limit (to be sent again)
+        @rtype: bool
+        """
+        rate_limited = self.get_bucket(token, resource).update(time.time(), status, headers, message)
+        if rate_limited:
+            self.rate_limited_num = self.rate_limited_num + 1
+            logging.warning(f"Rate limited: {status}, {resource}, "
+                            f"X-RateLimit-Remaining: {headers.get('X-RateLimit-Remaining', None)}, "
+                            f"Retry-After: {headers.get('Retry-After', None)}")
+        return rate_limited
+
+    def release(self, token, resource):
+        """
+        the request got no response (e.g., connection error)
+        """
+        self.get_bucket(token, resource).in_flight = self.get_bucket(token, resource).in_flight - 1
+
+    @staticmethod
+    def get_headers(token, headers=None):
+        headers = dict(headers) if headers else dict()
+        if token:
+            headers["Authorization"] = f"token {token}"
+        return headers
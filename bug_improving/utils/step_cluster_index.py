@@ -0,0 +1,87 @@
+import numpy as np
+
+from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.vector_index import VectorIndex, ExactVectorIndex
+
+
+class StepClusterIndex:
+    """
+    centroids of the step clusters (mean of the L2 normalized step embeddings of each cluster_index),
+    kept as sums and counts, so new steps are added in O(new steps)
+    search: nearest centroid of each new step (by cosine similarity) through an ExactVectorIndex over the centroids
+    (exact, so a step is never sent to a new cluster because the centroid of its cluster was not probed,
+    and the centroids are few enough to score all of them)
+    """
+
+    def __init__(self):
+        self.sums = None  # np.ndarray (cluster_num, dimension), float32, sum of normalized step embeddings
+        self.counts = None  # np.ndarray (cluster_num), int64, number of steps
+        self.vector_index = None  # ExactVectorIndex over the centroids, None after add
+
+    def __len__(self):
+        return 0 if self.counts is None else len(self.counts)
+
+    def get_step_num(self):
+        return 0 if self.counts is None else int(self.counts.sum())
+
+    def add(self, cluster_indexes, embeddings):
+        """
+        @param cluster_indexes: cluster_index of each step
+        @type cluster_indexes: list or np.ndarray
+        @param embeddings: (step_num, dimension)
+        @type embeddings: np.ndarray or torch.Tensor
+        @return: self
+        @rtype: StepClusterIndex
+        """
+        cluster_indexes = np.asarray(cluster_indexes, dtype=np.int64)
+        embeddings = VectorIndex.normalize(embeddings)
+        if not len(cluster_indexes):
+            return self
+        cluster_num = max(len(self), int(cluster_indexes.max()) + 1)
+        if self.sums is None:
+            self.sums = np.zeros((cluster_num, embeddings.shape[1]), dtype=np.float32)
+            self.counts = np.zeros(cluster_num, dtype=np.int64)
+        elif cluster_num > len(self):
+            self.sums = np.concatenate([self.sums, np.zeros((cluster_num - len(self), self.sums.shape[1]),
+                                                            dtype=np.float32)])
+            self.counts = np.concatenate([self.counts, np.zeros(cluster_num - len(self), dtype=np.int64)])
+        np.add.at(self.sums, cluster_indexes, embeddings)
+        self.counts += np.bincount(cluster_indexes, minlength=cluster_num)
+        self.vector_index = None
+        return self
+
+    def get_centroids(self):
+        """
+        @return: normalized centroids, zero rows for cluster indexes without steps
+        @rtype: np.ndarray
+        """
+        return VectorIndex.normalize(self.sums)
+
+    def search(self, embeddings, threshold):
+        """
+        @param embeddings: (step_num, dimension)
+        @type embeddings: np.ndarray or torch.Tensor
+        @param threshold: minimum cosine similarity to the centroid
+        @type threshold: float
+        @return: nearest cluster_index of each step (-1 if no centroid >= threshold), cosine similarity
+        @rtype: np.ndarray, np.ndarray
+        """
+        embeddings = VectorIndex.to_numpy(embeddings)
+        cluster_indexes = np.full(len(embeddings), -1, dtype=np.int64)
+        scores = np.zeros(len(embeddings), dtype=np.float32)
+        if not len(self) or not len(embeddings):
+            return cluster_indexes, scores
+        if not isinstance(self.vector_index, ExactVectorIndex):
+            # None after add, or an approximate index pickled by an earlier version
+            self.vector_index = ExactVectorIndex().build(self.get_centroids())
+        for row, results in enumerate(self.vector_index.search(embeddings, top_k=1, threshold=threshold)):
+            if results:
+                cluster_indexes[row], scores[row] = results[0]
+        return cluster_indexes, scores
+
+    def save(self, filepath):
+        FileUtil.dump_pickle(filepath, self)
+
+    @staticmethod
+    def load(filepath):
+        return FileUtil.load_pickle(filepath)
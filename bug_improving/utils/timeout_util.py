@@ -1,6 +1,9 @@
 import logging
 import time
 import signal
+import threading
+
+from config import REGEX_TIMEOUT
 
 
 class TimeoutException(Exception):  # Custom exception class
@@ -8,11 +11,27 @@ class TimeoutException(Exception):  # Custom exception class
 
 
 def break_after(seconds=2):
+    """
+    return None if function does not finish in seconds
+    main thread: interrupted by SIGALRM
+    other threads (SIGALRM only works on the main thread): function runs in a daemon thread and the caller stops
+    waiting after seconds, the daemon thread is not killed, so use TimeoutUtil for regex (interrupted by regex)
+    """
     def timeout_handler(signum, frame):  # Custom signal handler
         raise TimeoutException
 
     def function(function):
         def wrapper(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                results = []
+                thread = threading.Thread(target=lambda: results.append(function(*args, **kwargs)), daemon=True)
+                thread.start()
+                thread.join(seconds)
+                if results:
+                    return results[0]
+                if thread.is_alive():
+                    print(u'Oops, timeout: %s sec reached.' % seconds, function.__name__, args, kwargs)
+                return
             signal.signal(signal.SIGALRM, timeout_handler)
             signal.alarm(seconds)
             try:
@@ -26,3 +45,49 @@ def break_after(seconds=2):
         return wrapper
 
     return function
+
+
+class TimeoutUtil:
+    """
+    regex with a deadline, for patterns compiled by the regex module (regex.compile)
+    the deadline is checked by the regex engine itself, so it works in any thread or process (no SIGALRM),
+    and concurrent=True releases the GIL while matching, so text cleaning scales with a thread pool
+    """
+
+    @staticmethod
+    def sub(pattern, repl, text, timeout=REGEX_TIMEOUT):
+        """
+        @param pattern: regex.compile(...)
+        @type pattern: regex.Pattern
+        @param repl:
+        @type repl: str
+        @param text:
+        @type text: str
+        @param timeout: seconds
+        @type timeout: float
+        @return: text with the matches replaced, text unchanged if timeout
+        @rtype: str
+        """
+        try:
+            return pattern.sub(repl, text, concurrent=True, timeout=timeout)
+        except TimeoutError:
+            logging.warning(f"Regex timeout: {timeout} sec reached, {pattern.pattern[:50]} on {text[:50]}")
+            return text
+
+    @staticmethod
+    def findall(pattern, text, timeout=REGEX_TIMEOUT):
+        """
+        @param pattern: regex.compile(...)
+        @type pattern: regex.Pattern
+        @param text:
+        @type text: str
+        @param timeout: seconds
+        @type timeout: float
+        @return: matching results, None if timeout
+        @rtype: list or None
+        """
+        try:
+            return pattern.findall(text, concurrent=True, timeout=timeout)
+        except TimeoutError:
+            logging.warning(f"Regex timeout: {timeout} sec reached, {pattern.pattern[:50]} on {text[:50]}")
+            return None
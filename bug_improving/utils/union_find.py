@@ -0,0 +1,111 @@
+class UnionFind:
+    """
+    disjoint-set (union-find) with path compression and union by rank
+    elements can be any hashable objects, they are mapped to int ids in the order they are first seen
+    e.g., pairs [(1, 2), (2, 3), (4, 5), (6, 2), (7, 5), (8, 9)] -> components [{1, 2, 3, 6}, {4, 5, 7}, {8, 9}]
+    """
+
+    def __init__(self):
+        self.element_id_dict = dict()  # dict{ key: element, value: id }
+        self.elements = []  # id -> element
+        self.parents = []  # id -> parent id
+        self.ranks = []  # id -> rank (upper bound of tree height)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def add(self, element):
+        """
+        add element as a singleton (if not added)
+        @param element:
+        @type element: hashable
+        @return: id of element
+        @rtype: int
+        """
+        element_id = self.element_id_dict.get(element, None)
+        if element_id is None:
+            element_id = len(self.elements)
+            self.element_id_dict[element] = element_id
+            self.elements.append(element)
+            self.parents.append(element_id)
+            self.ranks.append(0)
+        return element_id
+
+    def find_root(self, element_id):
+        """
+        find root id of element_id, and compress the path (iterative, no recursion limit)
+        """
+        parents = self.parents
+        root = element_id
+        while parents[root] != root:
+            root = parents[root]
+        while parents[element_id] != root:
+            parents[element_id], element_id = root, parents[element_id]
+        return root
+
+    def find(self, element):
+        """
+        @param element:
+        @type element: hashable
+        @return: the root element of the component of element
+        @rtype: hashable
+        """
+        return self.elements[self.find_root(self.add(element))]
+
+    def union(self, element1, element2):
+        """
+        merge the components of element1 and element2 (union by rank)
+        @return: True if they were in different components
+        @rtype: bool
+        """
+        root1 = self.find_root(self.add(element1))
+        root2 = self.find_root(self.add(element2))
+        if root1 == root2:
+            return False
+        if self.ranks[root1] < self.ranks[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        if self.ranks[root1] == self.ranks[root2]:
+            self.ranks[root1] = self.ranks[root1] + 1
+        return True
+
+    def union_pairs(self, pairs):
+        """
+        @param pairs: (element1, element2) stream
+        @type pairs: iterable
+        @return:
+        @rtype:
+        """
+        for element1, element2 in pairs:
+            self.union(element1, element2)
+
+    def union_sets(self, element_sets):
+        """
+        merge all elements of each set into one component
+        @param element_sets: sets (lists) of elements
+        @type element_sets: iterable
+        @return:
+        @rtype:
+        """
+        for element_set in element_sets:
+            first_element = None
+            is_first = True
+            for element in element_set:
+                if is_first:
+                    first_element = element
+                    self.add(element)
+                    is_first = False
+                else:
+                    self.union(first_element, element)
+
+    def get_components(self):
+        """
+        @return: components, in the order of their first seen elements
+        @rtype: [set(element, ...), set(element, ...), ...]
+        """
+        root_component_dict = dict()
+        for element_id, element in enumerate(self.elements):
+            root = self.find_root(element_id)
+            root_component_dict[root] = root_component_dict.get(root, set())
+            root_component_dict[root].add(element)
+        return list(root_component_dict.values())
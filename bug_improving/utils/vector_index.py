@@ -0,0 +1,186 @@
+import logging
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from bug_improving.utils.file_util import FileUtil
+from config import VECTOR_INDEX_TYPE, VECTOR_INDEX_PROBE_NUM
+
+
+class VectorIndex(ABC):
+    """
+    in-process cosine similarity index over an embedding matrix (rows are normalized when added)
+    search(queries, top_k, threshold) -> for each query, [(row, score), ...] by decreasing score
+    """
+
+    def __init__(self):
+        self.embeddings = None  # np.ndarray (row_num, dimension), float32, L2 normalized
+
+    def __len__(self):
+        return 0 if self.embeddings is None else len(self.embeddings)
+
+    @staticmethod
+    def to_numpy(embeddings):
+        """
+        torch.Tensor / list / np.ndarray -> float32 np.ndarray (row_num, dimension)
+        """
+        if hasattr(embeddings, "cpu"):
+            embeddings = embeddings.detach().cpu().numpy()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        return embeddings
+
+    @staticmethod
+    def normalize(embeddings):
+        embeddings = VectorIndex.to_numpy(embeddings)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+    @staticmethod
+    def select_top_k(rows, scores, top_k=None, threshold=None):
+        """
+        select (row, score) pairs by threshold and top_k, by decreasing score
+        argpartition first, so only the top_k scores are sorted
+        """
+        if threshold is not None:
+            mask = scores >= threshold
+            rows = rows[mask]
+            scores = scores[mask]
+        if top_k is not None and top_k < len(scores):
+            top_k_indices = np.argpartition(-scores, top_k)[:top_k]
+            rows = rows[top_k_indices]
+            scores = scores[top_k_indices]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def build(self, embeddings):
+        self.embeddings = VectorIndex.normalize(embeddings)
+        return self
+
+    @abstractmethod
+    def search(self, queries, top_k=None, threshold=None):
+        pass
+
+    def save(self, filepath):
+        FileUtil.dump_pickle(filepath, self)
+
+    @staticmethod
+    def load(filepath):
+        return FileUtil.load_pickle(filepath)
+
+
+class ExactVectorIndex(VectorIndex):
+    """
+    brute-force: query x corpus cosine matrix, in query blocks
+    """
+    QUERY_BLOCK_SIZE = 256
+
+    def search(self, queries, top_k=None, threshold=None):
+        queries = VectorIndex.normalize(queries)
+        rows = np.arange(len(self))
+        results = []
+        for start in range(0, len(queries), ExactVectorIndex.QUERY_BLOCK_SIZE):
+            block_scores = queries[start: start + ExactVectorIndex.QUERY_BLOCK_SIZE] @ self.embeddings.T
+            for scores in block_scores:
+                results.append(VectorIndex.select_top_k(rows, scores, top_k, threshold))
+        return results
+
+
+class IVFVectorIndex(VectorIndex):
+    """
+    inverted file index (IVF-Flat):
+    1. spherical k-means splits rows into list_num lists (by nearest centroid)
+    2. a query only scores the rows in its probe_num nearest lists
+    probe_num == list_num is exact search
+    approximate: rows in the lists not probed are never scored, so a threshold search can miss pairs above the
+    threshold (recall@10 is 1.000 with probe_num 8 on the clustered embeddings of vector_index_benchmark.py,
+    lower on less clustered ones), use it only where a missed pair is acceptable
+    """
+
+    def __init__(self, list_num=None, probe_num=VECTOR_INDEX_PROBE_NUM, iteration_num=10, sample_num_per_list=256,
+                 seed=0):
+        super().__init__()
+        self.list_num = list_num  # None: 4 * sqrt(row_num)
+        self.probe_num = probe_num
+        self.iteration_num = iteration_num
+        self.sample_num_per_list = sample_num_per_list
+        self.seed = seed
+        self.centroids = None  # np.ndarray (list_num, dimension)
+        self.lists = None  # [np.ndarray(rows), ...]
+
+    @staticmethod
+    def assign(embeddings, centroids, block_size=4096):
+        """
+        nearest centroid of each row, in blocks to bound the memory of the score matrix
+        """
+        assignments = np.empty(len(embeddings), dtype=np.int64)
+        for start in range(0, len(embeddings), block_size):
+            assignments[start: start + block_size] = np.argmax(embeddings[start: start + block_size] @ centroids.T,
+                                                               axis=1)
+        return assignments
+
+    def build(self, embeddings):
+        self.embeddings = VectorIndex.normalize(embeddings)
+        row_num = len(self.embeddings)
+        if row_num == 0:
+            self.centroids = self.embeddings
+            self.lists = []
+            return self
+        list_num = self.list_num or int(4 * np.sqrt(row_num))
+        list_num = max(1, min(list_num, row_num))
+        random_state = np.random.RandomState(self.seed)
+        # train centroids on a sample
+        sample_num = min(row_num, list_num * self.sample_num_per_list)
+        samples = self.embeddings[random_state.choice(row_num, sample_num, replace=False)]
+        centroids = samples[random_state.choice(sample_num, list_num, replace=False)]
+        for _ in range(self.iteration_num):
+            assignments = IVFVectorIndex.assign(samples, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, samples)
+            counts = np.bincount(assignments, minlength=list_num)
+            # empty list keeps its old centroid
+            sums[counts == 0] = centroids[counts == 0]
+            centroids = VectorIndex.normalize(sums)
+        self.centroids = centroids
+        assignments = IVFVectorIndex.assign(self.embeddings, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(list_num + 1))
+        self.lists = [order[bounds[i]: bounds[i + 1]] for i in range(list_num)]
+        logging.warning(f"IVF index: {row_num} rows into {list_num} lists")
+        return self
+
+    def search(self, queries, top_k=None, threshold=None):
+        queries = VectorIndex.normalize(queries)
+        if not self.lists:
+            return [[] for _ in queries]
+        probe_num = min(self.probe_num, len(self.lists))
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for query, scores in zip(queries, centroid_scores):
+            probe_lists = np.argpartition(-scores, probe_num - 1)[:probe_num]
+            rows = np.concatenate([self.lists[i] for i in probe_lists])
+            results.append(VectorIndex.select_top_k(rows, self.embeddings[rows] @ query, top_k, threshold))
+        return results
+
+
+class VectorIndexUtil:
+    INDEX_TYPE_CLASS_DICT = {
+        "exact": ExactVectorIndex,
+        "ivf": IVFVectorIndex,
+    }
+
+    @staticmethod
+    def build_vector_index(embeddings, index_type=VECTOR_INDEX_TYPE, **kwargs):
+        """
+        @param embeddings: (row_num, dimension)
+        @type embeddings: np.ndarray or torch.Tensor
+        @param index_type: "exact" or "ivf"
+        @type index_type: str
+        @param kwargs: arguments of the index class
+        @type kwargs:
+        @return: built vector index
+        @rtype: VectorIndex
+        """
+        return VectorIndexUtil.INDEX_TYPE_CLASS_DICT[index_type](**kwargs).build(embeddings)
@@ -10,6 +10,7 @@ LOG_DIR = str(Path(ROOT_DIR, "log"))
 OUTPUT_DIR = str(Path(ROOT_DIR, "output"))
 
 SEED_FILTER_COUNT_THRESHOLD = 2  # SeedExtractor.filter_seeds_by_count(seed_count_dict)
+REGEX_TIMEOUT = 1  # seconds, TimeoutUtil.sub / TimeoutUtil.findall (URL and serial number regex)
 
 ELEMENT_MERGE_THRESHOLD = 0.85
 
@@ -18,9 +19,26 @@ ACTION_MERGE_THRESHOLD = 0.85
 STEP_CLUSTER_THRESHOLD = 0.85
 
 SPACY_BATCH_SIZE = 1024
+SPACY_N_PROCESS = 1  # NLPUtil.get_docs_by_spacy_batch, processes of nlp.pipe (-1 means all CPUs)
+BENEPAR_N_PROCESS = 4  # SentUtil.split_atomic_sents_by_benepar_batch, worker processes (each loads spaCy + benepar)
+BENEPAR_CHUNK_SIZE = 16  # SentUtil.split_atomic_sents_by_benepar_batch, sentences per task of a worker
+BENEPAR_RECURSION_LIMIT = 5000  # SentUtil.init_benepar_worker, as sys.setrecursionlimit in __main__ of scripts
+PREPROCESS_CACHE_SIZE = 100000  # NLPUtil.preprocess, LRU memo of preprocessed paragraphs
 
 SBERT_BATCH_SIZE = 64
 
+SBERT_MODEL_NAME = 'paraphrase-MiniLM-L6-v2'
+
+EMBEDDING_CACHE_DIR = str(Path(DATA_DIR, "embedding_cache"))  # EmbeddingUtil.encode
+
+VECTOR_INDEX_TYPE = "exact"  # GraphUtil.STEP_VECTOR_INDEX, "exact" (same pairs as the cos_sim scan) or "ivf" (opt-in,
+# approximate: only VECTOR_INDEX_PROBE_NUM lists are scored, so pairs above STEP_MERGE_THRESHOLD in other lists are missed)
+VECTOR_INDEX_PROBE_NUM = 8  # IVFVectorIndex, lists scored per query
+
+COMMUNITY_DETECTION_TILE_SIZE = 4096  # ClusteringUtil.community_detection, rows (columns) per cos_sim tile
+
+BUG_PAIR_BLOCK_SIZE = 1024  # BugClusterMatrix, bug rows per sparse product of step cluster overlaps
+
 STEP_MAX_TOKEN_NUM = 64
 
 MAX_STEP_NUM = 20
@@ -45,7 +63,26 @@ SLEEP_TIME = 60
 
 MAX_RETRIES = 3
 
+GITHUB_REST_POINTS_PER_MINUTE = 900  # RateLimitScheduler, secondary rate limit of REST API requests per token
+GITHUB_GRAPHQL_POINTS_PER_MINUTE = 2000  # RateLimitScheduler, secondary rate limit of GraphQL API requests per token
+RATE_LIMIT_RESET_MARGIN = 1  # seconds, RateLimitScheduler waits after X-RateLimit-Reset for clock skew
+GRAPHQL_BATCH_SIZE = 50  # GraphQLBatcher, queries packed into one GraphQL document
+GRAPHQL_MAX_NODE_NUM = 500000  # GraphQLBatcher, GitHub's limit of nodes requested by one GraphQL call
+
+LLM_MAX_IN_FLIGHT = 8  # LLMExecutor, concurrent chat requests
+LLM_TOKENS_PER_MINUTE = 200000  # LLMExecutor, token budget shared by all in-flight requests
+LLM_COMPLETION_TOKEN_NUM = 1024  # LLMExecutor, completion tokens reserved for each request before it is sent
+LLM_CACHE_ENABLED = True  # LLMUtil.ask_turbo, reuse answers of the same (model, temperature, messages)
+LLM_CACHE_TTL = None  # seconds, None means cached answers never expire
+
 SYNC_CRAWEL_NUM = 100
+CRAWEL_MAX_IN_FLIGHT = 100  # CrawelExecutor / CrawelUtil.get_client_session, concurrent HTTP requests (pooled connections),
+# as many as a SYNC_CRAWEL_NUM batch of the per-batch gather, and GitHub's limit of 100 concurrent requests
+CRAWEL_KEEPALIVE_TIMEOUT = 60  # seconds, idle pooled connections are kept alive for reuse
+GITHUB_ISSUE_PER_PAGE = 100  # GitHubIssueCrawler.sync_issues, issues per page of the list endpoint (GitHub's maximum)
+GITHUB_ISSUE_LABELS = "bug"  # GitHubIssueCrawler.sync_issues, only the issues with these labels are listed
+HTTP_CACHE_ENABLED = True  # CrawelUtil.fetch, conditional GET requests (ETag / Last-Modified), 304s served from HttpCache
+HTTP_CACHE_WRITE_BATCH_SIZE = 100  # HttpCache, responses written per SQLite transaction
 
 BUG_JSON_LINK = "https://bugzilla.mozilla.org/rest/bug/"
 BUG_COMMENT = "/comment"
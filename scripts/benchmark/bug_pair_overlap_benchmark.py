@@ -0,0 +1,79 @@
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from bug_improving.utils.bug_cluster_matrix import BugClusterMatrix
+
+
+class BugPairOverlapBenchmark:
+    """
+    all-pairs step cluster overlap by BugClusterMatrix (blocked sparse A @ A.T, pairs streamed into a csv file)
+    vs the nested loops over every bug pair (set intersection) of find_bug_pairs, on 10^3 - 10^5 synthetic bugs
+    (1 - max_step_num steps per bug, cluster of each step drawn from bug_num // 2 clusters)
+    checks the pairs and overlaps are the same
+    """
+
+    def __init__(self, bug_nums=(10 ** 3, 10 ** 4, 10 ** 5), max_step_num=8, top_k=10, legacy_max_bug_num=10 ** 4,
+                 seed=0):
+        self.bug_nums = bug_nums
+        self.max_step_num = max_step_num
+        self.top_k = top_k
+        self.legacy_max_bug_num = legacy_max_bug_num
+        self.seed = seed
+
+    def get_cluster_index_sets(self, bug_num, random_state):
+        cluster_num = max(bug_num // 2, 1)
+        return [{random_state.randrange(cluster_num) for _ in range(random_state.randint(1, self.max_step_num))}
+                for _ in range(bug_num)]
+
+    @staticmethod
+    def find_pairs_by_loop(bug_clusters):
+        """
+        the nested loops of find_bug_pairs, without stopping at the 7th pair
+        """
+        pairs = []
+        for bug_id_1, clusters_1 in bug_clusters.items():
+            for bug_id_2, clusters_2 in bug_clusters.items():
+                if bug_id_1 >= bug_id_2:
+                    continue
+                overlap = len(clusters_1 & clusters_2)
+                if overlap:
+                    pairs.append((bug_id_1, bug_id_2, overlap))
+        return pairs
+
+    def run(self):
+        random_state = random.Random(self.seed)
+        for bug_num in self.bug_nums:
+            bug_ids = list(range(1, bug_num + 1))
+            cluster_index_sets = self.get_cluster_index_sets(bug_num, random_state)
+
+            start = time.perf_counter()
+            matrix = BugClusterMatrix(bug_ids, cluster_index_sets)
+            build_time = time.perf_counter() - start
+            with tempfile.TemporaryDirectory() as dirpath:
+                filepath = Path(dirpath, "bug_pairs.csv")
+                start = time.perf_counter()
+                pair_num = matrix.dump_pairs(filepath)
+                all_pairs_time = time.perf_counter() - start
+                file_size = os.path.getsize(filepath)
+                start = time.perf_counter()
+                top_k_pair_num = matrix.dump_pairs(filepath, top_k=self.top_k)
+                top_k_time = time.perf_counter() - start
+            result = f"bugs: {bug_num}\tbuild: {build_time:.2f}s\t" \
+                     f"all pairs: {pair_num} in {all_pairs_time:.2f}s ({file_size / 1024 / 1024:.1f} MB)\t" \
+                     f"top {self.top_k} per bug: {top_k_pair_num} in {top_k_time:.2f}s"
+
+            if bug_num <= self.legacy_max_bug_num:
+                bug_clusters = dict(zip(bug_ids, cluster_index_sets))
+                start = time.perf_counter()
+                legacy_pairs = BugPairOverlapBenchmark.find_pairs_by_loop(bug_clusters)
+                legacy_time = time.perf_counter() - start
+                result = result + f"\tloop: {legacy_time:.2f}s\t" \
+                                  f"same: {sorted(matrix.iter_pairs()) == sorted(legacy_pairs)}"
+            print(result)
+
+
+if __name__ == "__main__":
+    BugPairOverlapBenchmark().run()
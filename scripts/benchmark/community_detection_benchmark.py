@@ -0,0 +1,103 @@
+import multiprocessing
+import time
+
+import numpy as np
+
+from bug_improving.utils.clustering_util import ClusteringUtil
+from config import STEP_MERGE_THRESHOLD, COMMUNITY_DETECTION_TILE_SIZE
+
+
+class CommunityDetectionBenchmark:
+    """
+    time and peak memory of ClusteringUtil.community_detection (similarity tiles, sparse neighbours)
+    vs sentence_transformers.util.community_detection, each run in a fresh process,
+    on 10^4 - 10^6 synthetic SBERT-like step embeddings (384 dimensions, ~5 paraphrased steps per topic)
+    memory: peak RSS - RSS after the embeddings are generated, i.e., what the clustering itself takes
+    checks the communities are the same (util.community_detection only up to legacy_max_step_num)
+    """
+
+    def __init__(self, step_nums=(10 ** 4, 10 ** 5, 10 ** 6), dimension=384, steps_per_topic=5,
+                 tile_size=COMMUNITY_DETECTION_TILE_SIZE, legacy_max_step_num=2 * 10 ** 4, seed=0):
+        self.step_nums = step_nums
+        self.dimension = dimension
+        self.steps_per_topic = steps_per_topic
+        self.tile_size = tile_size
+        self.legacy_max_step_num = legacy_max_step_num
+        self.seed = seed
+
+    @staticmethod
+    def get_memory(field):
+        """
+        VmRSS (current) or VmHWM (peak) of this process in KB
+        """
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+        return 0
+
+    @staticmethod
+    def reset_peak_memory():
+        """
+        reset VmHWM to the current RSS (Linux >= 4.0), so the peak of generating the embeddings is not counted
+        """
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    def get_embeddings(self, step_num, chunk_size=10 ** 4):
+        random_state = np.random.RandomState(self.seed)
+        topic_num = max(step_num // self.steps_per_topic, 1)
+        topics = random_state.randn(topic_num, self.dimension).astype(np.float32)
+        topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+        embeddings = np.empty((step_num, self.dimension), dtype=np.float32)
+        for start in range(0, step_num, chunk_size):
+            size = min(chunk_size, step_num - start)
+            # noise 0.2 - 0.5: cos_sim of two steps of a topic is about 0.8 - 0.96
+            noise_scales = random_state.uniform(0.2, 0.5, size=(size, 1)).astype(np.float32)
+            embeddings[start:start + size] = topics[random_state.randint(topic_num, size=size)] + \
+                noise_scales * random_state.randn(size, self.dimension).astype(np.float32) / np.sqrt(self.dimension)
+        return embeddings
+
+    def detect(self, method, step_num, queue):
+        """
+        run in a fresh process: generate embeddings, detect communities, report time and memory
+        """
+        embeddings = self.get_embeddings(step_num)
+        CommunityDetectionBenchmark.reset_peak_memory()
+        start_rss = CommunityDetectionBenchmark.get_memory("VmRSS")
+        start = time.perf_counter()
+        if method == "tiled":
+            communities = ClusteringUtil.community_detection(embeddings, threshold=STEP_MERGE_THRESHOLD,
+                                                             min_community_size=1, tile_size=self.tile_size)
+        else:
+            from sentence_transformers import util
+            communities = util.community_detection(embeddings, threshold=STEP_MERGE_THRESHOLD, min_community_size=1)
+            communities = [list(community) for community in communities]
+        detect_time = time.perf_counter() - start
+        peak_rss = CommunityDetectionBenchmark.get_memory("VmHWM")
+        queue.put((detect_time, peak_rss - start_rss, len(communities),
+                   hash(tuple(tuple(community) for community in communities))))
+
+    def run(self):
+        context = multiprocessing.get_context("spawn")
+        for step_num in self.step_nums:
+            methods = ["tiled", "util"] if step_num <= self.legacy_max_step_num else ["tiled"]
+            results = dict()
+            for method in methods:
+                queue = context.Queue()
+                process = context.Process(target=self.detect, args=(method, step_num, queue))
+                process.start()
+                results[method] = queue.get()
+                process.join()
+                detect_time, memory, community_num, _ = results[method]
+                print(f"steps: {step_num}\t{method}\ttime: {detect_time:.2f}s\tmemory: {memory / 1024:.0f} MB\t"
+                      f"communities: {community_num}")
+            if len(results) == 2:
+                print(f"steps: {step_num}\tsame communities: {results['tiled'][3] == results['util'][3]}")
+
+
+if __name__ == "__main__":
+    CommunityDetectionBenchmark().run()
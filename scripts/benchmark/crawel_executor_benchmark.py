@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import aiohttp
+
+from bug_improving.utils.crawel_executor import CrawelExecutor
+from bug_improving.utils.crawel_util import CrawelUtil
+from bug_improving.utils.list_util import ListUtil
+from config import SYNC_CRAWEL_NUM, CRAWEL_MAX_IN_FLIGHT
+from scripts.benchmark.crawel_stub_server import CrawelStubServer
+
+
+class CrawelExecutorBenchmark:
+    """
+    sustained requests per second against CrawelStubServer, batches of SYNC_CRAWEL_NUM issue urls,
+    each batch "saved" for save_time seconds (blocking, like FileUtil.dump_json):
+    1. per batch: a fresh aiohttp.ClientSession and asyncio.gather of the batch by loop.run_until_complete
+       (the previous GitHubIssueCrawler / CrawelUtil.fetch_multiple)
+    2. CrawelExecutor.iter_batches: one pooled session, max_in_flight workers on one work queue
+       (16, and CRAWEL_MAX_IN_FLIGHT: as many as a batch, the same concurrency as 1.),
+       each batch saved in a thread (asyncio.to_thread) like GitHubIssueCrawler
+    checks: every issue is fetched, connections opened, requests in flight, compressed responses
+    """
+
+    def __init__(self, issue_num=2000, delay=0.05, save_time=0.05,
+                 max_in_flights=(16, CRAWEL_MAX_IN_FLIGHT), batch_size=SYNC_CRAWEL_NUM):
+        self.issue_num = issue_num
+        self.save_time = save_time
+        self.max_in_flights = max_in_flights
+        self.batch_size = batch_size
+        self.stub_server = CrawelStubServer(delay=delay)
+
+    @staticmethod
+    async def fetch_multiple_by_fresh_session(urls):
+        """
+        the per-batch session and unbounded gather replaced by CrawelExecutor
+        """
+        async with aiohttp.ClientSession() as session:
+            tasks = [CrawelUtil.fetch(session, url) for url in urls]
+            responses = await asyncio.gather(*tasks, return_exceptions=True)
+        return CrawelUtil.filter_bug_responses(responses)
+
+    def crawel_by_fresh_sessions(self, urls_list):
+        loop = asyncio.new_event_loop()
+        issue_num = 0
+        for urls in urls_list:
+            issue_num = issue_num + len(loop.run_until_complete(
+                CrawelExecutorBenchmark.fetch_multiple_by_fresh_session(urls)))
+            time.sleep(self.save_time)
+        loop.close()
+        return issue_num
+
+    async def crawel_by_executor(self, urls_list, max_in_flight):
+        issue_num = 0
+        async with CrawelExecutor(max_in_flight=max_in_flight) as executor:
+            async for _, responses in executor.iter_batches(urls_list):
+                issue_num = issue_num + len(CrawelUtil.filter_bug_responses(responses))
+                await asyncio.to_thread(time.sleep, self.save_time)
+        return issue_num
+
+    def report(self, name, issue_num, crawel_time):
+        print(f"{name}\trequests: {self.stub_server.request_num}\tissues: {issue_num}\ttime: {crawel_time:.2f}s\t"
+              f"requests/s: {self.stub_server.request_num / crawel_time:.0f}\t"
+              f"connections: {len(self.stub_server.connections)}\tmax in flight: {self.stub_server.max_in_flight}\t"
+              f"gzip: {self.stub_server.compressed_num}")
+
+    def run(self):
+        self.stub_server.start()
+        CrawelUtil.USE_HTTP_CACHE = False  # every request reaches the stub server (see http_cache_benchmark.py)
+        urls_list = ListUtil.list_of_groups(self.stub_server.get_issue_urls(self.issue_num), self.batch_size)
+
+        self.stub_server.reset_stats()
+        start = time.perf_counter()
+        issue_num = self.crawel_by_fresh_sessions(urls_list)
+        self.report("session per batch", issue_num, time.perf_counter() - start)
+
+        for max_in_flight in self.max_in_flights:
+            self.stub_server.reset_stats()
+            start = time.perf_counter()
+            issue_num = asyncio.run(self.crawel_by_executor(urls_list, max_in_flight))
+            self.report(f"executor ({max_in_flight} in flight)", issue_num, time.perf_counter() - start)
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    CrawelExecutorBenchmark().run()
@@ -0,0 +1,259 @@
+import asyncio
+import calendar
+import email.utils
+import math
+import re
+import threading
+import time
+from collections import deque
+
+from aiohttp import web
+
+from bug_improving.utils.graphql_batcher import GraphQLBatcher
+
+
+class CrawelStubServer:
+    """
+    local stub of the GitHub issue endpoint (GET /repos/{owner}/{repo}/issues/{issue_num}),
+    the issue list endpoint (GET /repos/{owner}/{repo}/issues?since=&per_page=&page=, issues 1 - issue_num
+    sorted by updated time ascending) and the GraphQL endpoint (POST /graphql)
+    1. answers after delay seconds with an issue labeled "bug" (body of body_size characters),
+       gzip compressed if the request accepts it
+    2. counts requests, TCP connections opened (keep-alive reuse) and the maximum of requests in flight
+    3. if rate_limit is given, emulates GitHub rate limits per (Authorization, resource "core" / "graphql"):
+       primary: rate_limit requests per rate_limit_window seconds, X-RateLimit-* headers, 403 when used up
+       secondary: if points is given, at most points requests in any points_window seconds,
+       403 with Retry-After beyond
+    4. GraphQL: every top-level field (alias) of the document gets {"issue" / "pullRequest": {"number", ...}},
+       answered after delay + field_delay * fields seconds; in documents of several fields,
+       the issues with number % error_every == 0 get a field error (partial errors of batched queries)
+    5. if etag is True, issues carry ETag / Last-Modified (changed by update_issues),
+       a matching If-None-Match / If-Modified-Since gets 304 without body, not counted against the rate limit
+    usage: CrawelStubServer().start(); urls = stub_server.get_issue_urls(issue_num)
+    """
+
+    def __init__(self, host="127.0.0.1", port=8766, delay=0.05, body_size=4000, rate_limit=None,
+                 rate_limit_window=3600, points=None, points_window=60, field_delay=0.0, error_every=0, etag=False,
+                 issue_num=1000):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.body_size = body_size
+        self.field_delay = field_delay
+        self.error_every = error_every
+        self.etag = etag
+        self.issue_num = issue_num
+        self.issue_version_dict = dict()  # key: issue num, value: times updated (update_issues)
+        self.issue_modified_time_dict = dict()  # key: issue num, value: epoch seconds of the latest update
+        self.start_time = int(time.time()) - 86400  # issue n was last updated at start_time + n until update_issues
+        self.not_modified_num = 0  # 304 responses
+        self.sent_byte_num = 0  # body bytes of 200 issue responses (before compression)
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.points = points
+        self.points_window = points_window
+        self.token_resource_window_dict = dict()  # key: (Authorization, resource), value: [reset time, used]
+        self.token_resource_request_times_dict = dict()  # key: (Authorization, resource), value: request times
+        self.forbidden_num = 0  # 403 of the primary rate limit
+        self.secondary_forbidden_num = 0  # 403 of the secondary rate limit
+        self.request_num = 0
+        self.connections = set()
+        self.compressed_num = 0
+        self.max_in_flight = 0
+        self.in_flight = 0
+        self.loop = None
+        self.runner = None
+
+    @property
+    def graphql_link(self):
+        return f"http://{self.host}:{self.port}/graphql"
+
+    def get_issue_urls(self, issue_num, owner_name="owner", repo_name="repo"):
+        return [f"http://{self.host}:{self.port}/repos/{owner_name}/{repo_name}/issues/{issue_id}"
+                for issue_id in range(1, issue_num + 1)]
+
+    def reset_stats(self):
+        self.request_num = 0
+        self.connections = set()
+        self.compressed_num = 0
+        self.max_in_flight = 0
+        self.forbidden_num = 0
+        self.secondary_forbidden_num = 0
+        self.not_modified_num = 0
+        self.sent_byte_num = 0
+
+    def update_issues(self, issue_nums):
+        """
+        change the issues, so their ETag / Last-Modified change
+        """
+        for issue_num in issue_nums:
+            self.issue_version_dict[issue_num] = self.issue_version_dict.get(issue_num, 0) + 1
+            self.issue_modified_time_dict[issue_num] = int(time.time())
+
+    def get_updated_time(self, issue_num):
+        return self.issue_modified_time_dict.get(issue_num, self.start_time + issue_num)
+
+    def get_issue_dict(self, issue_num):
+        version = self.issue_version_dict.get(issue_num, 0)
+        return {
+            "number": issue_num,
+            "title": f"Issue {issue_num}" + (f" (updated {version} times)" if version else ""),
+            "labels": [{"name": "bug"}],
+            "body": ("Steps to reproduce: open the app and click the button. " * self.body_size)[:self.body_size],
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.get_updated_time(issue_num))),
+        }
+
+    def get_rate_limit_used(self, resource="core"):
+        """
+        @return: requests counted against the primary rate limit in the current windows of all tokens
+        @rtype: int
+        """
+        return sum(window[1] for (_, window_resource), window in self.token_resource_window_dict.items()
+                   if window_resource == resource)
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get("If-None-Match", None)
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = request.headers.get("If-Modified-Since", None)
+        return if_modified_since is not None and if_modified_since == last_modified
+
+    def check_rate_limit(self, request, resource, charge=True):
+        """
+        @param charge: False for 304 responses (only reported in the X-RateLimit-* headers)
+        @return: (X-RateLimit-* headers, None) or (headers, 403 response)
+        @rtype: tuple
+        """
+        if self.rate_limit is None:
+            return {"X-RateLimit-Used": "0", "X-RateLimit-Limit": "5000"}, None
+        key = (request.headers.get("Authorization", ""), resource)
+        now = time.time()
+        if self.points is not None:
+            request_times = self.token_resource_request_times_dict.setdefault(key, deque())
+            while request_times and request_times[0] <= now - self.points_window:
+                request_times.popleft()
+            if len(request_times) >= self.points:
+                self.secondary_forbidden_num = self.secondary_forbidden_num + 1
+                return {}, web.json_response({"message": "You have exceeded a secondary rate limit."}, status=403,
+                                             headers={"Retry-After": str(math.ceil(self.points_window))})
+            request_times.append(now)
+        window = self.token_resource_window_dict.get(key, None)
+        if window is None or now >= window[0]:
+            window = [int(now) + self.rate_limit_window, 0]
+            self.token_resource_window_dict[key] = window
+        used = min(window[1] + 1, self.rate_limit) if charge else window[1]
+        headers = {"X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(self.rate_limit - used),
+                   "X-RateLimit-Used": str(used), "X-RateLimit-Reset": str(window[0]),
+                   "X-RateLimit-Resource": resource}
+        if not charge:
+            return headers, None
+        if window[1] >= self.rate_limit:
+            self.forbidden_num = self.forbidden_num + 1
+            return headers, web.json_response({"message": "API rate limit exceeded"}, status=403, headers=headers)
+        window[1] = window[1] + 1
+        return headers, None
+
+    async def get_issue(self, request):
+        self.request_num = self.request_num + 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        issue_num = int(request.match_info["issue_num"])
+        version = self.issue_version_dict.get(issue_num, 0)
+        validator_headers = dict()
+        if self.etag:
+            validator_headers["ETag"] = f'W/"{issue_num}-{version}"'
+            validator_headers["Last-Modified"] = email.utils.formatdate(self.get_updated_time(issue_num), usegmt=True)
+            if self.is_not_modified(request, validator_headers["ETag"], validator_headers["Last-Modified"]):
+                headers, _ = self.check_rate_limit(request, "core", charge=False)
+                await asyncio.sleep(self.delay)
+                self.not_modified_num = self.not_modified_num + 1
+                return web.Response(status=304, headers={**headers, **validator_headers})
+        headers, forbidden_response = self.check_rate_limit(request, "core")
+        if forbidden_response is not None:
+            return forbidden_response
+        self.in_flight = self.in_flight + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight = self.in_flight - 1
+        response = web.json_response(self.get_issue_dict(issue_num), headers={**headers, **validator_headers})
+        self.sent_byte_num = self.sent_byte_num + len(response.body)
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            self.compressed_num = self.compressed_num + 1
+            response.enable_compression()
+        return response
+
+    async def get_issues(self, request):
+        self.request_num = self.request_num + 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        headers, forbidden_response = self.check_rate_limit(request, "core")
+        if forbidden_response is not None:
+            return forbidden_response
+        await asyncio.sleep(self.delay)
+        issue_nums = sorted(range(1, self.issue_num + 1), key=lambda issue_num: (self.get_updated_time(issue_num),
+                                                                               issue_num))
+        since = request.query.get("since", None)
+        if since:
+            since_time = calendar.timegm(time.strptime(since, "%Y-%m-%dT%H:%M:%SZ"))
+            issue_nums = [issue_num for issue_num in issue_nums if self.get_updated_time(issue_num) >= since_time]
+        per_page = min(int(request.query.get("per_page", 30)), 100)
+        page = int(request.query.get("page", 1))
+        return web.json_response([self.get_issue_dict(issue_num)
+                                  for issue_num in issue_nums[(page - 1) * per_page:page * per_page]], headers=headers)
+
+    async def post_graphql(self, request):
+        self.request_num = self.request_num + 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        headers, forbidden_response = self.check_rate_limit(request, "graphql")
+        if forbidden_response is not None:
+            return forbidden_response
+        body = await request.json()
+        fields = GraphQLBatcher.get_top_level_fields(body["query"])
+        await asyncio.sleep(self.delay + self.field_delay * len(fields))
+        data = dict()
+        errors = []
+        for key, field in fields:
+            match = re.search(r"\b(issue|pullRequest)\(number:\s*(\d+)\)", field)
+            number = int(match.group(2)) if match else 0
+            if len(fields) > 1 and self.error_every and number % self.error_every == 0:
+                data[key] = None
+                errors.append({"path": [key], "message": "Something went wrong while executing your query."})
+            elif match:
+                data[key] = {match.group(1): {"number": number, "timelineItems": {"nodes": []}}}
+            else:
+                data[key] = dict()
+        response = {"data": data}
+        if errors:
+            response["errors"] = errors
+        return web.json_response(response, headers=headers)
+
+    def start(self):
+        """
+        serve in a daemon thread with its own event loop
+        """
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_get("/repos/{owner_name}/{repo_name}/issues", self.get_issues)
+            app.router.add_get("/repos/{owner_name}/{repo_name}/issues/{issue_num}", self.get_issue)
+            app.router.add_post("/graphql", self.post_graphql)
+            self.runner = web.AppRunner(app, access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, self.host, self.port).start())
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+if __name__ == "__main__":
+    stub_server = CrawelStubServer().start()
+    print(f"Crawel stub server: http://{stub_server.host}:{stub_server.port}")
+    threading.Event().wait()
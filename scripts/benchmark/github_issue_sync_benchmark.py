@@ -0,0 +1,83 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from bug_improving.utils.crawel_util import CrawelUtil
+from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.rate_limit_scheduler import RateLimitScheduler
+from scripts.benchmark.crawel_stub_server import CrawelStubServer
+from scripts.workflow.github_issue_crawler import GitHubIssueCrawler
+
+
+class GitHubIssueSyncBenchmark:
+    """
+    nightly refresh of the issues of CrawelStubServer, saved in a temporary directory:
+    1. full crawl (GitHubIssueCrawler.crawl_and_save_issues): one request per issue number
+    2. incremental crawl (GitHubIssueCrawler.sync_issues): the list endpoint, 100 issues per request,
+       only the issues updated since the high-water mark of the last sync
+    after the first sync, updated_ratio of the issues change and new_issue_num issues are opened
+    checks: requests, time, the synced batches hold every issue once, as a fresh full crawl
+    """
+
+    def __init__(self, issue_num=5000, updated_ratio=0.02, new_issue_num=50, delay=0.05, seed=0):
+        self.issue_num = issue_num
+        self.updated_ratio = updated_ratio
+        self.new_issue_num = new_issue_num
+        self.seed = seed
+        self.stub_server = CrawelStubServer(delay=delay, body_size=2000, rate_limit=100000, issue_num=issue_num)
+
+    def get_crawler(self, data_dir, max_issue_id=None):
+        crawler = GitHubIssueCrawler("owner", "repo", max_issue_id=max_issue_id)
+        crawler.filepath = Path(data_dir, crawler.repo, crawler.folder_name)
+        crawler.sync_filepath = Path(data_dir, crawler.repo, f"{crawler.folder_name}_sync.json")
+        crawler._prepare_directory()
+        # no secondary rate limit on the stub server
+        crawler.scheduler = RateLimitScheduler(crawler.github_tokens, rest_points=self.stub_server.rate_limit)
+        return crawler
+
+    def run_and_report(self, name, function):
+        self.stub_server.reset_stats()
+        start = time.perf_counter()
+        function()
+        run_time = time.perf_counter() - start
+        print(f"{name}\trequests: {self.stub_server.request_num}\ttime: {run_time:.2f}s")
+        return run_time
+
+    @staticmethod
+    def load_number_title_list(crawler):
+        issues = []
+        for filename in FileUtil.get_file_names_in_directory(crawler.filepath, 'json'):
+            issues.extend(FileUtil.load_json(filename))
+        return sorted((issue["number"], issue["title"]) for issue in issues)
+
+    def run(self):
+        self.stub_server.start()
+        CrawelUtil.USE_HTTP_CACHE = False  # every request reaches the stub server (see http_cache_benchmark.py)
+        CrawelUtil.ISSUE_LINK = f"http://{self.stub_server.host}:{self.stub_server.port}" \
+                                f"/repos/{{owner_name}}/{{repo_name}}/issues"
+        with tempfile.TemporaryDirectory() as data_dir:
+            crawler = self.get_crawler(data_dir, self.issue_num)
+            self.run_and_report("full crawl", crawler.crawl_and_save_issues)
+            self.run_and_report("first sync (no high-water mark)", crawler.sync_issues)
+
+            updated_issue_nums = random.Random(self.seed).sample(range(1, self.issue_num + 1),
+                                                                 int(self.issue_num * self.updated_ratio))
+            self.stub_server.update_issues(updated_issue_nums)
+            self.stub_server.issue_num = self.issue_num + self.new_issue_num
+            self.stub_server.update_issues(range(self.issue_num + 1, self.stub_server.issue_num + 1))
+
+            full_crawler = self.get_crawler(Path(data_dir, "full"), self.stub_server.issue_num)
+            full_time = self.run_and_report(f"nightly full crawl ({len(updated_issue_nums)} updated, "
+                                            f"{self.new_issue_num} new)", full_crawler.crawl_and_save_issues)
+            sync_time = self.run_and_report(f"nightly sync ({len(updated_issue_nums)} updated, "
+                                            f"{self.new_issue_num} new)", crawler.sync_issues)
+            number_title_list = GitHubIssueSyncBenchmark.load_number_title_list(crawler)
+            print(f"speedup: {full_time / sync_time:.1f}x\tsynced issues: {len(number_title_list)}\t"
+                  f"same as full crawl: "
+                  f"{number_title_list == GitHubIssueSyncBenchmark.load_number_title_list(full_crawler)}")
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    GitHubIssueSyncBenchmark().run()
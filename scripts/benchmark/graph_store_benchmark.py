@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bug_improving.types.bug import Bug, Bugs
+from bug_improving.types.description import Description, Step
+from bug_improving.types.graph_store import GraphStore
+from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.graph_util import GraphUtil
+
+
+class GraphStoreBenchmark:
+    """
+    startup time and peak RSS of one query (GraphUtil.find_relevant_ranked_bugs_by_bug_id_with_step_type)
+    on the whole Bugs pickle vs the memory-mapped GraphStore, each in a fresh process,
+    on synthetic bugs with linked steps and step clusters
+    checks the ranked bug ids are the same
+    """
+
+    WORDS = ["open", "click", "the", "menu", "settings", "bookmark", "tab", "private", "window", "page", "save",
+             "history", "button", "select", "type", "url", "address", "bar", "scroll", "down", "library"]
+
+    def __init__(self, bug_num=20000, max_step_num=8, seed=0):
+        self.bug_num = bug_num
+        self.max_step_num = max_step_num
+        self.seed = seed
+
+    def get_bugs(self):
+        random_state = random.Random(self.seed)
+        cluster_num = self.bug_num // 2
+        bug_list = []
+        index_cluster_dict = dict()
+        for bug_index in range(self.bug_num):
+            bug = Bug(id=bug_index + 1, summary=f"bug {bug_index + 1}", status="RESOLVED", bug_type="defect",
+                      creation_time=datetime(2020, 1, 1) + timedelta(minutes=bug_index))
+            steps = []
+            for step_index in range(random_state.randint(1, self.max_step_num)):
+                text = " ".join(random_state.choice(GraphStoreBenchmark.WORDS) for _ in range(12))
+                step = Step(step_index, bug, text, random_state.random() < 0.8,
+                            cluster_index=random_state.randrange(cluster_num))
+                index_cluster_dict[step.cluster_index] = index_cluster_dict.get(step.cluster_index, set())
+                index_cluster_dict[step.cluster_index].add(step)
+                steps.append(step)
+            for index, step in enumerate(steps):
+                if index != 0:
+                    step.prev_step = steps[index - 1]
+                if index != len(steps) - 1:
+                    step.next_step = steps[index + 1]
+            bug.description = Description(bug, " ".join(step.text for step in steps), ["a prerequisite"], steps,
+                                          ["an expected result"], ["an actual result"])
+            bug_list.append(bug)
+        bugs = Bugs(bug_list)
+        # cluster indexes are 0, 1, ..., like Bugs.merge_steps_by_fast_clustering
+        bugs.step_index_cluster_dict = {index: index_cluster_dict.get(index, set()) for index in range(cluster_num)}
+        return bugs
+
+    @staticmethod
+    def get_peak_rss():
+        """
+        peak RSS (KB) of this process, VmHWM on Linux (ru_maxrss keeps the parent's peak across fork + exec)
+        """
+        if os.path.exists("/proc/self/status"):
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    @staticmethod
+    def query(source, path, bug_id, queue):
+        """
+        run in a fresh process: load, one query, report time and peak RSS
+        """
+        start = time.perf_counter()
+        if source == "pickle":
+            bugs = FileUtil.load_pickle(path)
+            GraphUtil.BUGS = bugs
+            GraphUtil.get_bug_id_bug_dict(bugs)
+            GraphUtil.get_index_cluster_dict(bugs)
+        else:
+            bugs = GraphStore(path)
+            GraphUtil.load_graph_store(bugs)
+        startup_time = time.perf_counter() - start
+        GraphUtil.get_index_cluster_expected_actual_result_dict()
+        bug_list, _ = GraphUtil.find_relevant_ranked_bugs_by_bug_id_with_step_type(bugs, bug_id)
+        query_time = time.perf_counter() - start - startup_time
+        queue.put((startup_time, query_time, GraphStoreBenchmark.get_peak_rss(),
+                   [bug.id for bug in bug_list[0:10]]))
+
+    def run(self):
+        bugs = self.get_bugs()
+        context = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory() as dirpath:
+            pickle_filepath = Path(dirpath, "bugs.json")
+            store_dirpath = Path(dirpath, "bug_graph")
+            start = time.perf_counter()
+            FileUtil.dump_pickle(pickle_filepath, bugs)
+            pickle_write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            GraphStore.write(bugs, store_dirpath)
+            store_write_time = time.perf_counter() - start
+            print(f"bugs: {len(bugs)}\tsteps: {len(bugs.get_steps()[0])}\t"
+                  f"write pickle: {pickle_write_time:.2f}s\twrite store: {store_write_time:.2f}s")
+            del bugs
+
+            bug_ids = {}
+            for source, path in [("pickle", pickle_filepath), ("store", store_dirpath)]:
+                queue = context.Queue()
+                process = context.Process(target=GraphStoreBenchmark.query, args=(source, path, 1, queue))
+                process.start()
+                startup_time, query_time, max_rss, bug_ids[source] = queue.get()
+                process.join()
+                print(f"{source}\tstartup: {startup_time:.2f}s\tquery: {query_time:.2f}s\t"
+                      f"peak RSS: {max_rss / 1024:.0f} MB")
+            print(f"same ranked bugs: {bug_ids['pickle'] == bug_ids['store']}")
+
+
+if __name__ == "__main__":
+    GraphStoreBenchmark().run()
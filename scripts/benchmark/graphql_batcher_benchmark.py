@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from bug_improving.utils.crawel_executor import CrawelExecutor
+from bug_improving.utils.crawel_util import CrawelUtil
+from bug_improving.utils.graphql_batcher import GraphQLBatcher
+from scripts.benchmark.crawel_stub_server import CrawelStubServer
+
+
+class GraphQLBatcherBenchmark:
+    """
+    timeline queries (CrawelUtil.get_github_issue_pull_close_crossref_relation_queries_for_graphql)
+    against CrawelStubServer: one request per query vs GraphQLBatcher (aliased queries, batch_size per request)
+    server time per request: delay + field_delay * queries in it, 1 of error_every issues fails in batches
+    checks: requests, time, queries sent again, the responses are the same as the unbatched ones
+    """
+
+    def __init__(self, query_num=1000, delay=0.3, field_delay=0.005, error_every=37, batch_sizes=(10, 50),
+                 max_in_flight=8):
+        self.query_num = query_num
+        self.batch_sizes = batch_sizes
+        self.max_in_flight = max_in_flight
+        self.stub_server = CrawelStubServer(delay=delay, field_delay=field_delay, error_every=error_every)
+
+    async def fetch_one_by_one(self, queries):
+        async with CrawelExecutor(max_in_flight=self.max_in_flight) as executor:
+            return await executor.fetch_multiple(queries)
+
+    async def fetch_by_batcher(self, queries, batcher):
+        async with CrawelExecutor(max_in_flight=self.max_in_flight) as executor:
+            return await batcher.fetch_all(queries, executor)
+
+    def run(self):
+        self.stub_server.start()
+        CrawelUtil.USE_HTTP_CACHE = False  # every request reaches the stub server (see http_cache_benchmark.py)
+        CrawelUtil.GRAPHQL_LINK = self.stub_server.graphql_link
+        queries = CrawelUtil.get_github_issue_pull_close_crossref_relation_queries_for_graphql(
+            "owner", "repo", range(1, self.query_num + 1))
+
+        self.stub_server.reset_stats()
+        start = time.perf_counter()
+        expected_responses = asyncio.run(self.fetch_one_by_one(queries))
+        one_by_one_time = time.perf_counter() - start
+        print(f"one by one\tqueries: {self.query_num}\trequests: {self.stub_server.request_num}\t"
+              f"time: {one_by_one_time:.2f}s")
+
+        for batch_size in self.batch_sizes:
+            batcher = GraphQLBatcher(batch_size=batch_size)
+            self.stub_server.reset_stats()
+            start = time.perf_counter()
+            responses = asyncio.run(self.fetch_by_batcher(queries, batcher))
+            batcher_time = time.perf_counter() - start
+            print(f"batch size {batch_size}\tqueries: {self.query_num}\trequests: {self.stub_server.request_num}\t"
+                  f"time: {batcher_time:.2f}s\tspeedup: {one_by_one_time / batcher_time:.1f}x\t"
+                  f"sent again: {batcher.retried_query_num}\tsame responses: {responses == expected_responses}")
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    GraphQLBatcherBenchmark().run()
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from bug_improving.utils.crawel_executor import CrawelExecutor
+from bug_improving.utils.crawel_util import CrawelUtil
+from bug_improving.utils.http_cache import HttpCache
+from scripts.benchmark.crawel_stub_server import CrawelStubServer
+
+
+class HttpCacheBenchmark:
+    """
+    re-crawl of the issues of CrawelStubServer (ETag / Last-Modified, 304 not counted against the rate limit)
+    through CrawelExecutor, with HttpCache (CrawelUtil.USE_HTTP_CACHE) in a temporary directory:
+    1. without the cache: every crawl downloads every issue
+    2. with the cache: the first crawl fills it, after updated_ratio of the issues change
+       the re-crawl gets 304 for the unchanged ones
+    checks: hit ratio, bytes saved, rate limit used, the re-crawl returns the current issues
+    """
+
+    def __init__(self, issue_num=1000, updated_ratio=0.1, delay=0.05, body_size=20000, seed=0):
+        self.issue_num = issue_num
+        self.updated_ratio = updated_ratio
+        self.seed = seed
+        self.stub_server = CrawelStubServer(delay=delay, body_size=body_size, rate_limit=5000, etag=True)
+
+    @staticmethod
+    async def crawel(urls):
+        async with CrawelExecutor() as executor:
+            return await executor.fetch_multiple(urls)
+
+    def crawel_and_report(self, name, urls):
+        self.stub_server.reset_stats()
+        rate_limit_used = self.stub_server.get_rate_limit_used()
+        start = time.perf_counter()
+        responses = asyncio.run(HttpCacheBenchmark.crawel(urls))
+        crawel_time = time.perf_counter() - start
+        print(f"{name}\trequests: {self.stub_server.request_num}\t304: {self.stub_server.not_modified_num}\t"
+              f"bytes sent: {self.stub_server.sent_byte_num}\t"
+              f"rate limit used: {self.stub_server.get_rate_limit_used() - rate_limit_used}\t"
+              f"time: {crawel_time:.2f}s")
+        return responses
+
+    def run(self):
+        self.stub_server.start()
+        urls = self.stub_server.get_issue_urls(self.issue_num)
+        updated_issue_nums = random.Random(self.seed).sample(range(1, self.issue_num + 1),
+                                                             int(self.issue_num * self.updated_ratio))
+
+        CrawelUtil.USE_HTTP_CACHE = False
+        self.crawel_and_report("no cache, first crawl", urls)
+        self.stub_server.update_issues(updated_issue_nums)
+        self.crawel_and_report("no cache, re-crawl", urls)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            CrawelUtil.USE_HTTP_CACHE = True
+            CrawelUtil.HTTP_CACHE = HttpCache(Path(cache_dir, "http_cache.sqlite"))
+            self.crawel_and_report("cache, first crawl", urls)
+            print(f"stats: {CrawelUtil.HTTP_CACHE.get_stats()}")
+            self.stub_server.update_issues(updated_issue_nums)
+            CrawelUtil.HTTP_CACHE = HttpCache(Path(cache_dir, "http_cache.sqlite"))
+            responses = self.crawel_and_report("cache, re-crawl", urls)
+            stats = CrawelUtil.HTTP_CACHE.get_stats()
+            CrawelUtil.USE_HTTP_CACHE = False
+            expected_responses = asyncio.run(HttpCacheBenchmark.crawel(urls))
+            print(f"stats: {stats}\thit ratio: {stats['hit_ratio']:.2f}\t"
+                  f"bytes saved: {stats['saved_byte_num']} of "
+                  f"{stats['saved_byte_num'] + stats['downloaded_byte_num']}\t"
+                  f"current issues: {responses == expected_responses}")
+            CrawelUtil.HTTP_CACHE.close()
+            CrawelUtil.HTTP_CACHE = None
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    HttpCacheBenchmark().run()
@@ -0,0 +1,70 @@
+import tempfile
+import time
+from pathlib import Path
+
+import openai
+
+from bug_improving.utils.llm_cache import LLMCache
+from bug_improving.utils.llm_executor import LLMExecutor
+from bug_improving.utils.llm_util import LLMUtil
+from scripts.benchmark.llm_stub_server import LLMStubServer
+
+
+class LLMExecutorBenchmark:
+    """
+    sequential LLMUtil.ask_turbo vs LLMExecutor against LLMStubServer
+    checks: answers keep the order of requests, in-flight requests never exceed max_in_flight,
+    429 responses are retried, a re-run served by LLMCache sends no request
+    """
+
+    def __init__(self, request_num=64, delay=0.2, rate_limit_every=10, max_in_flight=8):
+        self.request_num = request_num
+        self.max_in_flight = max_in_flight
+        self.stub_server = LLMStubServer(delay=delay, rate_limit_every=rate_limit_every)
+
+    def get_messages_list(self):
+        return [LLMUtil.add_role_content_dict_into_messages(LLMUtil.ROLE_USER, f"bug {index}",
+                                                            LLMUtil.get_messages_for_turbo("I am a stub."))
+                for index in range(self.request_num)]
+
+    def run(self):
+        self.stub_server.start()
+        openai.api_base = self.stub_server.api_base
+        openai.api_key = "stub"
+        LLMUtil.USE_LLM_CACHE = False
+        messages_list = self.get_messages_list()
+        expected_answers = [messages[-1]["content"] for messages in messages_list]
+
+        start = time.perf_counter()
+        answers = [LLMUtil.ask_turbo(messages) for messages in messages_list]
+        sequential_time = time.perf_counter() - start
+        print(f"sequential\trequests: {self.request_num}\ttime: {sequential_time:.2f}s\t"
+              f"in order: {answers == expected_answers}")
+
+        self.stub_server.max_in_flight = 0
+        start = time.perf_counter()
+        answers = LLMExecutor(max_in_flight=self.max_in_flight).run(messages_list)
+        executor_time = time.perf_counter() - start
+        print(f"executor\trequests: {self.request_num}\ttime: {executor_time:.2f}s\t"
+              f"in order: {answers == expected_answers}\t"
+              f"max in flight: {self.stub_server.max_in_flight} (limit {self.max_in_flight})")
+
+        # re-run with LLMCache: the first run fills it, the second one sends no request
+        with tempfile.TemporaryDirectory() as cache_dir:
+            LLMUtil.USE_LLM_CACHE = True
+            LLMUtil.LLM_CACHE = LLMCache(Path(cache_dir, "llm_cache.sqlite"))
+            for run_name in ["cache (cold)", "cache (warm)"]:
+                request_num = self.stub_server.request_num
+                start = time.perf_counter()
+                answers = LLMExecutor(max_in_flight=self.max_in_flight).run(messages_list)
+                cache_time = time.perf_counter() - start
+                print(f"{run_name}\trequests sent: {self.stub_server.request_num - request_num}\t"
+                      f"time: {cache_time:.2f}s\tin order: {answers == expected_answers}\t"
+                      f"stats: {LLMUtil.LLM_CACHE.get_stats()}")
+            LLMUtil.LLM_CACHE.connection.close()
+            LLMUtil.LLM_CACHE = None
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    LLMExecutorBenchmark().run()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+import time
+
+from aiohttp import web
+
+
+class LLMStubServer:
+    """
+    local stub of the OpenAI chat completions endpoint (POST /v1/chat/completions)
+    1. answers after delay seconds, the answer echoes the last message
+    2. every rate_limit_every-th request gets 429 (to exercise the backoff retry), 0 means never
+    usage: LLMStubServer().start(); openai.api_base = stub_server.api_base
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, delay=0.2, rate_limit_every=0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.rate_limit_every = rate_limit_every
+        self.request_num = 0
+        self.max_in_flight = 0
+        self.in_flight = 0
+        self.loop = None
+        self.runner = None
+
+    @property
+    def api_base(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def chat_completions(self, request):
+        self.request_num = self.request_num + 1
+        if self.rate_limit_every and self.request_num % self.rate_limit_every == 0:
+            return web.json_response({"error": {"message": "Rate limit reached", "type": "requests",
+                                                "code": "rate_limit_exceeded"}}, status=429)
+        body = await request.json()
+        self.in_flight = self.in_flight + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight = self.in_flight - 1
+        content = body["messages"][-1]["content"]
+        prompt_tokens = len(json.dumps(body["messages"])) // 4
+        completion_tokens = len(content) // 4
+        return web.json_response({
+            "id": f"chatcmpl-{self.request_num}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def start(self):
+        """
+        serve in a daemon thread with its own event loop
+        """
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_post("/v1/chat/completions", self.chat_completions)
+            self.runner = web.AppRunner(app)
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, self.host, self.port).start())
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+if __name__ == "__main__":
+    stub_server = LLMStubServer().start()
+    print(f"LLM stub server: {stub_server.api_base}")
+    threading.Event().wait()
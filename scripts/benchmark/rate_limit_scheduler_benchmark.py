@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from bug_improving.utils.crawel_executor import CrawelExecutor
+from bug_improving.utils.crawel_util import CrawelUtil
+from bug_improving.utils.rate_limit_scheduler import RateLimitScheduler
+from scripts.benchmark.crawel_stub_server import CrawelStubServer
+
+
+class RateLimitSchedulerBenchmark:
+    """
+    REST and GraphQL requests against CrawelStubServer emulating GitHub rate limits (scaled down in time):
+    per token and resource, rate_limit requests per rate_limit_window seconds (primary)
+    and points requests per points_window seconds (secondary)
+    1. CrawelExecutor without scheduler, one token: X-RateLimit-Used check after each response
+    2. CrawelExecutor with RateLimitScheduler over all tokens
+    REST and GraphQL run one after the other (each has its own budget per token)
+    checks: 403 responses (primary / secondary), failed requests, requests/s vs the budget of the tokens
+    """
+
+    def __init__(self, rest_num=300, graphql_num=300, tokens=("token_a", "token_b"), rate_limit=40,
+                 rate_limit_window=4, points=20, points_window=1, reset_margin=0.2, max_in_flight=16):
+        self.rest_num = rest_num
+        self.graphql_num = graphql_num
+        self.tokens = list(tokens)
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.points = points
+        self.points_window = points_window
+        self.reset_margin = reset_margin
+        self.max_in_flight = max_in_flight
+        self.stub_server = CrawelStubServer(delay=0.02, body_size=200, rate_limit=rate_limit,
+                                            rate_limit_window=rate_limit_window, points=points,
+                                            points_window=points_window)
+
+    def get_resource_urls_list(self):
+        return [("REST", self.stub_server.get_issue_urls(self.rest_num)),
+                ("GraphQL", [f"query {{ repository {{ issue(number: {issue_num}) {{ number }} }} }}"
+                             for issue_num in range(1, self.graphql_num + 1)])]
+
+    async def crawel(self, urls, scheduler=None, headers=None):
+        async with CrawelExecutor(max_in_flight=self.max_in_flight, headers=headers, scheduler=scheduler) as executor:
+            return await executor.fetch_multiple(urls)
+
+    def report(self, name, responses, crawel_time, token_num):
+        failed_num = sum(isinstance(response, Exception) or "error" in response for response in responses)
+        budget_rate = token_num * min(self.rate_limit / self.rate_limit_window, self.points / self.points_window)
+        print(f"{name}\trequests: {len(responses)}\tfailed: {failed_num}\ttime: {crawel_time:.2f}s\t"
+              f"requests/s: {len(responses) / crawel_time:.1f} (budget {budget_rate:.1f})\t"
+              f"403 primary: {self.stub_server.forbidden_num}\t"
+              f"403 secondary: {self.stub_server.secondary_forbidden_num}")
+
+    def run(self):
+        self.stub_server.start()
+        CrawelUtil.USE_HTTP_CACHE = False  # every request reaches the stub server (see http_cache_benchmark.py)
+        CrawelUtil.GRAPHQL_LINK = self.stub_server.graphql_link
+        for resource, urls in self.get_resource_urls_list():
+            self.stub_server.reset_stats()
+            start = time.perf_counter()
+            responses = asyncio.run(self.crawel(urls, headers=RateLimitScheduler.get_headers(self.tokens[0])))
+            self.report(f"{resource}\tno scheduler, 1 token", responses, time.perf_counter() - start, 1)
+            # wait for the windows of the run to be over
+            time.sleep(self.rate_limit_window + self.points_window)
+
+            for token_num in [1, len(self.tokens)]:
+                self.stub_server.reset_stats()
+                scheduler = RateLimitScheduler(self.tokens[:token_num], rest_points=self.points,
+                                               graphql_points=self.points, points_window=self.points_window,
+                                               reset_margin=self.reset_margin)
+                start = time.perf_counter()
+                responses = asyncio.run(self.crawel(urls, scheduler=scheduler))
+                self.report(f"{resource}\tscheduler, {token_num} tokens", responses, time.perf_counter() - start,
+                            token_num)
+                time.sleep(self.rate_limit_window + self.points_window)
+        self.stub_server.stop()
+
+
+if __name__ == "__main__":
+    RateLimitSchedulerBenchmark().run()
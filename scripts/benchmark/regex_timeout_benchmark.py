@@ -0,0 +1,115 @@
+import random
+import re
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bug_improving.event_extraction.placeholder import Placeholder
+from bug_improving.event_extraction.seed_extractor import SeedExtractor
+from bug_improving.utils.nlp_util import NLPUtil
+
+
+class RegexTimeoutBenchmark:
+    """
+    throughput of the text-cleaning stages (NLPUtil.replace_url_by_placeholder, NLPUtil.remove_serial_number,
+    SeedExtractor.extract_urls_by_regex) with TimeoutUtil (regex timeout, GIL released while matching)
+    in a ThreadPoolExecutor of 1 - 8 threads
+    vs the SIGALRM + re loops they replaced, which only run on the main thread
+    texts: steps with urls, serial numbers, and a few pathological ones (an url followed by a long run of dots) hitting the timeout
+    """
+
+    WORDS = ["Open", "the", "browser", "click", "Save", "button", "go", "to", "Settings", "panel", "type", "text",
+             "select", "Bookmark", "Tab", "Menu", "Password", "History", "Library", "Toolbar"]
+    URLS = ["https://www.mozilla.org/en-US/firefox/new/", "http://example.com/a_(b)/c?d=1", "www.example.org",
+            "https://bugzilla.mozilla.org/show_bug.cgi?id=1234567", "example.com/path/to/page.html"]
+
+    PATTERN_URL = [re.compile(pattern.pattern, flags=re.MULTILINE) for pattern in NLPUtil.PATTERN_URL]
+    PATTEN_SERIAL_NUMBER = [re.compile(pattern.pattern) for pattern in NLPUtil.PATTEN_SERIAL_NUMBER]
+
+    def __init__(self, text_num=20000, pathological_num=2, thread_nums=(1, 2, 4, 8), seed=0):
+        self.text_num = text_num
+        self.pathological_num = pathological_num
+        self.thread_nums = thread_nums
+        self.seed = seed
+
+    def get_texts(self):
+        random_state = random.Random(self.seed)
+        texts = []
+        for index in range(self.text_num):
+            words = [random_state.choice(RegexTimeoutBenchmark.WORDS) for _ in range(random_state.randint(5, 30))]
+            if random_state.random() < 0.3:
+                words.insert(random_state.randrange(len(words)), random_state.choice(RegexTimeoutBenchmark.URLS))
+            texts.append(f"{index % 10 + 1}. " + " ".join(words))
+        for index in range(self.pathological_num):
+            texts[random_state.randrange(self.text_num)] = "see http://" + "." * 5000
+        return texts
+
+    @staticmethod
+    def clean(text):
+        text = NLPUtil.replace_url_by_placeholder(text)
+        text = NLPUtil.remove_serial_number(text)
+        return text, SeedExtractor.extract_urls_by_regex(text)
+
+    @staticmethod
+    def time_out(signum, frame):
+        raise TimeoutError
+
+    @staticmethod
+    def sub_by_alarm(pattern, repl, text):
+        """
+        the SIGALRM loop replaced by TimeoutUtil.sub
+        """
+        signal.signal(signal.SIGALRM, RegexTimeoutBenchmark.time_out)
+        signal.alarm(1)
+        try:
+            text = pattern.sub(repl, text)
+            signal.alarm(0)
+        except TimeoutError:
+            pass
+        return text
+
+    @staticmethod
+    def clean_by_alarm(text):
+        for pattern in RegexTimeoutBenchmark.PATTERN_URL:
+            text = RegexTimeoutBenchmark.sub_by_alarm(pattern, Placeholder.URL, text)
+        for pattern in RegexTimeoutBenchmark.PATTEN_SERIAL_NUMBER:
+            text = RegexTimeoutBenchmark.sub_by_alarm(pattern, '', text)
+        signal.signal(signal.SIGALRM, RegexTimeoutBenchmark.time_out)
+        signal.alarm(1)
+        urls = set()
+        try:
+            for pattern in RegexTimeoutBenchmark.PATTERN_URL:
+                for rs in pattern.findall(text):
+                    if rs:
+                        urls.add(rs[0])
+            signal.alarm(0)
+        except TimeoutError:
+            urls = None
+        return text, urls
+
+    def run(self):
+        texts = self.get_texts()
+        start = time.perf_counter()
+        for text in texts:
+            RegexTimeoutBenchmark.clean_by_alarm(text)
+        alarm_time = time.perf_counter() - start
+        print(f"texts: {len(texts)}\tSIGALRM + re, main thread\ttime: {alarm_time:.2f}s\t"
+              f"throughput: {len(texts) / alarm_time:.0f} texts/s")
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(RegexTimeoutBenchmark.clean_by_alarm, texts[:1]))
+        except ValueError as e:
+            print(f"SIGALRM + re, thread pool\tfailed: {e}")
+
+        for thread_num in self.thread_nums:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=thread_num) as executor:
+                results = list(executor.map(RegexTimeoutBenchmark.clean, texts))
+            pool_time = time.perf_counter() - start
+            print(f"texts: {len(texts)}\tTimeoutUtil, {thread_num} threads\ttime: {pool_time:.2f}s\t"
+                  f"throughput: {len(texts) / pool_time:.0f} texts/s\tspeedup: {alarm_time / pool_time:.2f}x\t"
+                  f"timeouts: {sum(urls is None for _, urls in results)}")
+
+
+if __name__ == "__main__":
+    RegexTimeoutBenchmark().run()
@@ -0,0 +1,124 @@
+import random
+import re
+import time
+
+from bug_improving.event_extraction.seed_extractor import SeedExtractor
+
+
+class SeedPlaceholderBenchmark:
+    """
+    SeedExtractor.replace_seed_by_placeholder / replace_placeholder_by_seed (Aho–Corasick, one pass per text)
+    vs the per-seed str.replace + re.sub loops they replaced, on 10^3 - 5 * 10^4 synthetic seeds
+    texts: steps with seeds in quotes, in brackets, followed by a comma, inside other words (not to be replaced)
+    """
+
+    WORDS = ["Save", "Open", "Login", "Bookmark", "Tab", "Menu", "Settings", "Password", "History", "Library",
+             "Toolbar", "Window", "Private", "Address", "Search", "Panel", "Button", "Sync", "Account", "Profile"]
+
+    def __init__(self, seed_nums=(10 ** 3, 10 ** 4, 5 * 10 ** 4), text_num=1000, legacy_max_seed_num=10 ** 4,
+                 seed=0):
+        self.seed_nums = seed_nums
+        self.text_num = text_num
+        self.legacy_max_seed_num = legacy_max_seed_num
+        self.seed = seed
+
+    @staticmethod
+    def get_seeds(seed_num, random_state):
+        seeds = set()
+        while len(seeds) < seed_num:
+            word_num = random_state.randint(1, 4)
+            seeds.add(" ".join(random_state.choice(SeedPlaceholderBenchmark.WORDS) for _ in range(word_num)) +
+                      f" {random_state.randrange(seed_num)}")
+        return sorted(seeds)
+
+    @staticmethod
+    def get_texts(seeds, text_num, random_state):
+        texts = []
+        for _ in range(text_num):
+            pieces = ["Open the browser"]
+            for _ in range(random_state.randint(1, 5)):
+                seed = random_state.choice(seeds)
+                pieces.append(random_state.choice([f'click "{seed}"', f"go to [{seed}] panel", f"press {seed},",
+                                                   f"type x{seed}x", f"select '{seed}'"]))
+            texts.append(" and ".join(pieces) + ".")
+        return texts
+
+    @staticmethod
+    def replace_seed_by_placeholder_by_loop(text, plh_dict_keys_by_seed_len):
+        """
+        the per-seed loop replaced by SeedExtractor.SEED_AUTOMATON
+        """
+        for seed_placeholder in plh_dict_keys_by_seed_len:
+            seed_value = SeedExtractor.PLACEHOLDER_SEED_DICT[seed_placeholder]
+            if seed_value in text:
+                original_text = text
+                text = text.replace(seed_value, seed_placeholder)
+                text = re.sub(rf'(?:\'|\"|“|\[)*{seed_placeholder}(?:\'|\"|“|”|\])*', seed_placeholder, text)
+                all_seed_placeholder = re.findall(rf"{seed_placeholder}", text, flags=0)
+                specific_seed_placeholder = re.findall(rf"(\s{seed_placeholder}[^0-9a-zA-Z]+|\s{seed_placeholder}$)",
+                                                       text, flags=0)
+                if len(all_seed_placeholder) != len(specific_seed_placeholder):
+                    text = original_text
+        return text
+
+    @staticmethod
+    def replace_placeholder_by_seed_by_loop(text, plh_dict_keys_by_plh_len):
+        """
+        the per-placeholder loop replaced by SeedExtractor.PLACEHOLDER_AUTOMATON
+        """
+        element = list()
+        for seed_placeholder in plh_dict_keys_by_plh_len:
+            seed_value = SeedExtractor.PLACEHOLDER_SEED_DICT[seed_placeholder]
+            if seed_placeholder in text:
+                text = text.replace(seed_placeholder, seed_value)
+                element.append(seed_value)
+        return text, element
+
+    def run(self):
+        random_state = random.Random(self.seed)
+        for seed_num in self.seed_nums:
+            seeds = SeedPlaceholderBenchmark.get_seeds(seed_num, random_state)
+            texts = SeedPlaceholderBenchmark.get_texts(seeds, self.text_num, random_state)
+            SeedExtractor.PLACEHOLDER_SEED_DICT = dict()
+
+            start = time.perf_counter()
+            SeedExtractor.get_placeholder_dict(seeds, [])
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            placeholder_texts = [SeedExtractor.replace_seed_by_placeholder(text) for text in texts]
+            forward_time = time.perf_counter() - start
+            start = time.perf_counter()
+            restored_texts = [SeedExtractor.replace_placeholder_by_seed(text)[0] for text in placeholder_texts]
+            inverse_time = time.perf_counter() - start
+            result = f"seeds: {seed_num}\tbuild: {build_time:.2f}s\t" \
+                     f"seed->placeholder: {self.text_num / forward_time:.0f} texts/s\t" \
+                     f"placeholder->seed: {self.text_num / inverse_time:.0f} texts/s"
+
+            if seed_num <= self.legacy_max_seed_num:
+                plh_dict_keys_by_seed_len = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT,
+                                                   key=lambda k: len(SeedExtractor.PLACEHOLDER_SEED_DICT[k]),
+                                                   reverse=True)
+                plh_dict_keys_by_plh_len = sorted(SeedExtractor.PLACEHOLDER_SEED_DICT, key=len, reverse=True)
+                start = time.perf_counter()
+                legacy_placeholder_texts = [
+                    SeedPlaceholderBenchmark.replace_seed_by_placeholder_by_loop(text, plh_dict_keys_by_seed_len)
+                    for text in texts]
+                legacy_forward_time = time.perf_counter() - start
+                start = time.perf_counter()
+                legacy_restored_texts = [
+                    SeedPlaceholderBenchmark.replace_placeholder_by_seed_by_loop(text, plh_dict_keys_by_plh_len)[0]
+                    for text in placeholder_texts]
+                legacy_inverse_time = time.perf_counter() - start
+                # differences: the loop reverts every occurrence of CONCEPT_8 if CONCEPT_8 is a prefix of CONCEPT_871
+                same_num = sum(1 for text, legacy_text in zip(placeholder_texts, legacy_placeholder_texts)
+                               if text == legacy_text)
+                result = result + f"\tloop seed->placeholder: {self.text_num / legacy_forward_time:.0f} texts/s\t" \
+                                  f"loop placeholder->seed: {self.text_num / legacy_inverse_time:.0f} texts/s\t" \
+                                  f"same: {same_num}/{self.text_num}\t" \
+                                  f"same restored: {restored_texts == legacy_restored_texts}"
+            print(result)
+
+
+if __name__ == "__main__":
+    SeedPlaceholderBenchmark().run()
@@ -0,0 +1,79 @@
+import random
+import time
+
+from bug_improving.event_extraction.seed_extractor import SeedExtractor
+from bug_improving.types.description import Step
+from bug_improving.types.entity import Category
+from bug_improving.utils.nlp_util import NLPUtil
+from config import SPACY_BATCH_SIZE
+
+
+class SpacyBatchBenchmark:
+    """
+    one NLPUtil.SPACY_NLP call per step vs NLPUtil.get_docs_by_spacy_batch (nlp.pipe) for
+    Category.extract_category and Step.extract_action_target_condition_concept_tuple on synthetic steps,
+    checks the outputs are identical
+    n_process > 1 needs the spaCy model to be loadable in the worker processes
+    """
+
+    SEEDS = ["Save Page As", "Private Window", "Library", "Manage Bookmarks", "Settings", "Show All History",
+             "Clear Recent History", "Open File", "Saved Logins", "Customize Toolbar"]
+    STEP_TEMPLATES = ["Click the \"{}\" button.", "Go to {} in the menu.", "Open the {} dialog with the keyboard.",
+                      "Right click on the {} item in the sidebar.", "Select {} from the dropdown menu.",
+                      "Scroll down to the {} section and press Enter."]
+
+    def __init__(self, step_num=2000, batch_sizes=(64, SPACY_BATCH_SIZE), n_processes=(1, 2), seed=0):
+        self.step_num = step_num
+        self.batch_sizes = batch_sizes
+        self.n_processes = n_processes
+        self.seed = seed
+
+    def get_steps(self):
+        random_state = random.Random(self.seed)
+        return [random_state.choice(SpacyBatchBenchmark.STEP_TEMPLATES).format(
+            random_state.choice(SpacyBatchBenchmark.SEEDS)) for _ in range(self.step_num)]
+
+    def run(self):
+        NLPUtil.load_spacy_model()
+        SeedExtractor.get_placeholder_dict(SpacyBatchBenchmark.SEEDS, [])
+        steps = self.get_steps()
+        placeholder_steps = [SeedExtractor.replace_seed_by_placeholder(step) for step in steps]
+
+        start = time.perf_counter()
+        NLPUtil.SPACY_NLP.disable_pipes("merge_noun_chunks", "benepar")
+        category_results = [Category.extract_category(step) for step in placeholder_steps]
+        category_time = time.perf_counter() - start
+        print(f"category\tone by one\tsteps/s: {self.step_num / category_time:.0f}")
+        for batch_size in self.batch_sizes:
+            for n_process in self.n_processes:
+                start = time.perf_counter()
+                NLPUtil.SPACY_NLP.disable_pipes("merge_noun_chunks", "benepar")
+                batch_results = SpacyBatchBenchmark.extract_categories(placeholder_steps, batch_size, n_process)
+                batch_time = time.perf_counter() - start
+                print(f"category\tbatch_size: {batch_size}\tn_process: {n_process}\t"
+                      f"steps/s: {self.step_num / batch_time:.0f}\tidentical: {batch_results == category_results}")
+
+        # both with merge_noun_chunks enabled and benepar disabled
+        NLPUtil.SPACY_NLP.enable_pipe("merge_noun_chunks")
+        start = time.perf_counter()
+        step_results = [Step.extract_action_target_condition_concept_tuple(step) for step in steps]
+        step_time = time.perf_counter() - start
+        print(f"step tuple\tone by one\tsteps/s: {self.step_num / step_time:.0f}")
+        start = time.perf_counter()
+        batch_results = Step.extract_action_target_condition_concept_tuples_by_batch(steps)
+        batch_time = time.perf_counter() - start
+        print(f"step tuple\tbatch_size: {SPACY_BATCH_SIZE}\tn_process: 1\t"
+              f"steps/s: {self.step_num / batch_time:.0f}\tidentical: {batch_results == step_results}")
+
+    @staticmethod
+    def extract_categories(texts, batch_size, n_process):
+        """
+        Category.extract_categories_by_batch with batch_size and n_process instead of the config ones
+        """
+        docs = iter(NLPUtil.get_docs_by_spacy_batch([text for text in texts if len(text) <= 512],
+                                                    batch_size=batch_size, n_process=n_process))
+        return [Category.extract_category(text, next(docs)) if len(text) <= 512 else list() for text in texts]
+
+
+if __name__ == "__main__":
+    SpacyBatchBenchmark().run()
@@ -0,0 +1,63 @@
+import random
+import time
+
+from bug_improving.utils.list_util import ListUtil
+
+
+class UnionFindBenchmark:
+    """
+    ListUtil.merge_pairs_into_sets (union-find) on synthetic pair graphs of 10^4 - 10^7 edges,
+    and the old fixed-point merging (rescan until no set changes) for the small graphs
+    pair graph: node_num = edge_num / 2, random edges, like (i, j) of util.paraphrase_mining
+    """
+
+    def __init__(self, edge_nums=(10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7), legacy_max_edge_num=10 ** 4, seed=0):
+        self.edge_nums = edge_nums
+        self.legacy_max_edge_num = legacy_max_edge_num
+        self.seed = seed
+
+    @staticmethod
+    def get_pairs(edge_num, seed):
+        random_state = random.Random(seed)
+        node_num = max(2, edge_num // 2)
+        return [(random_state.randrange(node_num), random_state.randrange(node_num)) for _ in range(edge_num)]
+
+    @staticmethod
+    def merge_sets_by_fixed_point(sets):
+        """
+        the merging replaced by union-find: merge any two intersecting sets, rescan until no set changes
+        """
+        groups = [set(elements) for elements in sets]
+        is_changed = True
+        while is_changed:
+            is_changed = False
+            merged_groups = []
+            for group in groups:
+                for merged_group in merged_groups:
+                    if not merged_group.isdisjoint(group):
+                        merged_group.update(group)
+                        is_changed = True
+                        break
+                else:
+                    merged_groups.append(group)
+            groups = merged_groups
+        return groups
+
+    def run(self):
+        for edge_num in self.edge_nums:
+            pairs = UnionFindBenchmark.get_pairs(edge_num, self.seed)
+            start = time.perf_counter()
+            components = ListUtil.merge_pairs_into_sets(pairs)
+            union_find_time = time.perf_counter() - start
+            result = f"edges: {edge_num}\tcomponents: {len(components)}\tunion-find: {union_find_time:.2f}s"
+            if edge_num <= self.legacy_max_edge_num:
+                start = time.perf_counter()
+                legacy_components = UnionFindBenchmark.merge_sets_by_fixed_point([set(pair) for pair in pairs])
+                legacy_time = time.perf_counter() - start
+                is_same = sorted(map(sorted, components)) == sorted(map(sorted, legacy_components))
+                result = result + f"\tfixed point: {legacy_time:.2f}s\tsame: {is_same}"
+            print(result)
+
+
+if __name__ == "__main__":
+    UnionFindBenchmark().run()
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+
+from bug_improving.utils.vector_index import VectorIndexUtil
+
+
+class VectorIndexBenchmark:
+    """
+    recall@k and query latency of IVFVectorIndex against ExactVectorIndex
+    on synthetic clustered embeddings (SBERT-like: 384 dimensions, steps paraphrasing each other)
+    """
+
+    def __init__(self, row_num=100000, dimension=384, topic_num=2000, query_num=200, top_k=10, seed=0):
+        random_state = np.random.RandomState(seed)
+        topics = random_state.randn(topic_num, dimension).astype(np.float32)
+        self.embeddings = topics[random_state.randint(topic_num, size=row_num)] + \
+            1.0 * random_state.randn(row_num, dimension).astype(np.float32)
+        self.queries = self.embeddings[random_state.choice(row_num, query_num, replace=False)] + \
+            0.1 * random_state.randn(query_num, dimension).astype(np.float32)
+        self.top_k = top_k
+
+    def run_index(self, index_type, **kwargs):
+        start = time.perf_counter()
+        vector_index = VectorIndexUtil.build_vector_index(self.embeddings, index_type, **kwargs)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [vector_index.search(query, top_k=self.top_k)[0] for query in self.queries]
+        query_time = (time.perf_counter() - start) / len(self.queries)
+        return results, build_time, query_time
+
+    def run(self, probe_nums=(1, 4, 8, 16, 32)):
+        exact_results, build_time, query_time = self.run_index("exact")
+        print(f"rows: {len(self.embeddings)}, queries: {len(self.queries)}, top_k: {self.top_k}")
+        print(f"exact\t\tbuild: {build_time:.2f}s\tquery: {query_time * 1000:.2f}ms\trecall: 1.000")
+        for probe_num in probe_nums:
+            ivf_results, build_time, query_time = self.run_index("ivf", probe_num=probe_num)
+            hit_num = 0
+            for exact_pairs, ivf_pairs in zip(exact_results, ivf_results):
+                hit_num = hit_num + len({row for row, _ in exact_pairs} & {row for row, _ in ivf_pairs})
+            recall = hit_num / (len(self.queries) * self.top_k)
+            print(f"ivf (probe {probe_num})\tbuild: {build_time:.2f}s\tquery: {query_time * 1000:.2f}ms\t"
+                  f"recall: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    VectorIndexBenchmark().run()
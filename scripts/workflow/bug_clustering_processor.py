@@ -1,9 +1,14 @@
+import os
 from pathlib import Path
 
 from langsmith import traceable
 from sentence_transformers import SentenceTransformer
+from bug_improving.types.graph_store import GraphStore
+from bug_improving.utils.embedding_util import EmbeddingUtil
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.path_util import PathUtil
+from bug_improving.utils.step_cluster_index import StepClusterIndex
+from config import SBERT_BATCH_SIZE, SBERT_MODEL_NAME
 
 class BugClusteringProcessor:
     """
@@ -16,29 +21,51 @@ class BugClusteringProcessor:
         """
         # You can choose the embedding model to use here
         # For example: 'all-MiniLM-L6-v2' or 'paraphrase-MiniLM-L6-v2'
-        self.embedder = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+        self.embedder = SentenceTransformer(SBERT_MODEL_NAME)
 
     @traceable(run_type="chain")
-    def process_and_cluster_bugs(self):
+    def process_and_cluster_bugs(self, incremental=False, recluster=False):
         """
         Loads bug data, applies clustering, and saves the clustered data.
+        incremental: only the steps of newly added bugs are clustered (Bugs.merge_new_steps_by_nearest_cluster),
+                     existing cluster indexes are kept
+        recluster: periodic full re-cluster with stable cluster indexes and a drift report
+                   (Bugs.recluster_steps_by_fast_clustering)
         """
         bugs_filepath = PathUtil.get_filtered_bugs_filepath()  # Retrieve the file path for filtered bugs
         bugs = FileUtil.load_pickle(bugs_filepath)  # Load the bugs data
 
         # Perform clustering on the bug steps using the embedding model
-        bugs.merge_steps_by_fast_clustering(self.embedder)
+        step_cluster_index_filepath = PathUtil.get_step_cluster_index_filepath()
+        if recluster:
+            bugs.recluster_steps_by_fast_clustering(self.embedder)
+            step_cluster_index = bugs.get_step_cluster_index(self.embedder)
+        elif incremental:
+            step_cluster_index = None
+            if os.path.exists(step_cluster_index_filepath):
+                step_cluster_index = StepClusterIndex.load(step_cluster_index_filepath)
+            step_cluster_index = bugs.merge_new_steps_by_nearest_cluster(self.embedder, step_cluster_index)
+        else:
+            bugs.merge_steps_by_fast_clustering(self.embedder)
+            step_cluster_index = bugs.get_step_cluster_index(self.embedder)
+        step_cluster_index.save(step_cluster_index_filepath)
 
         # Save the clustered data back to the file
         FileUtil.dump_pickle(bugs_filepath, bugs)
 
+        # Save the graph into the columnar store as well (memory-mapped by the scenario processor);
+        # step embeddings are in the embedding cache after clustering, so encoding them again is cheap
+        step_list, step_text_list = bugs.get_steps()
+        step_embeddings = EmbeddingUtil.encode(step_text_list, self.embedder, batch_size=SBERT_BATCH_SIZE)
+        GraphStore.write(bugs, PathUtil.get_bug_graph_store_dirpath(), step_embeddings)
+
 @traceable(run_type="chain")
-def execute_bug_clustering():
+def execute_bug_clustering(incremental=False, recluster=False):
     """
     Executes the bug clustering process by creating an instance of the processor and running it.
     """
     processor = BugClusteringProcessor()
-    processor.process_and_cluster_bugs()
+    processor.process_and_cluster_bugs(incremental, recluster)
 
 if __name__ == "__main__":
     import sys
@@ -2,6 +2,7 @@ from pathlib import Path
 
 from langsmith import traceable
 from tqdm import tqdm
+from bug_improving.utils.checkpoint_journal import CheckpointJournal
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.path_util import PathUtil
 from config import DATA_DIR
@@ -18,15 +19,15 @@ class BugDataMerger:
         self.all_dir.mkdir(exist_ok=True)
 
     @staticmethod
-    @traceable(run_type="chain")
-    def get_s2r_result_by_bug_id(bug_id, step_results):
+    def get_bug_id_s2r_result_dict(step_results):
         """
-        Retrieve the steps-to-reproduce (S2R) result for a given bug ID.
+        Index the steps-to-reproduce (S2R) results by bug ID (the first result of a bug ID wins).
         """
+        bug_id_s2r_result_dict = dict()
         for step_result in step_results:
-            if step_result["bug_id"] == bug_id:
-                return step_result
-        return None
+            bug_id_s2r_result_dict[step_result["bug_id"]] = bug_id_s2r_result_dict.get(step_result["bug_id"],
+                                                                                       step_result)
+        return bug_id_s2r_result_dict
 
     @traceable(run_type="chain")
     def merge_step_jsons(self):
@@ -36,13 +37,16 @@ class BugDataMerger:
         # Get all JSON files in the step directory
         json_files = list(self.section_dir.glob("bug_id_ans_pairs_*.json"))
 
-        if not json_files:
+        journal = CheckpointJournal(PathUtil.get_step_journal_filepath())
+
+        if not json_files and not len(journal):
             print("No JSON files found in the step directory.")
             return
 
         # Merge all JSON files
-        merged_results = []
-        seen_bug_ids = set()  # Track unique bug IDs
+        # Results in the checkpoint journal first, then the ones in timestamped JSON files of older runs
+        merged_results = journal.get_results()
+        seen_bug_ids = set(journal.bug_id_result_dict.keys())  # Track unique bug IDs
 
         print("Merging JSON files...")
         for json_file in tqdm(json_files, ascii=True):
@@ -64,7 +68,7 @@ class BugDataMerger:
         output_file = Path(self.all_dir, "bug_id_ans_pairs.json")
         FileUtil.dump_json(output_file, merged_results)
 
-        print(f"Successfully merged {len(json_files)} files.")
+        print(f"Successfully merged {len(json_files)} files and {len(journal)} journal entries.")
         print(f"Total unique bug entries: {len(merged_results)}")
         print(f"Merged file saved to: {output_file}")
 
@@ -75,9 +79,10 @@ class BugDataMerger:
         """
         step_filename = Path(DATA_DIR, "step", "all", "bug_id_ans_pairs.json")
         step_results = FileUtil.load_json(step_filename)
+        bug_id_s2r_result_dict = self.get_bug_id_s2r_result_dict(step_results)
 
         for bug in tqdm(bugs, ascii=True):
-            step_result = self.get_s2r_result_by_bug_id(bug.id, step_results)
+            step_result = bug_id_s2r_result_dict.get(bug.id, None)
             if step_result:
                 bug.description.get_steps_to_reproduce_from_dict(step_result["ans"])
             else:
@@ -3,6 +3,7 @@ from pathlib import Path
 from langsmith import traceable
 from tqdm import tqdm
 from bug_improving.types.description import Description
+from bug_improving.utils.checkpoint_journal import CheckpointJournal
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.path_util import PathUtil
 from config import DATA_DIR
@@ -13,14 +14,14 @@ class BugSaveSectionProcessor:
     """
 
     @staticmethod
-    def get_sec_result_by_bug_id(bug_id, sec_results):
+    def get_bug_id_sec_result_dict(sec_results):
         """
-        Retrieve the section result matching the given bug ID.
+        Index the section results by bug ID (the first result of a bug ID wins).
         """
+        bug_id_sec_result_dict = dict()
         for sec_result in sec_results:
-            if sec_result["bug_id"] == bug_id:
-                return sec_result
-        return None
+            bug_id_sec_result_dict[sec_result["bug_id"]] = bug_id_sec_result_dict.get(sec_result["bug_id"], sec_result)
+        return bug_id_sec_result_dict
 
     @staticmethod
     @traceable(run_type="chain")
@@ -36,13 +37,16 @@ class BugSaveSectionProcessor:
         # Get all JSON files in the section directory
         json_files = list(section_dir.glob("bug_id_ans_pairs_*.json"))
 
-        if not json_files:
+        journal = CheckpointJournal(PathUtil.get_section_journal_filepath())
+
+        if not json_files and not len(journal):
             print("No JSON files found in the section directory.")
             return
 
         # Merge all JSON files
-        merged_results = []
-        seen_bug_ids = set()  # Track unique bug IDs
+        # Results in the checkpoint journal first, then the ones in timestamped JSON files of older runs
+        merged_results = journal.get_results()
+        seen_bug_ids = set(journal.bug_id_result_dict.keys())  # Track unique bug IDs
 
         print("Merging JSON files...")
         for json_file in tqdm(json_files, ascii=True):
@@ -64,7 +68,7 @@ class BugSaveSectionProcessor:
         output_file = Path(all_dir, "bug_id_ans_pairs.json")
         FileUtil.dump_json(output_file, merged_results)
 
-        print(f"Successfully merged {len(json_files)} files.")
+        print(f"Successfully merged {len(json_files)} files and {len(journal)} journal entries.")
         print(f"Total unique bug entries: {len(merged_results)}")
         print(f"Merged file saved to: {output_file}")
 
@@ -80,9 +84,11 @@ class BugSaveSectionProcessor:
         bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
         sec_results = FileUtil.load_json(Path(DATA_DIR, "section", foldername, "bug_id_ans_pairs.json"))
 
+        bug_id_sec_result_dict = BugSaveSectionProcessor.get_bug_id_sec_result_dict(sec_results)
+
         print("Processing bugs...")
         for bug in tqdm(bugs, ascii=True):
-            sec_result = BugSaveSectionProcessor.get_sec_result_by_bug_id(bug.id, sec_results)
+            sec_result = bug_id_sec_result_dict.get(bug.id, None)
             if sec_result:
                 bug.description.get_sections_from_dict(sec_result["ans"])
             else:
@@ -1,4 +1,5 @@
 import ast
+import logging
 from pathlib import Path
 
 import openai
@@ -7,8 +8,11 @@ from langsmith import traceable
 from tqdm import tqdm
 
 from bug_improving.pipelines.generator import ScenarioLinker, ScenarioCombiner
+from bug_improving.types.graph_store import GraphStore
+from bug_improving.utils.checkpoint_journal import CheckpointJournal
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.graph_util import GraphUtil
+from bug_improving.utils.llm_executor import LLMExecutor
 from bug_improving.utils.llm_util import LLMUtil
 from bug_improving.utils.path_util import PathUtil
 from config import DATA_DIR
@@ -21,10 +25,16 @@ class BugScenarioProcessor:
 
     def __init__(self):
         openai.api_key = LLMUtil.OPENAI_API_KEY
-        self.bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
+        # the columnar graph store (if written by the clustering processor) is memory-mapped,
+        # only bugs touched by a query are materialized
+        if GraphStore.exists(PathUtil.get_bug_graph_store_dirpath()):
+            self.bugs = GraphStore(PathUtil.get_bug_graph_store_dirpath())
+        else:
+            self.bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
         self.model_name = LLMUtil.GPT4_MODEL_NAME
         self.with_instances = self.bugs
         self.with_step_cluster = True
+        self.llm_executor = LLMExecutor()
 
     @staticmethod
     def get_bug_id_pairs(seed_bug_id, bugs):
@@ -36,65 +46,124 @@ class BugScenarioProcessor:
             bug_id_pairs.append((seed_bug_id, bug.id))
         return bug_id_pairs
 
-    @traceable(run_type="chain")
-    def link_scenario(self, bug_pair, with_instances, model_name):
+    @staticmethod
+    def parse_answer(answer):
         """
-        Link scenarios for a given pair of bugs using an LLM.
+        Repair and parse an LLM answer (re-raise the Exception if asking failed).
         """
-        answer, _ = ScenarioLinker.link_scenario(bug_pair, with_instances, model_name, temperature=0.35)
+        if isinstance(answer, Exception):
+            raise answer
         fixed_json = repair_json(answer)
         return ast.literal_eval(fixed_json)
 
+    @staticmethod
+    def get_answer_dict(bug_id_pair, answer):
+        """
+        {"bug_id_pair", "answer"}, or {"bug_id_pair", "error"} if asking failed or the answer is not parsable,
+        so one bad answer does not lose the others
+        """
+        try:
+            return {"bug_id_pair": bug_id_pair, "answer": BugScenarioProcessor.parse_answer(answer)}
+        except Exception as e:
+            logging.error(f"Bug pair {bug_id_pair}: {e}")
+            return {"bug_id_pair": bug_id_pair, "error": str(e)}
+
+    @staticmethod
+    def get_journaling_callback(bug_pairs, journal):
+        """
+        on_answer of LLMExecutor: journal each parsable answer as soon as it completes, keyed by the id of the
+        second bug of its pair (the first one is the seed bug), so a crash loses only the answers in flight.
+        Failed answers are not journaled, they are asked again on restart.
+        """
+        def on_answer(index, answer):
+            bug_id_pair = (bug_pairs[index][0].id, bug_pairs[index][1].id)
+            try:
+                parsed_answer = BugScenarioProcessor.parse_answer(answer)
+            except Exception:
+                # reported in the scenario file
+                return
+            journal.append([{"bug_id": bug_id_pair[1], "ans": {"bug_id_pair": bug_id_pair, "answer": parsed_answer}}])
+        return on_answer
+
     @traceable(run_type="chain")
-    def combine_scenario(self, bug_pair, with_instances, with_step_cluster, model_name):
+    def link_scenarios(self, bug_pairs, with_instances, model_name, journal):
         """
-        Combine scenarios for a given pair of bugs using an LLM.
+        Link scenarios for pairs of bugs using an LLM (asked concurrently, answers keep the order of bug_pairs,
+        None: journaled before, LLM was not asked).
         """
-        answer, _ = ScenarioCombiner.combine_scenario(bug_pair, with_instances, with_step_cluster, model_name)
-        fixed_json = repair_json(answer)
-        return ast.literal_eval(fixed_json)
+        return self.llm_executor.run(
+            [None if bug_pair[1].id in journal else ScenarioLinker.get_messages(bug_pair, with_instances)
+             for bug_pair in bug_pairs],
+            model_name, temperature=0.35, on_answer=self.get_journaling_callback(bug_pairs, journal))
+
+    @traceable(run_type="chain")
+    def combine_scenarios(self, bug_pairs, with_instances, with_step_cluster, model_name, journal):
+        """
+        Combine scenarios for pairs of bugs using an LLM (asked concurrently, answers keep the order of bug_pairs,
+        None: journaled before or no chunk combination, LLM was not asked).
+        """
+        return self.llm_executor.run(
+            [None if bug_pair[1].id in journal
+             else ScenarioCombiner.get_messages(bug_pair, with_instances, with_step_cluster)
+             for bug_pair in bug_pairs],
+            model_name, on_answer=self.get_journaling_callback(bug_pairs, journal))
+
+    @staticmethod
+    def get_journaled_answer_dict(journal, bug_id_pair, answer):
+        """
+        the journaled answer dict of bug_id_pair, else the answer dict of answer
+        """
+        result = journal.get_result_by_bug_id(bug_id_pair[1])
+        if result is not None:
+            return result["ans"]
+        return BugScenarioProcessor.get_answer_dict(bug_id_pair, answer)
 
     @traceable(run_type="chain")
     def process_bug_scenarios(self, seed_bug_id, foldername="scenarios"):
         """
         Process and save linked and combined scenarios for a given seed bug ID.
+        Answers are journaled as they complete (scenarios/{seed_bug_id}_link.jsonl, ..._combine.jsonl),
+        a rerun after a crash only asks for the bug pairs not journaled before.
         """
         filename = f"{seed_bug_id}"
 
-        GraphUtil.BUGS = self.bugs
-        GraphUtil.get_bug_id_bug_dict(self.bugs)
-        GraphUtil.get_index_cluster_dict(self.bugs)
+        if isinstance(self.bugs, GraphStore):
+            GraphUtil.load_graph_store(self.bugs)
+        else:
+            GraphUtil.BUGS = self.bugs
+            GraphUtil.get_bug_id_bug_dict(self.bugs)
+            GraphUtil.get_index_cluster_dict(self.bugs)
         GraphUtil.get_index_cluster_expected_actual_result_dict()
 
         bug_list, bug_ranking_details_dict = GraphUtil.find_relevant_ranked_bugs_by_bug_id_with_step_type(
-            self.bugs, seed_bug_id
+            self.bugs, seed_bug_id, top_k=10
         )
 
         bug_id_pairs = self.get_bug_id_pairs(seed_bug_id, bug_list[0:10])
-        answers = []
+        bug_pairs = [(self.bugs.get_bug_by_id(bug_id_pair[0]), self.bugs.get_bug_by_id(bug_id_pair[1]))
+                     for bug_id_pair in bug_id_pairs]
 
-        for bug_id_pair in tqdm(bug_id_pairs, ascii=True):
-            bug_pair = (
-                self.bugs.get_bug_by_id(bug_id_pair[0]),
-                self.bugs.get_bug_by_id(bug_id_pair[1])
-            )
+        link_journal = CheckpointJournal(PathUtil.get_scenario_journal_filepath(seed_bug_id, "link", foldername))
+        combine_journal = CheckpointJournal(
+            PathUtil.get_scenario_journal_filepath(seed_bug_id, "combine", foldername))
+        print(f"{len(link_journal)} linked and {len(combine_journal)} combined bug pairs completed before, skipped")
 
+        # Ask LLM for the bug pairs not journaled before concurrently, each answer is journaled as it completes
+        link_answers = self.link_scenarios(bug_pairs, self.with_instances, self.model_name, link_journal)
+        combine_answers = self.combine_scenarios(bug_pairs, self.with_instances, self.with_step_cluster,
+                                                 self.model_name, combine_journal)
+
+        answers = []
+        for bug_id_pair, link_answer, combine_answer in tqdm(zip(bug_id_pairs, link_answers, combine_answers),
+                                                             ascii=True):
             # Link scenarios
-            linked_answer = self.link_scenario(bug_pair, self.with_instances, self.model_name)
-            answers.append({
-                "bug_id_pair": bug_id_pair,
-                "answer": linked_answer
-            })
-            FileUtil.dump_json(Path(DATA_DIR, foldername, f"{filename}.json"), answers)
-
-            # Combine scenarios
-            combined_answer = self.combine_scenario(bug_pair, self.with_instances, self.with_step_cluster,
-                                                    self.model_name)
-            answers.append({
-                "bug_id_pair": bug_id_pair,
-                "answer": combined_answer
-            })
-            FileUtil.dump_json(Path(DATA_DIR, foldername, f"{filename}.json"), answers)
+            answers.append(self.get_journaled_answer_dict(link_journal, bug_id_pair, link_answer))
+
+            # Combine scenarios (None and not journaled: no chunk combination, LLM was not asked)
+            if combine_answer is None and bug_id_pair[1] not in combine_journal:
+                combine_answer = ScenarioCombiner.get_empty_answer()
+            answers.append(self.get_journaled_answer_dict(combine_journal, bug_id_pair, combine_answer))
+        FileUtil.dump_json(Path(DATA_DIR, foldername, f"{filename}.json"), answers)
 
 
 @traceable(run_type="chain")
@@ -1,5 +1,4 @@
 import json
-from datetime import datetime
 from pathlib import Path
 
 import openai
@@ -7,7 +6,9 @@ from langsmith import traceable
 from tqdm import tqdm
 
 from bug_improving.pipelines.constructor import SecSplitter
+from bug_improving.utils.checkpoint_journal import CheckpointJournal
 from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.llm_executor import LLMExecutor
 from bug_improving.utils.llm_util import LLMUtil
 from bug_improving.utils.path_util import PathUtil
 from config import DATA_DIR
@@ -23,6 +24,8 @@ class BugSectionProcessor:
         self.result_filepath = Path(DATA_DIR, "section")
         self.result_filepath.mkdir(parents=True, exist_ok=True)
         self.with_instances = self.bugs  # Used by SecSplitter to process sections
+        self.llm_executor = LLMExecutor()
+        self.journal = CheckpointJournal(PathUtil.get_section_journal_filepath())
 
     @staticmethod
     def clean_json_string(answer):
@@ -63,14 +66,19 @@ class BugSectionProcessor:
     def process_bug_batch(self, bug_batch, start_index):
         """Process a single batch of bugs, calling the LLM-based section splitting and storing results."""
         bug_id_answer_pairs = []
-        for idx, bug in enumerate(bug_batch, start=start_index):
+        # Skip bugs completed before (restart after a crash), numbered before skipping
+        idx_bug_pairs = [(idx, bug) for idx, bug in enumerate(bug_batch, start=start_index)
+                         if bug.id not in self.journal]
+        # Ask LLM for the whole batch concurrently, answers keep the order of idx_bug_pairs
+        messages_list = [SecSplitter.get_messages(bug, self.with_instances) for _, bug in idx_bug_pairs]
+        answers = self.llm_executor.run(messages_list)
+        for (idx, bug), answer in zip(idx_bug_pairs, answers):
             print(f"Processing bug {idx}")
             print(bug)
-            answer = None
 
             try:
-                # This call to SecSplitter likely involves LLM interaction
-                answer, _ = SecSplitter.split_section(bug, self.with_instances)
+                if isinstance(answer, Exception):
+                    raise answer
                 ans_json = self.parse_json_safely(answer)
                 if ans_json is not None:
                     bug_id_answer_pairs.append({
@@ -84,31 +92,18 @@ class BugSectionProcessor:
 
             print("*" * 50)
 
-            # Save results every 100 bugs
-            if (idx + 1) % 100 == 0:
-                self.save_results(bug_id_answer_pairs)
-                bug_id_answer_pairs = []
-
-        # Save remaining results
+        # Save results of the batch (failed bugs are not saved, they are retried on restart)
         if bug_id_answer_pairs:
             self.save_results(bug_id_answer_pairs)
 
     @traceable(run_type="chain")
     def save_results(self, bug_id_answer_pairs):
-        """Write bug_id-answer pairs to a JSON file with timestamp."""
+        """Append bug_id-answer pairs to the checkpoint journal (fsynced)."""
         if not bug_id_answer_pairs:
             return
 
-        current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = self.result_filepath / f"bug_id_ans_pairs_{current_datetime}.json"
-
-        try:
-            FileUtil.dump_json(output_file, bug_id_answer_pairs)
-            print(f"Successfully saved results to {output_file}")
-        except Exception as e:
-            print(f"Error saving results: {str(e)}")
-            backup_file = self.result_filepath / f"backup_{current_datetime}.json"
-            FileUtil.dump_json(backup_file, bug_id_answer_pairs)
+        self.journal.append(bug_id_answer_pairs)
+        print(f"Successfully saved {len(bug_id_answer_pairs)} results to {self.journal.filepath}")
 
     @traceable(run_type="chain")
     def process_all_bugs(self):
@@ -116,6 +111,7 @@ class BugSectionProcessor:
         total_bugs = len(self.bugs)
         batch_size = 100
 
+        print(f"{len(self.journal)} bugs completed before, skipped")
         with tqdm(total=total_bugs, ascii=True) as pbar:
             for start_idx in range(0, total_bugs, batch_size):
                 end_idx = min(start_idx + batch_size, total_bugs)
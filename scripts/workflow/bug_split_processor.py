@@ -1,5 +1,4 @@
 import json
-from datetime import datetime
 from pathlib import Path
 
 import openai
@@ -7,7 +6,9 @@ from langsmith import traceable
 from tqdm import tqdm
 
 from bug_improving.pipelines.constructor import StepSplitter
+from bug_improving.utils.checkpoint_journal import CheckpointJournal
 from bug_improving.utils.file_util import FileUtil
+from bug_improving.utils.llm_executor import LLMExecutor
 from bug_improving.utils.llm_util import LLMUtil
 from bug_improving.utils.path_util import PathUtil
 from config import DATA_DIR
@@ -22,26 +23,24 @@ class BugSplitProcessor:
         openai.api_key = LLMUtil.OPENAI_API_KEY
         self.bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
         self.step_result_filepath = Path(DATA_DIR, "step")
+        self.llm_executor = LLMExecutor()
+        self.journal = CheckpointJournal(PathUtil.get_step_journal_filepath())
 
-    @traceable(run_type="chain")
-    def process_bug(self, bug, with_instances=None, with_step_type=True):
+    @staticmethod
+    def parse_answer(bug, answer):
         """
-        Process a single bug, interacting with LLM for step-splitting if applicable.
+        Parse the step-splitting answer of a bug.
 
         Args:
-            bug: The bug object to process.
-            with_instances: Optional parameter to include instances.
-            with_step_type: Optional parameter to include step types.
+            bug: The bug object.
+            answer: The LLM answer, or the Exception raised when asking.
 
         Returns:
             A dictionary containing bug ID and its corresponding processed answer.
         """
-        if not bug.description.steps_to_reproduce:
-            return {"bug_id": bug.id, "ans": []}
-
         try:
-            # Get the step-splitting answer
-            answer, _ = StepSplitter.split_s2r(bug, with_instances, with_step_type)
+            if isinstance(answer, Exception):
+                raise answer
 
             # Convert the string-formatted JSON answer to a Python object
             try:
@@ -65,35 +64,46 @@ class BugSplitProcessor:
             with_instances: Optional parameter to include instances.
             with_step_type: Optional parameter to include step types.
         """
-        bug_id_answer_pairs = []
-
-        for index, bug in tqdm(enumerate(self.bugs), ascii=True):
-            print(index)
-            print(bug)
-            result = self.process_bug(bug, with_instances, with_step_type)
-            bug_id_answer_pairs.append(result)
-
-            print("************************************************")
-            if index % 100 == 0:
-                self._save_results(bug_id_answer_pairs)
-                bug_id_answer_pairs = []
+        batch_size = 100
+        print(f"{len(self.journal)} bugs completed before, skipped")
+
+        for start_index in tqdm(range(0, len(self.bugs), batch_size), ascii=True):
+            # Skip bugs completed before (restart after a crash), numbered before skipping
+            index_bug_pairs = [(index, bug) for index, bug in
+                               enumerate(self.bugs[start_index:start_index + batch_size], start=start_index)
+                               if bug.id not in self.journal]
+            bug_id_answer_pairs = []
+            # Ask LLM for the bugs with steps to reproduce concurrently, answers keep the order of index_bug_pairs
+            messages_list = [StepSplitter.get_messages(bug, with_instances, with_step_type)
+                             if bug.description.steps_to_reproduce else None for _, bug in index_bug_pairs]
+            answers = self.llm_executor.run(messages_list)
+
+            for (index, bug), answer in zip(index_bug_pairs, answers):
+                print(index)
+                print(bug)
+                if isinstance(answer, Exception):
+                    # not saved, retried on restart
+                    print(f"Unexpected error for bug {bug.id}: {answer}")
+                    continue
+                if bug.description.steps_to_reproduce:
+                    result = self.parse_answer(bug, answer)
+                else:
+                    result = {"bug_id": bug.id, "ans": []}
+                bug_id_answer_pairs.append(result)
+
+                print("************************************************")
 
-        if bug_id_answer_pairs:
             self._save_results(bug_id_answer_pairs)
 
     @traceable(run_type="chain")
     def _save_results(self, bug_id_answer_pairs):
         """
-        Save the results to a JSON file with a timestamp.
+        Append the results to the checkpoint journal (fsynced).
 
         Args:
             bug_id_answer_pairs: List of processed bug ID and answer pairs.
         """
-        current_datetime = datetime.now()
-        FileUtil.dump_json(
-            Path(self.step_result_filepath, f"bug_id_ans_pairs_{current_datetime}.json"),
-            bug_id_answer_pairs
-        )
+        self.journal.append(bug_id_answer_pairs)
 
 @traceable(run_type="chain")
 def run_bug_split_processing(with_instances=None, with_step_type=True):
@@ -1,39 +1,40 @@
+import itertools
+
+from bug_improving.utils.bug_cluster_matrix import BugClusterMatrix
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.path_util import PathUtil
 
 
-def find_bug_pairs():
-    pairs = []  # To store the resulting pairs
+def find_bug_pairs(max_pair_num=7, threshold=1):
+    """
+    bug pairs with overlapping step clusters, from the sparse bug x step cluster matrix (BugClusterMatrix)
+    @param max_pair_num: stop after max_pair_num pairs, None means all the pairs
+    @type max_pair_num: int
+    @param threshold: minimum number of shared step clusters
+    @type threshold: int
+    @return: [(bug_id_1, bug_id_2), ...], bug_id_1 < bug_id_2, in the order of the bugs in the pickle
+             (by bug_id_1, then bug_id_2), so the first max_pair_num pairs are the ones the nested loop found
+    @rtype: list
+    """
     bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
-    # Extract clusters for each bug
-    bug_clusters = {}  # Dictionary to store clusters per bug
-    for bug in bugs:
-        clusters = set()
-        description = getattr(bug, 'description', None)
-        if not description:
-            continue
-        steps_to_reproduce = getattr(description, 'steps_to_reproduce', [])
-        for step in steps_to_reproduce:
-            cluster_index = getattr(step, 'cluster_index', None)
-            if cluster_index is not None:
-                clusters.add(cluster_index)
-        bug_clusters[getattr(bug, 'id', None)] = clusters
+    # bug_id_1 < bug_id_2: avoid duplicate pairs and self-comparison
+    matrix = BugClusterMatrix.from_bugs(bugs)
+    pairs = ((bug_id_1, bug_id_2) for bug_id_1, bug_id_2, _ in matrix.iter_pairs_in_row_order(threshold))
+    return list(itertools.islice(pairs, max_pair_num))
 
-    # Compare clusters between bugs to find pairs
-    for bug_id_1, clusters_1 in bug_clusters.items():
-        for bug_id_2, clusters_2 in bug_clusters.items():
-            if bug_id_1 >= bug_id_2:
-                continue  # Avoid duplicate pairs and self-comparison
 
-            # Check for overlap in clusters, excluding None
-            if clusters_1 & clusters_2:
-                pairs.append((bug_id_1, bug_id_2))
+def dump_bug_pairs(threshold=1, top_k=None):
+    """
+    all the bug pairs with >= threshold shared step clusters (or the top_k of each bug)
+    streamed into PathUtil.get_bug_pairs_filepath()
+    @return: number of pairs
+    @rtype: int
+    """
+    bugs = FileUtil.load_pickle(PathUtil.get_filtered_bugs_filepath())
+    matrix = BugClusterMatrix.from_bugs(bugs)
+    return matrix.dump_pairs(PathUtil.get_bug_pairs_filepath(), threshold, top_k)
 
-                # Stop if 5 pairs are found
-                if len(pairs) == 7:
-                    return pairs
 
-    return pairs
 if __name__ == '__main__':
     pairs = find_bug_pairs()
-    print(pairs)
\ No newline at end of file
+    print(pairs)
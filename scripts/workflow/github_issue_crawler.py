@@ -1,28 +1,36 @@
 import asyncio
+import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from bug_improving.utils.crawel_executor import CrawelExecutor
 from bug_improving.utils.crawel_util import CrawelUtil
 from bug_improving.utils.file_util import FileUtil
 from bug_improving.utils.list_util import ListUtil
-from config import SYNC_CRAWEL_NUM, DATA_DIR
+from bug_improving.utils.rate_limit_scheduler import RateLimitScheduler
+from config import SYNC_CRAWEL_NUM, DATA_DIR, GITHUB_ISSUE_PER_PAGE, GITHUB_ISSUE_LABELS
 
 class GitHubIssueCrawler:
     """
     A class to manage the crawling and saving of GitHub issues and pull requests.
+    Full crawl (crawl_and_save_issues): every issue number in (min_issue_id, max_issue_id].
+    Incremental crawl (sync_issues): only the issues updated since the last sync, merged into the saved batches.
     """
 
-    def __init__(self,owner, repo, max_issue_id, min_issue_id):
+    def __init__(self, owner, repo, max_issue_id=None, min_issue_id=0, labels=GITHUB_ISSUE_LABELS):
         """
         Initializes the crawler with GitHub authentication and repository details.
+
+        :param labels: Comma-separated labels of the issues listed by sync_issues (None means any).
         """
         load_dotenv()
         self.github_token = os.getenv('GITHUB_TOKEN')
-        self.headers = {
-            'Authorization': f'token {self.github_token}',
-        } if self.github_token else None
+        # GITHUB_TOKENS: comma-separated auth tokens, each with its own rate limit budget
+        self.github_tokens = [token for token in os.getenv('GITHUB_TOKENS', '').split(',') if token] or \
+                             ([self.github_token] if self.github_token else [])
+        self.scheduler = RateLimitScheduler(self.github_tokens)
         self.folder_name = "issues_pulls"
         # owner = 'frappe'
         # repo = 'erpnext'
@@ -32,11 +40,15 @@ class GitHubIssueCrawler:
         self.repo = repo
         self.max_issue_id = max_issue_id  # Maximum issue ID to crawl
         self.min_issue_id = min_issue_id  # Minimum issue ID to crawl
+        self.labels = labels
         # self.owner = 'odoo'  # Repository owner
         # self.repo = 'odoo'  # Repository name
         # self.max_issue_id = 190657  # Maximum issue ID to crawl
         # self.min_issue_id = 190620  # Minimum issue ID to crawl
         self.filepath = Path(DATA_DIR, self.repo, self.folder_name)
+        # high-water marks of sync_issues: {"owner/repo": latest updated_at synced}
+        # (not in self.filepath, whose json files are all issue batches)
+        self.sync_filepath = Path(DATA_DIR, self.repo, f"{self.folder_name}_sync.json")
         self._prepare_directory()
 
     def _prepare_directory(self):
@@ -46,16 +58,6 @@ class GitHubIssueCrawler:
         if not os.path.exists(self.filepath):
             os.makedirs(self.filepath)
 
-    async def _fetch_issues_async(self, issue_urls, headers):
-        """
-        Fetch issues asynchronously from GitHub.
-
-        :param issue_urls: List of issue URLs to fetch.
-        :param headers: HTTP headers for authentication.
-        :return: List of responses.
-        """
-        return await CrawelUtil.crawel_by_async(issue_urls, headers)
-
     def crawl_and_save_issues(self):
         """
         Main method to crawl GitHub issues and save them as JSON files.
@@ -68,13 +70,114 @@ class GitHubIssueCrawler:
         )
 
         issue_urls_list = ListUtil.list_of_groups(issue_urls, SYNC_CRAWEL_NUM)
-        loop = asyncio.get_event_loop()
+        asyncio.run(self._crawl_and_save_issues_async(issue_urls_list))
+
+    async def _crawl_and_save_issues_async(self, issue_urls_list):
+        """
+        Fetch all batches through one CrawelExecutor (one connection pool, steady requests in flight,
+        paced over the auth tokens by the rate limit scheduler), and save each batch as soon as it is fetched.
+
+        :param issue_urls_list: List of issue URL batches.
+        """
+        progress_bar = tqdm(total=len(issue_urls_list), ascii=True)
+        async with CrawelExecutor(scheduler=self.scheduler) as executor:
+            async for index, responses in executor.iter_batches(issue_urls_list):
+                # saved in a thread, so the workers keep sending requests meanwhile
+                await asyncio.to_thread(FileUtil.dump_json, Path(self.filepath, f'{self.folder_name}_{index}.json'),
+                                        CrawelUtil.filter_bug_responses(responses))
+                progress_bar.update(1)
+        progress_bar.close()
+
+    def _load_since(self):
+        """
+        :return: High-water mark of the last sync (ISO 8601 updated_at), None if never synced.
+        """
+        if not os.path.exists(self.sync_filepath):
+            return None
+        return FileUtil.load_json(self.sync_filepath).get(f"{self.owner}/{self.repo}", None)
+
+    def _save_since(self, since):
+        repo_since_dict = FileUtil.load_json(self.sync_filepath) if os.path.exists(self.sync_filepath) else dict()
+        repo_since_dict[f"{self.owner}/{self.repo}"] = since
+        FileUtil.dump_json(self.sync_filepath, repo_since_dict)
 
-        for index, issue_urls in tqdm(enumerate(issue_urls_list), ascii=True):
-            responses = loop.run_until_complete(
-                self._fetch_issues_async(issue_urls, self.headers)
-            )
-            FileUtil.dump_json(Path(self.filepath, f'{self.folder_name}_{index}.json'), responses)
+    async def _fetch_updated_issues_async(self, since):
+        """
+        List the issues updated since the high-water mark, sorted by updated time ascending.
+        The cursor is the latest updated_at seen (since is inclusive), not a page number,
+        so issues updated during the sync move behind the cursor instead of shifting the pages.
+
+        :param since: High-water mark, None means all issues.
+        :return: ({issue number: issue}, new high-water mark).
+        """
+        number_issue_dict = dict()
+        cursor = since
+        page = 1
+        async with CrawelExecutor(scheduler=self.scheduler) as executor:
+            while True:
+                url = CrawelUtil.get_github_issue_list_url(self.owner, self.repo, cursor, self.labels, page)
+                issues = await executor.fetch(url)
+                if not isinstance(issues, list):
+                    # the issues listed so far are up to the cursor, the next sync goes on from there
+                    logging.error(f"Sync of {self.owner}/{self.repo} stopped at {url}: {issues}")
+                    break
+                for issue in issues:
+                    number_issue_dict[issue["number"]] = issue
+                if len(issues) < GITHUB_ISSUE_PER_PAGE:
+                    break
+                if issues[-1]["updated_at"] == cursor:
+                    # a full page updated at the same second: the cursor cannot move, go to the next page
+                    page = page + 1
+                else:
+                    cursor = issues[-1]["updated_at"]
+                    page = 1
+        updated_ats = [issue["updated_at"] for issue in number_issue_dict.values()]
+        return number_issue_dict, max(updated_ats + ([since] if since else []), default=None)
+
+    def _merge_issues(self, number_issue_dict):
+        """
+        Merge issues into the saved batches by issue number: a saved issue is replaced in its batch file
+        (only the changed files are written), the new issues are saved as new batches after the last one.
+
+        :param number_issue_dict: {issue number: issue}.
+        :return: (number of replaced issues, number of new issues).
+        """
+        number_issue_dict = dict(number_issue_dict)
+        replaced_num = 0
+        max_index = -1
+        for filename in FileUtil.get_file_names_in_directory(self.filepath, 'json'):
+            index = Path(filename).stem[len(self.folder_name) + 1:]
+            if index.isdigit():
+                max_index = max(max_index, int(index))
+            issues = FileUtil.load_json(filename)
+            changed = False
+            for issue_index, issue in enumerate(issues):
+                if issue.get("number", None) in number_issue_dict:
+                    issues[issue_index] = number_issue_dict.pop(issue["number"])
+                    replaced_num = replaced_num + 1
+                    changed = True
+            if changed:
+                FileUtil.dump_json(filename, issues)
+        new_issues = sorted(number_issue_dict.values(), key=lambda issue: issue["number"], reverse=True)
+        for index, issues in enumerate(ListUtil.list_of_groups(new_issues, SYNC_CRAWEL_NUM)):
+            FileUtil.dump_json(Path(self.filepath, f'{self.folder_name}_{max_index + 1 + index}.json'), issues)
+        return replaced_num, len(new_issues)
+
+    def sync_issues(self):
+        """
+        Incremental crawl: list the issues (with self.labels) updated since the last sync,
+        100 per request from the list endpoint instead of one request per issue number,
+        merge them into the saved batches, then save the new high-water mark.
+        Issues which lost the labels since the last sync are not listed, so they stay as saved.
+        """
+        since = self._load_since()
+        number_issue_dict, new_since = asyncio.run(self._fetch_updated_issues_async(since))
+        replaced_num, new_num = self._merge_issues(number_issue_dict)
+        if new_since:
+            self._save_since(new_since)
+        logging.warning(f"Synced {self.owner}/{self.repo} since {since}: {replaced_num} issues updated, "
+                        f"{new_num} new, high-water mark {new_since}")
+        return replaced_num, new_num
 
 # Exposed function to run the issue crawler
 def run_github_issue_crawler(owner, repo, max_issue_id, min_issue_id):
@@ -84,5 +187,12 @@ def run_github_issue_crawler(owner, repo, max_issue_id, min_issue_id):
     crawler = GitHubIssueCrawler(owner, repo, max_issue_id, min_issue_id)
     crawler.crawl_and_save_issues()
 
+def run_github_issue_sync(owner, repo, labels=GITHUB_ISSUE_LABELS):
+    """
+    Run the incremental GitHub issue crawler (issues updated since the last sync).
+    """
+    crawler = GitHubIssueCrawler(owner, repo, labels=labels)
+    crawler.sync_issues()
+
 if __name__ == "__main__":
     run_github_issue_crawler('frappe', 'erpnext', 44643, 44400)
\ No newline at end of file